@@ -0,0 +1,69 @@
+import copy
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from foodgram import invalidation
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Ключ токена -> (пользователь, токен).
+token_cache = TTLCache(
+    maxsize=settings.TOKEN_CACHE_SIZE, ttl=settings.TOKEN_CACHE_TTL)
+
+
+def forget_token(key):
+    token_cache.pop(key)
+
+
+def forget_user(user_id):
+    token_cache.discard_where(lambda item: item[0].pk == user_id)
+
+
+def _token_invalidated(key):
+    if key is None:
+        token_cache.clear()
+    else:
+        forget_token(invalidation.key_pk(key))
+
+
+def _user_invalidated(key):
+    if key is None:
+        token_cache.clear()
+    else:
+        forget_user(int(invalidation.key_pk(key)))
+
+
+# Удаление токена и правка пользователя в любом процессе.
+invalidation.subscribe(invalidation.model_key(Token), _token_invalidated)
+invalidation.subscribe(
+    invalidation.model_key(get_user_model()), _user_invalidated)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication без JOIN Token + User на каждый запрос:
+    соответствие токен → пользователь живёт в token_cache.
+    Кеш у каждого процесса свой; о выходе из системы и правке
+    пользователя в других процессах сообщает foodgram.invalidation.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is None:
+            cached = super().authenticate_credentials(key)
+            token_cache.set(key, cached)
+        self._report_stats()
+        user, token = cached
+        # Копия: view может менять request.user, а объект общий.
+        return copy.deepcopy(user), token
+
+    @staticmethod
+    def _report_stats():
+        lookups = token_cache.hits + token_cache.misses
+        if lookups % settings.TOKEN_CACHE_STATS_EVERY == 0:
+            logger.info("Token cache stats: %s", token_cache.stats())
@@ -0,0 +1,46 @@
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+
+IDS_PARAM = "ids"
+
+
+def _to_pk(value):
+    try:
+        if isinstance(value, bool):
+            raise ValueError
+        pk = int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({IDS_PARAM: f"Ожидается целое число: {value}."})
+    if pk < 1:
+        raise ValidationError(
+            {IDS_PARAM: f"Число не может быть меньше 1: {value}."})
+    return pk
+
+
+def get_batch_ids(request):
+    """
+    id рецептов в порядке запроса, без повторов: ids=1,2,3 в строке
+    запроса (параметр можно повторять) или {"ids": [1, 2, 3]} в теле POST.
+    """
+    if request.method == "POST":
+        values = (
+            request.data.get(IDS_PARAM)
+            if isinstance(request.data, dict) else None
+        )
+        if not isinstance(values, list):
+            raise ValidationError({IDS_PARAM: "Ожидается список id."})
+    else:
+        values = [
+            value.strip()
+            for raw in request.query_params.getlist(IDS_PARAM)
+            for value in raw.split(",")
+            if value.strip()
+        ]
+    ids = list(dict.fromkeys(_to_pk(value) for value in values))
+    if not ids:
+        raise ValidationError({IDS_PARAM: "Нужен хотя бы один id."})
+    if len(ids) > settings.RECIPE_BATCH_MAX_SIZE:
+        raise ValidationError({
+            IDS_PARAM: f"Не больше {settings.RECIPE_BATCH_MAX_SIZE} рецептов."
+        })
+    return ids
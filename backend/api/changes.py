@@ -0,0 +1,33 @@
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+
+SINCE_PARAM = "since"
+LIMIT_PARAM = "limit"
+
+
+def _to_int(params, param, default, minimum, maximum=None):
+    value = params.get(param)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValidationError({param: f"Ожидается целое число: {value}."})
+    if number < minimum or maximum is not None and number > maximum:
+        bounds = f"от {minimum}" + (f" до {maximum}" if maximum else "")
+        raise ValidationError({param: f"Допустимы значения {bounds}."})
+    return number
+
+
+def get_changes_params(request):
+    """Курсор since= (0 — с самого начала) и размер пачки limit=."""
+    params = request.query_params
+    since = _to_int(params, SINCE_PARAM, 0, 0)
+    limit = _to_int(
+        params,
+        LIMIT_PARAM,
+        settings.RECIPE_CHANGES_LIMIT,
+        1,
+        settings.RECIPE_CHANGES_MAX_LIMIT,
+    )
+    return since, limit
@@ -0,0 +1,73 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag
+
+from . import membership
+
+
+def user_validator(user):
+    """
+    Часть валидатора, зависящая от пользователя: версии множеств,
+    из которых считаются флаги is_favorited, is_in_shopping_cart
+    и is_subscribed.
+    """
+    if not user.is_authenticated:
+        return "anonymous"
+    versions = membership.get_versions(user.pk).values()
+    return ":".join(map(str, (user.pk, *versions)))
+
+
+def recipes_validators(request, queryset):
+    """ETag и Last-Modified для выборки рецептов одним агрегатом."""
+    state = queryset.order_by().aggregate(
+        count=Count("pk"), last_modified=Max("updated"))
+    last_modified = state["last_modified"]
+    raw = ":".join((
+        str(state["count"]),
+        last_modified.isoformat() if last_modified else "",
+        request.accepted_media_type or "",
+        user_validator(request.user),
+    ))
+    etag = quote_etag(hashlib.md5(raw.encode()).hexdigest())
+    return etag, last_modified
+
+
+def conditional_get(request, queryset, respond, use_last_modified=False):
+    """
+    Отвечает 304 до сериализации, если валидаторы клиента совпали,
+    иначе вызывает respond() и проставляет ETag и Last-Modified.
+
+    If-Modified-Since учитывается только при use_last_modified и только
+    для анонимов: MAX(updated) не замечает удалений из выборки и
+    изменений флагов пользователя, это покрывает лишь ETag.
+    """
+    etag, last_modified = recipes_validators(request, queryset)
+    timestamp = last_modified and int(last_modified.timestamp())
+
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=(
+            timestamp
+            if use_last_modified and not request.user.is_authenticated
+            else None
+        ),
+    )
+    if response is None:
+        response = respond()
+
+    if response.status_code in (200, 304):
+        response["ETag"] = etag
+        if timestamp:
+            response["Last-Modified"] = http_date(timestamp)
+        patch_cache_control(response, no_cache=True)
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True)
+        patch_vary_headers(response, ("Accept", "Authorization"))
+    return response
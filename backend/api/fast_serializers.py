@@ -0,0 +1,183 @@
+"""
+Read-only сериализация из строк .values() и пакетных карт связей.
+
+Не создаёт экземпляров моделей и объектов полей DRF. Состав и порядок
+ключей берутся из Meta.fields обычных сериализаторов, поэтому JSON
+совпадает с ними байт в байт (сверка — api.tests.test_fast_serializers,
+замер — команда benchmark_serializers).
+"""
+from recipes.models import IngredientInRecipe, Recipe, User
+
+from . import membership
+from .serializers import (
+    IngredientInRecipeReadSerializer,
+    IngredientSerializer,
+    RecipeMinifiedSerializer,
+    RecipeReadSerializer,
+    TagSerializer,
+    UserSerializer,
+)
+
+
+class ValuesSerializer:
+    """Базовый класс: строки .values() превращаются в словари ответа."""
+
+    serializer_class = None
+
+    def __init__(self, request=None, fields=None):
+        self.request = request
+        self.fields = tuple(
+            name for name in self.serializer_class.Meta.fields
+            if fields is None or name in fields
+        )
+
+    def get_columns(self):
+        return self.fields
+
+    def values(self, queryset):
+        return queryset.values(*self.get_columns())
+
+    def to_representation(self, rows):
+        return list(rows)
+
+    def serialize(self, queryset):
+        return self.to_representation(self.values(queryset))
+
+    def file_url(self, field, name):
+        # Повторяет FileField.to_representation из DRF.
+        if not name:
+            return None
+        url = field.storage.url(name)
+        if self.request is not None:
+            return self.request.build_absolute_uri(url)
+        return url
+
+
+class TagValuesSerializer(ValuesSerializer):
+    serializer_class = TagSerializer
+
+
+class IngredientValuesSerializer(ValuesSerializer):
+    serializer_class = IngredientSerializer
+
+
+class RecipeMinifiedValuesSerializer(ValuesSerializer):
+    serializer_class = RecipeMinifiedSerializer
+
+    def to_representation(self, rows):
+        rows = list(rows)
+        image = Recipe._meta.get_field("image")
+        for row in rows:
+            row["image"] = self.file_url(image, row["image"])
+        return rows
+
+
+class RecipeValuesSerializer(ValuesSerializer):
+    serializer_class = RecipeReadSerializer
+
+    COLUMNS = ("name", "image", "text", "cooking_time")
+    AUTHOR_COLUMNS = tuple(
+        name for name in UserSerializer.Meta.fields if name != "is_subscribed"
+    )
+
+    def get_columns(self):
+        columns = ["id"]
+        columns += [name for name in self.COLUMNS if name in self.fields]
+        if "author" in self.fields:
+            columns += [f"author__{name}" for name in self.AUTHOR_COLUMNS]
+        return columns
+
+    @property
+    def user(self):
+        return self.request.user
+
+    def _members(self, kind):
+        if not self.user.is_authenticated:
+            return frozenset()
+        return membership.get_members(kind, self.user.pk)
+
+    def get_tags(self, ids):
+        tags = {}
+        for recipe_id, *tag in (
+            Recipe.tags.through.objects.filter(recipe_id__in=ids)
+            .order_by("tag__name")
+            .values_list("recipe_id", "tag_id", "tag__name", "tag__slug")
+        ):
+            tags.setdefault(recipe_id, []).append(
+                dict(zip(TagSerializer.Meta.fields, tag)))
+        return tags
+
+    def get_ingredients(self, ids):
+        ingredients = {}
+        for recipe_id, *item in (
+            IngredientInRecipe.objects.filter(recipe_id__in=ids)
+            .values_list(
+                "recipe_id",
+                "ingredient_id",
+                "ingredient__name",
+                "ingredient__measurement_unit",
+                "amount",
+            )
+        ):
+            ingredients.setdefault(recipe_id, []).append(
+                dict(zip(IngredientInRecipeReadSerializer.Meta.fields, item)))
+        return ingredients
+
+    def get_authors(self, rows):
+        avatar = User._meta.get_field("avatar")
+        authors = {}
+        for row in rows:
+            author = {
+                name: row.pop(f"author__{name}")
+                for name in self.AUTHOR_COLUMNS
+            }
+            row["author"] = author["id"]
+            authors.setdefault(author["id"], author)
+
+        subscribed = self._members(membership.SUBSCRIPTIONS)
+        for author_id, author in authors.items():
+            author["is_subscribed"] = author_id in subscribed
+            author["avatar"] = self.file_url(avatar, author["avatar"])
+            authors[author_id] = {
+                name: author[name] for name in UserSerializer.Meta.fields
+            }
+        return authors
+
+    def to_representation(self, rows):
+        rows = list(rows)
+        ids = [row["id"] for row in rows]
+        fields = self.fields
+
+        tags = self.get_tags(ids) if "tags" in fields else {}
+        ingredients = (
+            self.get_ingredients(ids) if "ingredients" in fields else {})
+        authors = self.get_authors(rows) if "author" in fields else {}
+        favorited = (
+            self._members(membership.FAVORITES)
+            if "is_favorited" in fields else ())
+        in_cart = (
+            self._members(membership.SHOPPING_CART)
+            if "is_in_shopping_cart" in fields else ())
+        image = Recipe._meta.get_field("image")
+
+        data = []
+        for row in rows:
+            recipe_id = row["id"]
+            item = {}
+            for name in fields:
+                if name == "tags":
+                    item[name] = tags.get(recipe_id, [])
+                elif name == "author":
+                    item[name] = authors[row["author"]]
+                elif name == "ingredients":
+                    item[name] = ingredients.get(recipe_id, [])
+                elif name == "is_favorited":
+                    item[name] = recipe_id in favorited
+                elif name == "is_in_shopping_cart":
+                    item[name] = recipe_id in in_cart
+                elif name == "image":
+                    item[name] = self.file_url(image, row[name])
+                else:
+                    item[name] = row[name]
+            data.append(item)
+        return data
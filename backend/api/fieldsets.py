@@ -0,0 +1,28 @@
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = "fields"
+OMIT_PARAM = "omit"
+
+
+def _split(value):
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+def get_requested_fields(request, available):
+    """
+    Набор полей ответа по параметрам fields= и omit=.
+    Возвращает None, если клиент не ограничивал поля.
+    """
+    params = request.query_params
+    if FIELDS_PARAM not in params and OMIT_PARAM not in params:
+        return None
+
+    fields = _split(params.get(FIELDS_PARAM, "")) or list(available)
+    omit = _split(params.get(OMIT_PARAM, ""))
+
+    unknown = set(fields).union(omit).difference(available)
+    if unknown:
+        raise ValidationError(
+            {"detail": f"Неизвестные поля: {', '.join(sorted(unknown))}."}
+        )
+    return frozenset(fields).difference(omit)
@@ -1,7 +1,11 @@
 import django_filters
+from django.conf import settings
+from rest_framework.filters import OrderingFilter
 
 from recipes.models import Ingredient, Recipe
 
+from . import membership
+
 
 class IngredientFilter(django_filters.FilterSet):
     name = django_filters.CharFilter(
@@ -28,7 +32,8 @@ class RecipeFilter(django_filters.FilterSet):
         if value != 1 or user.is_anonymous:
             return queryset
 
-        return queryset.filter(shopping_cart__user=user)
+        return self._filter_members(
+            queryset, membership.SHOPPING_CART, user, "shopping_cart__user")
 
     def filter_fav(self, queryset, name, value):
         user = self.request.user
@@ -36,8 +41,30 @@ class RecipeFilter(django_filters.FilterSet):
         if value != 1 or user.is_anonymous:
             return queryset
 
-        return queryset.filter(favorites__user=user)
+        return self._filter_members(
+            queryset, membership.FAVORITES, user, "favorites__user")
+
+    @staticmethod
+    def _filter_members(queryset, kind, user, lookup):
+        # Небольшое множество из кеша дешевле JOIN со связующей таблицей.
+        ids = membership.get_members(kind, user.pk)
+        if len(ids) <= settings.MEMBERSHIP_IN_THRESHOLD:
+            return queryset.filter(id__in=ids)
+        return queryset.filter(**{lookup: user})
 
     class Meta:
         model = Recipe
         fields = ("tags", "author", "is_in_shopping_cart", "is_favorited")
+
+
+class StableOrderingFilter(OrderingFilter):
+    """
+    ordering= с pk последним ключом: при равных счётчиках
+    строки не переходят со страницы на страницу.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering and not {"pk", "-pk", "id", "-id"} & set(ordering):
+            ordering = (*ordering, "pk")
+        return ordering
@@ -0,0 +1,402 @@
+"""
+Нагрузочный прогон запросов из коллекции Postman.
+
+Каждый запрос коллекции — сценарий с весом. Переменные {{...}} берутся
+из коллекции, из базы (id первых пользователей, тегов, ингредиентов
+и рецептов, токены) и из явных переопределений. Запросы выполняются
+в несколько потоков либо через WSGI-приложение в этом же процессе,
+либо по HTTP; итог — пропускная способность, перцентили задержки
+и доля ошибок по каждому сценарию.
+"""
+import fnmatch
+import http.client
+import io
+import json
+import random
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, Tag, User
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+VARIABLE = re.compile(r"{{(\w+)}}")
+ORDINALS = ("first", "second", "third", "fourth", "fifth")
+PERCENTILES = (50, 90, 95, 99)
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    url: str
+    headers: dict
+    body: str = ""
+    weight: float = 1
+
+    def variables(self):
+        text = " ".join((self.url, self.body, *self.headers.values()))
+        return set(VARIABLE.findall(text))
+
+    def render(self, variables):
+        def substitute(text):
+            return VARIABLE.sub(lambda match: variables[match[1]], text)
+
+        return Scenario(
+            self.name,
+            self.method,
+            substitute(self.url),
+            {key: substitute(value) for key, value in self.headers.items()},
+            substitute(self.body),
+            self.weight,
+        )
+
+
+def _auth_headers(auth):
+    if not auth or auth.get("type") != "apikey":
+        return {}
+    params = {item["key"]: item["value"] for item in auth["apikey"]}
+    if params.get("in", "header") != "header":
+        return {}
+    return {params["key"]: params["value"]}
+
+
+def _walk(items, path, auth):
+    for item in items:
+        item_auth = item.get("auth", auth)
+        item_path = (*path, item["name"])
+        if "item" in item:
+            yield from _walk(item["item"], item_path, item_auth)
+            continue
+        request = item["request"]
+        url = request["url"]
+        headers = {
+            header["key"]: header["value"]
+            for header in request.get("header", [])
+            if not header.get("disabled")
+        }
+        body = request.get("body") or {}
+        if body.get("mode") == "raw" and body.get("raw"):
+            headers.setdefault("Content-Type", "application/json")
+        yield Scenario(
+            name=" / ".join(item_path),
+            method=request["method"].upper(),
+            url=url["raw"] if isinstance(url, dict) else url,
+            headers={**_auth_headers(request.get("auth", item_auth)),
+                     **headers},
+            body=body.get("raw", "") if body.get("mode") == "raw" else "",
+        )
+
+
+def load_collection(path):
+    """Сценарии и переменные коллекции Postman v2.1."""
+    with open(path, encoding="utf-8") as file:
+        collection = json.load(file)
+    scenarios = list(_walk(collection["item"], (), collection.get("auth")))
+    seen = {}
+    for scenario in scenarios:
+        # Имена запросов в коллекции повторяются.
+        seen[scenario.name] = seen.get(scenario.name, 0) + 1
+        if seen[scenario.name] > 1:
+            scenario.name += f" #{seen[scenario.name]}"
+    variables = {
+        variable["key"]: variable["value"]
+        for variable in collection.get("variable", [])
+    }
+    return scenarios, variables
+
+
+def database_variables():
+    """Значения переменных, которые коллекция получает из ответов."""
+    variables = {}
+    users = list(User.objects.filter(is_active=True).order_by("pk")[:3])
+    for ordinal, user in zip(ORDINALS, users):
+        prefix = "user" if ordinal == "first" else f"{ordinal}User"
+        variables[f"{prefix}Id"] = str(user.pk)
+    for ordinal, user in zip(ORDINALS, users[:2]):
+        prefix = "user" if ordinal == "first" else f"{ordinal}User"
+        token, _ = Token.objects.get_or_create(user=user)
+        variables[f"{prefix}Token"] = token.key
+    for ordinal, tag in zip(ORDINALS, Tag.objects.order_by("pk")[:3]):
+        variables[f"{ordinal}TagId"] = str(tag.pk)
+        variables[f"{ordinal}TagSlug"] = tag.slug
+    ingredients = list(Ingredient.objects.order_by("pk")[:2])
+    for ordinal, ingredient in zip(ORDINALS, ingredients):
+        # Опечатка в имени переменной — как в коллекции.
+        variables[f"{ordinal}IndredientId"] = str(ingredient.pk)
+    if ingredients:
+        variables["ingredientNameFirstLatter"] = ingredients[0].name[:1]
+    for ordinal, pk in zip(
+        ORDINALS, Recipe.objects.order_by("pk").values_list("pk", flat=True)
+    ):
+        variables[f"{ordinal}RecipeId"] = str(pk)
+    return variables
+
+
+def select_scenarios(scenarios, only=(), exclude=(), weights=None,
+                     include_writes=False):
+    """Фильтрует сценарии по маскам имён и назначает веса."""
+    selected = []
+    for scenario in scenarios:
+        if not include_writes and scenario.method not in SAFE_METHODS:
+            continue
+        if only and not any(
+            fnmatch.fnmatchcase(scenario.name, pattern) for pattern in only
+        ):
+            continue
+        if any(
+            fnmatch.fnmatchcase(scenario.name, pattern) for pattern in exclude
+        ):
+            continue
+        for pattern, weight in (weights or {}).items():
+            if fnmatch.fnmatchcase(scenario.name, pattern):
+                scenario.weight = weight
+        if scenario.weight > 0:
+            selected.append(scenario)
+    return selected
+
+
+class WSGITransport:
+    """Запросы к WSGI-приложению Django в этом же процессе."""
+
+    def __init__(self, base_url):
+        self.handler = WSGIHandler()
+
+    def request(self, scenario):
+        url = urlsplit(scenario.url)
+        body = scenario.body.encode()
+        environ = {
+            "REQUEST_METHOD": scenario.method,
+            "PATH_INFO": url.path,
+            "QUERY_STRING": url.query,
+            "SERVER_NAME": url.hostname or "localhost",
+            "SERVER_PORT": str(url.port or 80),
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "REMOTE_ADDR": "127.0.0.1",
+            "HTTP_HOST": url.netloc or "localhost",
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": url.scheme or "http",
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for key, value in scenario.headers.items():
+            key = key.upper().replace("-", "_")
+            if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+                key = f"HTTP_{key}"
+            environ[key] = value
+
+        status = []
+        response = self.handler(
+            environ, lambda line, headers, *args: status.append(line))
+        try:
+            for _ in response:
+                pass
+        finally:
+            response.close()
+        return int(status[0].split()[0])
+
+    def close(self):
+        connections.close_all()
+
+
+class HTTPTransport:
+    """Запросы по HTTP с keep-alive, одно соединение на поток."""
+
+    def __init__(self, base_url):
+        url = urlsplit(base_url)
+        connection_class = (
+            http.client.HTTPSConnection
+            if url.scheme == "https" else http.client.HTTPConnection
+        )
+        self.connection = connection_class(url.netloc, timeout=30)
+
+    def request(self, scenario):
+        url = urlsplit(scenario.url)
+        path = url.path + (f"?{url.query}" if url.query else "")
+        try:
+            self.connection.request(
+                scenario.method, path, scenario.body.encode() or None,
+                scenario.headers)
+            response = self.connection.getresponse()
+        except (http.client.HTTPException, ConnectionError):
+            # Сервер закрыл keep-alive соединение — повторяем один раз.
+            self.connection.close()
+            self.connection.request(
+                scenario.method, path, scenario.body.encode() or None,
+                scenario.headers)
+            response = self.connection.getresponse()
+        response.read()
+        return response.status
+
+    def close(self):
+        self.connection.close()
+
+
+TRANSPORTS = {"wsgi": WSGITransport, "http": HTTPTransport}
+
+
+@dataclass
+class Stats:
+    latencies: list = field(default_factory=list)
+    statuses: dict = field(default_factory=dict)
+    errors: int = 0
+
+    def add(self, latency, status):
+        self.latencies.append(latency)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if status is None or status >= 500:
+            self.errors += 1
+
+    def merge(self, other):
+        self.latencies += other.latencies
+        self.errors += other.errors
+        for status, count in other.statuses.items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+
+    def summary(self, elapsed):
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        result = {
+            "count": count,
+            "rps": round(count / elapsed, 2) if elapsed else 0,
+            "error_rate": round(self.errors / count, 4) if count else 0,
+            "statuses": {
+                str(status): total
+                for status, total in sorted(
+                    self.statuses.items(), key=lambda item: str(item[0]))
+            },
+        }
+        if count:
+            result["mean_ms"] = round(sum(latencies) / count * 1000, 2)
+            for percentile in PERCENTILES:
+                index = min(count - 1, int(count * percentile / 100))
+                result[f"p{percentile}_ms"] = round(
+                    latencies[index] * 1000, 2)
+            result["max_ms"] = round(latencies[-1] * 1000, 2)
+        return result
+
+
+class Schedule:
+    """Общая для потоков последовательность сценариев с фиксированным seed."""
+
+    def __init__(self, scenarios, seed, requests=None, duration=None):
+        self.scenarios = scenarios
+        self.weights = [scenario.weight for scenario in scenarios]
+        self.random = random.Random(seed)
+        self.remaining = requests
+        self.deadline = duration and time.monotonic() + duration
+        self.lock = threading.Lock()
+
+    def next(self):
+        with self.lock:
+            if self.remaining is not None:
+                if self.remaining <= 0:
+                    return None
+                self.remaining -= 1
+            if self.deadline and time.monotonic() >= self.deadline:
+                return None
+            return self.random.choices(self.scenarios, self.weights)[0]
+
+
+def _worker(transport_class, base_url, schedule, results):
+    transport = transport_class(base_url)
+    stats = {}
+    try:
+        while True:
+            scenario = schedule.next()
+            if scenario is None:
+                break
+            started = time.perf_counter()
+            try:
+                status = transport.request(scenario)
+            except Exception:
+                status = None
+            stats.setdefault(scenario.name, Stats()).add(
+                time.perf_counter() - started, status)
+    finally:
+        transport.close()
+        results.append(stats)
+
+
+def run(scenarios, transport="wsgi", base_url="", concurrency=1,
+        requests=None, duration=None, seed=0, warmup=True):
+    """Прогон сценариев; возвращает отчёт в виде словаря."""
+    transport_class = TRANSPORTS[transport]
+    if warmup:
+        warm = transport_class(base_url)
+        try:
+            for scenario in scenarios:
+                try:
+                    warm.request(scenario)
+                except Exception:
+                    pass
+        finally:
+            warm.close()
+
+    schedule = Schedule(scenarios, seed, requests, duration)
+    results = []
+    threads = [
+        threading.Thread(
+            target=_worker,
+            args=(transport_class, base_url, schedule, results),
+        )
+        for _ in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    total, by_scenario = Stats(), {}
+    for stats in results:
+        for name, scenario_stats in stats.items():
+            by_scenario.setdefault(name, Stats()).merge(scenario_stats)
+            total.merge(scenario_stats)
+    return {
+        "meta": {
+            "transport": transport,
+            "concurrency": concurrency,
+            "requests": requests,
+            "duration": duration,
+            "seed": seed,
+            "elapsed_s": round(elapsed, 3),
+        },
+        "total": total.summary(elapsed),
+        "scenarios": {
+            name: by_scenario[name].summary(elapsed)
+            for name in sorted(by_scenario)
+        },
+    }
+
+
+def compare(baseline, current, threshold):
+    """
+    Сценарии, где p95 вырос больше чем на threshold процентов или
+    выросла доля ошибок: список (имя, было, стало, описание).
+    """
+    regressions = []
+    for name, now in current["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if not before or "p95_ms" not in before or "p95_ms" not in now:
+            continue
+        if now["p95_ms"] > before["p95_ms"] * (1 + threshold / 100):
+            regressions.append(
+                (name, before["p95_ms"], now["p95_ms"], "p95, ms"))
+        if now["error_rate"] > before["error_rate"]:
+            regressions.append(
+                (name, before["error_rate"], now["error_rate"],
+                 "error rate"))
+    return regressions
@@ -0,0 +1,114 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from api.fast_serializers import (
+    IngredientValuesSerializer,
+    RecipeMinifiedValuesSerializer,
+    RecipeValuesSerializer,
+    TagValuesSerializer,
+)
+from api.serializers import (
+    IngredientSerializer,
+    RecipeMinifiedSerializer,
+    RecipeReadSerializer,
+    TagSerializer,
+)
+from recipes.models import Ingredient, Recipe, Tag, User
+
+CARD_FIELDS = frozenset(
+    ("id", "name", "image", "cooking_time",
+     "is_favorited", "is_in_shopping_cart")
+)
+
+
+class Command(BaseCommand):
+    """
+    Сверяет JSON быстрых сериализаторов с DRF на текущей базе
+    и меряет пропускную способность обоих путей.
+    """
+
+    help = "Check parity and benchmark values()-based serializers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=100,
+                            help="Rows per case")
+        parser.add_argument("--repeat", type=int, default=20,
+                            help="Timed runs per case")
+        parser.add_argument("--user", help="Email of the requesting user")
+        parser.add_argument("--host", default="localhost",
+                            help="Host for absolute media URLs")
+
+    def handle(self, *args, **options):
+        request = RequestFactory().get("/api/", HTTP_HOST=options["host"])
+        request.user = (
+            User.objects.get(email=options["user"])
+            if options["user"] else AnonymousUser()
+        )
+        limit = options["limit"]
+        recipes = Recipe.objects.all()[:limit]
+        full_recipes = (
+            Recipe.objects.select_related("author")
+            .prefetch_related("tags", "recipe_ingredients__ingredient")
+        )[:limit]
+
+        cases = (
+            ("tags", TagSerializer, Tag.objects.all()[:limit],
+             TagValuesSerializer, None),
+            ("ingredients", IngredientSerializer,
+             Ingredient.objects.all()[:limit],
+             IngredientValuesSerializer, None),
+            ("recipes_minified", RecipeMinifiedSerializer, recipes,
+             RecipeMinifiedValuesSerializer, None),
+            ("recipes", RecipeReadSerializer, full_recipes,
+             RecipeValuesSerializer, None),
+            ("recipes_cards", RecipeReadSerializer, recipes,
+             RecipeValuesSerializer, CARD_FIELDS),
+        )
+
+        renderer = JSONRenderer()
+        mismatches = []
+        self.stdout.write(
+            f"{'case':<18}{'rows':>6}{'drf, ms':>10}{'fast, ms':>10}"
+            f"{'speedup':>9}"
+        )
+        for name, drf_class, queryset, fast_class, fields in cases:
+            def drf():
+                return renderer.render(drf_class(
+                    queryset.all(),
+                    many=True,
+                    context={"request": request, "fields": fields},
+                ).data)
+
+            def fast():
+                return renderer.render(fast_class(
+                    request=request, fields=fields).serialize(queryset.all()))
+
+            expected, actual = drf(), fast()
+            if expected != actual:
+                mismatches.append(name)
+
+            drf_time = self._measure(drf, options["repeat"])
+            fast_time = self._measure(fast, options["repeat"])
+            self.stdout.write(
+                f"{name:<18}{queryset.count():>6}{drf_time * 1000:>10.2f}"
+                f"{fast_time * 1000:>10.2f}"
+                f"{drf_time / fast_time if fast_time else 0:>8.1f}x"
+            )
+
+        if mismatches:
+            raise CommandError(
+                f"Output differs from DRF: {', '.join(mismatches)}")
+        self.stdout.write(self.style.SUCCESS("✓ Output is identical"))
+
+    @staticmethod
+    def _measure(func, repeat):
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - started)
+        return best
@@ -0,0 +1,174 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import loadtest
+
+DEFAULT_COLLECTION = (
+    Path(settings.BASE_DIR).parent
+    / "postman_collection" / "foodgram.postman_collection.json"
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay requests from the Postman collection under load and report "
+        "throughput, latency percentiles and error rates"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--collection", default=str(DEFAULT_COLLECTION),
+            help="Path to the Postman collection",
+        )
+        parser.add_argument(
+            "--transport", choices=sorted(loadtest.TRANSPORTS),
+            default="wsgi",
+            help="wsgi: in-process application; http: a running server",
+        )
+        parser.add_argument(
+            "--base-url", default=None,
+            help="Server address for --transport http (default: baseUrl "
+                 "from the collection)",
+        )
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument(
+            "--requests", type=int, default=1000,
+            help="Total requests; ignored when --duration is given",
+        )
+        parser.add_argument(
+            "--duration", type=float, default=None,
+            help="Run for this many seconds instead of a request count",
+        )
+        parser.add_argument(
+            "--seed", type=int, default=0,
+            help="Seed of the scenario sequence; keep it fixed to compare "
+                 "runs",
+        )
+        parser.add_argument(
+            "--only", action="append", default=[],
+            help="Glob on scenario names (\"folder / request\"), repeatable",
+        )
+        parser.add_argument(
+            "--exclude", action="append", default=None,
+            help="Glob on scenario names to skip, repeatable "
+                 "(default: *bad_requests*)",
+        )
+        parser.add_argument(
+            "--weights",
+            help="JSON file mapping scenario name globs to weights; "
+                 "weight 0 disables a scenario",
+        )
+        parser.add_argument(
+            "--var", action="append", default=[], metavar="NAME=VALUE",
+            help="Override a collection variable, repeatable",
+        )
+        parser.add_argument(
+            "--include-writes", action="store_true",
+            help="Also replay POST/PUT/PATCH/DELETE requests "
+                 "(they modify the database)",
+        )
+        parser.add_argument(
+            "--no-warmup", action="store_true",
+            help="Do not send every scenario once before measuring",
+        )
+        parser.add_argument("--output", help="Write the report as JSON")
+        parser.add_argument(
+            "--compare",
+            help="Baseline JSON report; fail on regressions",
+        )
+        parser.add_argument(
+            "--threshold", type=float, default=10,
+            help="Allowed p95 growth against the baseline, percent",
+        )
+
+    def handle(self, *args, **options):
+        scenarios, variables = loadtest.load_collection(
+            options["collection"])
+        variables.update(loadtest.database_variables())
+        for item in options["var"]:
+            name, _, value = item.partition("=")
+            variables[name] = value
+        base_url = options["base_url"] or variables.get("baseUrl", "")
+        variables["baseUrl"] = base_url.rstrip("/")
+
+        weights = None
+        if options["weights"]:
+            with open(options["weights"], encoding="utf-8") as file:
+                weights = json.load(file)
+        selected = loadtest.select_scenarios(
+            scenarios,
+            only=options["only"],
+            exclude=(
+                ["*bad_requests*"] if options["exclude"] is None
+                else options["exclude"]
+            ),
+            weights=weights,
+            include_writes=options["include_writes"],
+        )
+
+        runnable = []
+        for scenario in selected:
+            missing = scenario.variables() - variables.keys()
+            if missing:
+                self.stderr.write(
+                    f"Skipped {scenario.name}: no value for "
+                    f"{', '.join(sorted(missing))}"
+                )
+                continue
+            runnable.append(scenario.render(variables))
+        if not runnable:
+            raise CommandError("No scenarios to run.")
+
+        report = loadtest.run(
+            runnable,
+            transport=options["transport"],
+            base_url=variables["baseUrl"],
+            concurrency=options["concurrency"],
+            requests=None if options["duration"] else options["requests"],
+            duration=options["duration"],
+            seed=options["seed"],
+            warmup=not options["no_warmup"],
+        )
+        report["meta"]["weights"] = {
+            scenario.name: scenario.weight for scenario in runnable
+        }
+        self._print(report)
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as file:
+                baseline = json.load(file)
+            regressions = loadtest.compare(
+                baseline, report, options["threshold"])
+            for name, before, now, metric in regressions:
+                self.stdout.write(
+                    self.style.ERROR(
+                        f"{name}: {metric} {before} -> {now}"))
+            if regressions:
+                raise CommandError(
+                    f"{len(regressions)} regressions against "
+                    f"{options['compare']}"
+                )
+            self.stdout.write(self.style.SUCCESS("✓ No regressions"))
+
+    def _print(self, report):
+        header = (
+            f"{'scenario':<60} {'count':>6} {'rps':>8} {'err%':>6} "
+            f"{'p50':>8} {'p95':>8} {'p99':>8}"
+        )
+        self.stdout.write(header)
+        rows = list(report["scenarios"].items())
+        rows.append(("TOTAL", report["total"]))
+        for name, stats in rows:
+            self.stdout.write(
+                f"{name[-60:]:<60} {stats['count']:>6} {stats['rps']:>8} "
+                f"{stats['error_rate'] * 100:>6.2f} "
+                f"{stats.get('p50_ms', 0):>8} {stats.get('p95_ms', 0):>8} "
+                f"{stats.get('p99_ms', 0):>8}"
+            )
@@ -0,0 +1,41 @@
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Delete cached shopping list files that were not used recently"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-age",
+            type=int,
+            default=settings.SHOPPING_LISTS_TTL,
+            help="Seconds since the last download",
+        )
+
+    def handle(self, *args, **options):
+        root = Path(settings.SHOPPING_LISTS_ROOT)
+        if not root.exists():
+            return
+        deadline = time.time() - options["max_age"]
+        removed = 0
+        for directory in root.iterdir():
+            if not directory.is_dir():
+                continue
+            for path in directory.iterdir():
+                try:
+                    if path.stat().st_mtime < deadline:
+                        path.unlink()
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+            try:
+                directory.rmdir()
+            except OSError:
+                pass
+
+        self.stdout.write(
+            self.style.SUCCESS(f"✓ Removed {removed} shopping list files"))
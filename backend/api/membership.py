@@ -0,0 +1,106 @@
+"""
+Множества id рецептов в избранном и корзине и id авторов в подписках
+пользователя — в общем кеше.
+
+Ключ версии увеличивается при каждом изменении, данные лежат под
+ключом конкретной версии. Запись обновляет множество на месте, только
+если между чтением и увеличением версии никто не вмешался; иначе новая
+версия остаётся без данных и при следующем чтении соберётся из базы.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router, transaction
+
+from recipes.models import Favorite, ShoppingCart, Subscription
+
+FAVORITES = "favorites"
+SHOPPING_CART = "shopping_cart"
+SUBSCRIPTIONS = "subscriptions"
+
+# Вид множества -> (модель, колонка с id элемента).
+KINDS = {
+    FAVORITES: (Favorite, "recipe_id"),
+    SHOPPING_CART: (ShoppingCart, "recipe_id"),
+    SUBSCRIPTIONS: (Subscription, "author_id"),
+}
+KIND_BY_MODEL = {model: kind for kind, (model, _) in KINDS.items()}
+
+
+def _version_key(kind, user_id):
+    return f"membership:{kind}:{user_id}"
+
+
+def _data_key(kind, user_id, version):
+    return f"membership:{kind}:{user_id}:{version}"
+
+
+def _initial_version():
+    # Версия после вытеснения ключа не должна совпасть с прежними.
+    return time.time_ns()
+
+
+def get_versions(user_id, kinds=tuple(KINDS)):
+    keys = {_version_key(kind, user_id): kind for kind in kinds}
+    found = cache.get_many(keys)
+    versions = {}
+    for key, kind in keys.items():
+        if key not in found:
+            cache.add(key, _initial_version(), timeout=None)
+            found[key] = cache.get(key)
+        versions[kind] = found[key]
+    return versions
+
+
+def _bump(kind, user_id):
+    key = _version_key(kind, user_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_version(), timeout=None)
+        return None
+
+
+def get_members(kind, user_id):
+    """Множество id элементов вида kind у пользователя."""
+    version = get_versions(user_id, (kind,))[kind]
+    key = _data_key(kind, user_id, version)
+    members = cache.get(key)
+    if members is None:
+        model, column = KINDS[kind]
+        # Собираем с основной базы: реплика может не знать о свежей записи.
+        members = frozenset(
+            model.objects.using(router.db_for_write(model))
+            .filter(user_id=user_id)
+            .values_list(column, flat=True)
+        )
+        cache.set(key, members, settings.MEMBERSHIP_CACHE_TTL)
+    return members
+
+
+def _update(kind, user_id, change):
+    version = get_versions(user_id, (kind,))[kind]
+    members = cache.get(_data_key(kind, user_id, version))
+    new_version = _bump(kind, user_id)
+    if members is not None and new_version == version + 1:
+        cache.set(
+            _data_key(kind, user_id, new_version),
+            change(members),
+            settings.MEMBERSHIP_CACHE_TTL,
+        )
+
+
+def add_members(kind, user_id, item_ids):
+    transaction.on_commit(
+        lambda: _update(kind, user_id, lambda members: members | item_ids))
+
+
+def remove_members(kind, user_id, item_ids):
+    transaction.on_commit(
+        lambda: _update(kind, user_id, lambda members: members - item_ids))
+
+
+def reset_members(kind, user_id):
+    """Сбрасывает множество: следующее чтение соберёт его из базы."""
+    transaction.on_commit(lambda: _bump(kind, user_id))
@@ -0,0 +1,43 @@
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+
+INGREDIENTS_PARAM = "ingredients"
+MAX_MISSING_PARAM = "max_missing"
+
+
+def _to_int(value, param):
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValidationError({param: f"Ожидается целое число: {value}."})
+    if number < 0:
+        raise ValidationError(
+            {param: f"Число не может быть меньше 0: {value}."})
+    return number
+
+
+def get_pantry_params(request):
+    """
+    Ингредиенты кладовой из ingredients=1,2,3 (параметр можно повторять)
+    и необязательный предел недостающих ингредиентов max_missing=.
+    """
+    params = request.query_params
+    ingredient_ids = {
+        _to_int(value.strip(), INGREDIENTS_PARAM)
+        for raw in params.getlist(INGREDIENTS_PARAM)
+        for value in raw.split(",")
+        if value.strip()
+    }
+    if not ingredient_ids:
+        raise ValidationError(
+            {INGREDIENTS_PARAM: "Нужен хотя бы один ингредиент."})
+    if len(ingredient_ids) > settings.PANTRY_MAX_INGREDIENTS:
+        raise ValidationError({
+            INGREDIENTS_PARAM:
+            f"Не больше {settings.PANTRY_MAX_INGREDIENTS} ингредиентов."
+        })
+
+    max_missing = params.get(MAX_MISSING_PARAM)
+    if max_missing is not None:
+        max_missing = _to_int(max_missing, MAX_MISSING_PARAM)
+    return ingredient_ids, max_missing
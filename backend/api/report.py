@@ -1,10 +1,7 @@
-from datetime import datetime
-
 from django.template import Context, Engine
 
 TEMPLATE = """
 Список покупок
-Дата: {{ date }}
 
 Продукты:
 {% for n, row in products %}
@@ -24,7 +21,6 @@ def render_shopping_list(products, recipes):
 
     context = Context(
         {
-            "date": datetime.now().strftime("%d.%m.%Y %H:%M"),
             "products": list(enumerate(products, start=1)),
             "recipes": list(enumerate(recipes, start=1)),
         }
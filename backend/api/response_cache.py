@@ -0,0 +1,203 @@
+"""
+Кеш готовых ответов о рецептах для анонимов.
+
+Ключ — хост, путь, формат ответа и нормализованная строка запроса: только
+параметры CACHED_PARAMS, с любыми другими ответ не кешируется. Запись
+помечена метками зависимостей: рецепты, авторы и теги из ответа, а у
+списка — ещё выборка, которой он отфильтрован (все рецепты, автор, теги
+по id и по slug из запроса).
+
+Метка хранит время последней инвалидации, запись — время, когда её
+начали собирать. Запись действительна, только если её начали собирать
+не раньше, чем инвалидировали любую из её меток: ответ, собранный по
+данным до записи в базу и сохранённый после неё, не оживёт. Метки
+сбрасываются после коммита; при репликах — с запасом REPLICA_MAX_LAG,
+пока реплики могут отдавать прежние данные.
+
+Недействительная или истёкшая запись ещё RESPONSE_CACHE_STALE секунд
+остаётся устаревшей: пока один запрос её пересчитывает (api.single_flight),
+остальные получают её, а не идут в базу.
+"""
+import time
+from hashlib import md5
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+
+from recipes.models import Tag
+
+CACHED_PARAMS = ("page", "limit", "tags", "author")
+STORED_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Cache-Control")
+
+# Метка списка без фильтров по автору и тегам.
+RECIPES = "recipes"
+
+
+def recipe_label(pk):
+    return f"recipe:{pk}"
+
+
+def author_label(pk):
+    return f"author:{pk}"
+
+
+def tag_label(pk):
+    return f"tag:{pk}"
+
+
+def tag_slug_label(slug):
+    # Slug приходит из запроса как есть: в ключе кеша — только хеш.
+    return f"tag-slug:{md5(slug.encode()).hexdigest()}"
+
+
+def _label_key(label):
+    return f"response_cache:label:{label}"
+
+
+def _entry_key(key):
+    return f"response_cache:entry:{key}"
+
+
+def get_key(request):
+    """Ключ ответа на запрос или None, если ответ не кешируется."""
+    if (
+        settings.RESPONSE_CACHE_TTL <= 0
+        or request.method not in ("GET", "HEAD")
+        or request.user.is_authenticated
+        or not set(request.query_params) <= set(CACHED_PARAMS)
+        # Метка автора — целый id: с author=1.0 её бы не нашли.
+        or not request.query_params.get("author", "0").isdigit()
+    ):
+        return None
+    query = urlencode(sorted(
+        (name, value)
+        for name in CACHED_PARAMS
+        for value in set(request.query_params.getlist(name))
+    ))
+    raw = "|".join((
+        request.get_host(),
+        request.path,
+        request.accepted_media_type or "",
+        query,
+    ))
+    return md5(raw.encode()).hexdigest()
+
+
+class Entry:
+    """Запись кеша: свежая или устаревшая (stale_since — с какого момента)."""
+
+    def __init__(self, headers, content, stale_since):
+        self.headers = headers
+        self.content = content
+        self.stale_since = stale_since
+
+    @property
+    def fresh(self):
+        return self.stale_since is None
+
+    @property
+    def servable_stale(self):
+        """Можно отдать, пока ответ пересчитывает другой запрос."""
+        return (
+            time.time() - self.stale_since <= settings.RESPONSE_CACHE_STALE)
+
+    def respond(self, request):
+        """Ответ из записи или 304 по её ETag."""
+        response = HttpResponse(
+            self.content, content_type=self.headers["Content-Type"])
+        for name, value in self.headers.items():
+            response[name] = value
+        return get_conditional_response(
+            request, etag=self.headers.get("ETag"), response=response)
+
+
+def lookup(key):
+    """Запись по ключу, свежая или устаревшая, либо None."""
+    entry = cache.get(_entry_key(key))
+    if entry is None:
+        return None
+    started, labels, headers, content = entry
+    invalidated = cache.get_many([_label_key(label) for label in labels])
+    # Вытесненная метка могла быть сброшена когда угодно.
+    if len(invalidated) < len(labels):
+        return None
+    stale_since = [at for at in invalidated.values() if at > started]
+    expires = started + settings.RESPONSE_CACHE_TTL
+    if stale_since or time.time() >= expires:
+        return Entry(headers, content, min([expires, *stale_since]))
+    return Entry(headers, content, None)
+
+
+def get_fresh(key):
+    entry = lookup(key)
+    return entry if entry is not None and entry.fresh else None
+
+
+def store(key, started, labels, response):
+    """Сохраняет отрисованный ответ, начатый в started (time.time())."""
+    labels = sorted(set(labels))
+    keys = [_label_key(label) for label in labels]
+    known = cache.get_many(keys)
+    for label_key in keys:
+        if label_key not in known:
+            cache.add(label_key, started, timeout=None)
+    headers = {
+        name: response[name]
+        for name in STORED_HEADERS
+        if response.has_header(name)
+    }
+    cache.set(
+        _entry_key(key),
+        (started, labels, headers, response.content),
+        # Дольше свежести: устаревшую запись отдают, пока её пересчитывают.
+        settings.RESPONSE_CACHE_TTL + settings.RESPONSE_CACHE_STALE,
+    )
+
+
+def invalidate(labels, using=None):
+    """Сбрасывает записи с этими метками после коммита транзакции."""
+    labels = set(labels)
+    if not labels:
+        return
+
+    def bump():
+        at = time.time()
+        if settings.DATABASE_REPLICAS:
+            at += settings.REPLICA_MAX_LAG
+        cache.set_many(
+            {_label_key(label): at for label in labels}, timeout=None)
+
+    transaction.on_commit(bump, using=using)
+
+
+def recipe_labels(recipes):
+    """Метки рецептов из ответа: сами рецепты, их авторы и теги."""
+    for recipe in recipes:
+        yield recipe_label(recipe["id"])
+        yield author_label(recipe["author"]["id"])
+        for tag in recipe["tags"]:
+            yield tag_label(tag["id"])
+
+
+def filter_labels(request):
+    """Метки выборки, которой отфильтрован список рецептов."""
+    params = request.query_params
+    author = params.get("author")
+    slugs = params.getlist("tags")
+    if author:
+        yield author_label(int(author))
+    if slugs:
+        # Тега с таким slug может ещё не быть: его создание сбросит
+        # записи по slug, а не только по id.
+        for slug in set(slugs):
+            yield tag_slug_label(slug)
+        for pk in Tag.objects.filter(slug__in=slugs).values_list(
+            "pk", flat=True
+        ):
+            yield tag_label(pk)
+    if not (author or slugs):
+        yield RECIPES
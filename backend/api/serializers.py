@@ -1,19 +1,22 @@
 from collections import Counter
 
+from django.conf import settings
+from django.db import transaction
 from djoser.serializers import UserSerializer as DjoserUserSerializer
 from rest_framework import serializers
 
+from recipes.counters import COUNTERS
 from recipes.models import (
     MIN_COOKING_TIME,
     MIN_INGREDIENT_AMOUNT,
     Ingredient,
     IngredientInRecipe,
     Recipe,
-    Subscription,
     Tag,
     User,
 )
 
+from . import membership
 from .fields import Base64ImageField
 
 
@@ -30,8 +33,8 @@ class UserSerializer(DjoserUserSerializer):
         return (
             request
             and request.user.is_authenticated
-            and Subscription.objects.filter(
-                user=request.user, author=user).exists()
+            and user.pk in membership.get_members(
+                membership.SUBSCRIPTIONS, request.user.pk)
         )
 
 
@@ -47,9 +50,15 @@ class AvatarSerializer(serializers.Serializer):
         raise NotImplementedError
 
 
+class UserStatsSerializer(UserSerializer):
+    """Пользователь со счётчиками, по запросу with_counters=1."""
+
+    class Meta(UserSerializer.Meta):
+        fields = (*UserSerializer.Meta.fields, *COUNTERS)
+        read_only_fields = fields
+
+
 class UserWithRecipesSerializer(UserSerializer):
-    recipes_count = serializers.IntegerField(
-        read_only=True, source="recipes.count")
     recipes = serializers.SerializerMethodField()
 
     class Meta(UserSerializer.Meta):
@@ -106,6 +115,16 @@ class RecipeMinifiedSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список рецептов для пакетных операций с избранным и корзиной."""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.RELATION_BULK_MAX_SIZE,
+    )
+
+
 class RecipeIngredientWriteSerializer(serializers.Serializer):
     id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
     amount = serializers.IntegerField(min_value=MIN_INGREDIENT_AMOUNT)
@@ -171,6 +190,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             )
         return value
 
+    @transaction.atomic
     def create(self, validated_data):
         items = validated_data.pop("ingredients")
         tags = validated_data.pop("tags")
@@ -179,6 +199,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         self._set_ingredients(recipe, items)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         items = validated_data.pop("ingredients")
         tags = validated_data.pop("tags")
@@ -206,7 +227,22 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         return RecipeReadSerializer(instance, context=self.context).data
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class SparseFieldsetMixin:
+    """Оставляет только поля из context["fields"], если он задан."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = self.context.get("fields")
+        if requested is None:
+            return fields
+        return {
+            name: field
+            for name, field in fields.items()
+            if name in requested
+        }
+
+
+class RecipeReadSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
 
     author = UserSerializer(read_only=True)
     tags = TagSerializer(many=True, read_only=True)
@@ -234,19 +270,17 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         )
         read_only_fields = fields
 
-    def _check_relation(self, recipe, relation_name):
+    def _check_relation(self, recipe, kind):
         user = self.context["request"].user
         if not user.is_authenticated:
             return False
-        relation = getattr(recipe, relation_name)
-        return (user.is_authenticated
-                and relation.filter(user=user).exists())
+        return recipe.pk in membership.get_members(kind, user.pk)
 
     def get_is_favorited(self, recipe):
-        return self._check_relation(recipe, "favorites")
+        return self._check_relation(recipe, membership.FAVORITES)
 
     def get_is_in_shopping_cart(self, recipe):
-        return self._check_relation(recipe, "shopping_cart")
+        return self._check_relation(recipe, membership.SHOPPING_CART)
 
 
 def _get_duplicates(values):
@@ -0,0 +1,101 @@
+"""
+Готовые файлы списка покупок:
+<SHOPPING_LISTS_ROOT>/<user_id>/<FILE_FORMAT>-<версия>.txt.
+
+Версия складывается из версии корзины в membership и последнего
+изменения рецептов в ней, поэтому повторная выгрузка без изменений
+отдаёт уже отрендеренный файл — как есть, через sendfile. Даты выгрузки
+в файле нет: она в заголовке Date ответа. Время последнего
+обращения хранится в mtime файла — по нему старые файлы удаляет
+sweep_shopping_lists.
+"""
+import os
+import tempfile
+from contextlib import suppress
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count, F, Max, Sum
+
+from recipes.models import IngredientInRecipe, Recipe
+
+from . import membership
+from .report import render_shopping_list
+
+# Меняется вместе с содержимым файла: файлы прежнего формата перестают
+# совпадать по имени и удаляются при следующей выгрузке.
+FILE_FORMAT = 3
+
+
+def _cart_version(user):
+    cart_version = membership.get_versions(
+        user.pk, (membership.SHOPPING_CART,))[membership.SHOPPING_CART]
+    state = Recipe.objects.filter(shopping_cart__user=user).aggregate(
+        count=Count("pk"), last_modified=Max("updated"))
+    last_modified = state["last_modified"]
+    return "{}-{}-{}".format(
+        cart_version,
+        state["count"],
+        int(last_modified.timestamp() * 1e6) if last_modified else 0,
+    )
+
+
+def _render(user):
+    products = (
+        IngredientInRecipe.objects.filter(
+            recipe__shopping_cart__user=user)
+        .values(name=F("ingredient__name"),
+                unit=F("ingredient__measurement_unit"))
+        .annotate(total=Sum("amount"))
+        .order_by("name")
+    )
+    recipes = (
+        Recipe.objects.filter(shopping_cart__user=user)
+        .select_related("author")
+        .order_by("name")
+    )
+    return render_shopping_list(products, recipes)
+
+
+def _write_atomic(path, text):
+    """
+    Пишет файл через временный и возвращает его, открытый на чтение:
+    если более новая версия тут же удалит файл, handle останется рабочим.
+    """
+    handle, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    file = os.fdopen(handle, "w+b")
+    try:
+        file.write(text.encode("utf-8"))
+        file.flush()
+        os.replace(temp_path, path)
+    except BaseException:
+        file.close()
+        with suppress(FileNotFoundError):
+            os.unlink(temp_path)
+        raise
+    file.seek(0)
+    return file
+
+
+def get_shopping_list_file(user):
+    """Открытый на чтение файл актуального списка покупок пользователя."""
+    directory = Path(settings.SHOPPING_LISTS_ROOT) / str(user.pk)
+    path = directory / f"{FILE_FORMAT}-{_cart_version(user)}.txt"
+    try:
+        # По дескриптору, а не по имени: FileResponse узнавал бы размер
+        # по пути, которого к отдаче может уже не быть.
+        file = os.fdopen(os.open(path, os.O_RDONLY), "rb")
+    except FileNotFoundError:
+        pass
+    else:
+        # Файл уже открыт: удаление после open() ему не помешает.
+        with suppress(FileNotFoundError):
+            os.utime(path)
+        return file
+
+    directory.mkdir(parents=True, exist_ok=True)
+    file = _write_atomic(path, _render(user))
+    for stale in directory.glob("*.txt"):
+        if stale != path:
+            stale.unlink(missing_ok=True)
+    return file
@@ -0,0 +1,168 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from foodgram import invalidation
+from rest_framework.authtoken.models import Token
+
+from recipes import changes
+from recipes.deletion import pre_bulk_delete
+from recipes.models import (
+    Favorite,
+    Recipe,
+    RecipeChange,
+    ShoppingCart,
+    Subscription,
+    Tag,
+)
+from recipes.relations import relations_changed
+from recipes.signals import author_changed
+
+from . import membership, response_cache
+from .authentication import forget_user
+from .response_cache import (
+    RECIPES,
+    author_label,
+    recipe_label,
+    tag_label,
+    tag_slug_label,
+)
+
+User = get_user_model()
+
+
+@receiver(user_logged_out)
+def user_logged_out_handler(sender, user, **kwargs):
+    if user is not None:
+        forget_user(user.pk)
+
+
+# Кеш токенов во всех процессах чистит подписка в api.authentication:
+# пользователей по шине рассылают recipes.signals, токены — здесь.
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, using, **kwargs):
+    invalidation.publish([invalidation.model_key(Token, instance.key)], using)
+
+
+# Ответы со сменившимся автором сбрасываем, с паролем или last_login — нет.
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, using, **kwargs):
+    if not created and author_changed(instance):
+        response_cache.invalidate([author_label(instance.pk)], using)
+
+
+# recipes.deletion удаляет строки без post_delete — рассылаем по пачкам.
+@receiver(pre_bulk_delete, sender=Token)
+def tokens_bulk_deleted(sender, pks, using, **kwargs):
+    invalidation.publish(
+        (invalidation.model_key(Token, key) for key in pks), using)
+
+
+@receiver(pre_bulk_delete, sender=Favorite)
+@receiver(pre_bulk_delete, sender=ShoppingCart)
+@receiver(pre_bulk_delete, sender=Subscription)
+def relations_bulk_deleted(sender, pks, using, **kwargs):
+    kind = membership.KIND_BY_MODEL[sender]
+    user_ids = (
+        sender._base_manager.using(using)
+        .filter(pk__in=pks)
+        .order_by()
+        .values_list("user_id", flat=True)
+        .distinct()
+    )
+    for user_id in user_ids:
+        membership.reset_members(kind, user_id)
+
+
+@receiver(relations_changed, sender=Favorite)
+@receiver(relations_changed, sender=ShoppingCart)
+@receiver(relations_changed, sender=Subscription)
+def relations_changed_in_admin(sender, user_ids, **kwargs):
+    kind = membership.KIND_BY_MODEL[sender]
+    for user_id in user_ids:
+        membership.reset_members(kind, user_id)
+
+
+# Кеш ответов для анонимов. Содержимое рецепта (в том числе теги,
+# ингредиенты и автор в его представлении) меняется только с записью
+# в журнал изменений; остальные получатели сбрасывают выборки списков:
+# все рецепты, рецепты автора и рецепты с тегом.
+@receiver(changes.recorded, sender=RecipeChange)
+def recipe_change_recorded(sender, target, recipe_ids, using, **kwargs):
+    if target == RecipeChange.RECIPE:
+        response_cache.invalidate(map(recipe_label, recipe_ids), using)
+
+
+@receiver(pre_save, sender=Recipe)
+def recipe_author_changing(sender, instance, raw, using, **kwargs):
+    # Прежнего автора запомнил recipes.signals.remember_counted_owners.
+    old = instance.__dict__.get("_counted_owners")
+    if not raw and old and old["author_id"] != instance.author_id:
+        response_cache.invalidate(
+            [author_label(old["author_id"]), author_label(instance.author_id)],
+            using,
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, raw, using, **kwargs):
+    if created and not raw:
+        response_cache.invalidate(
+            [RECIPES, author_label(instance.author_id)], using)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(sender, instance, using, **kwargs):
+    tag_ids = instance.tags.values_list("pk", flat=True)
+    response_cache.invalidate(
+        [RECIPES, author_label(instance.author_id), *map(tag_label, tag_ids)],
+        using,
+    )
+
+
+# bulk_delete удаляет связи с тегами раньше самих рецептов.
+@receiver(pre_bulk_delete, sender=Recipe.tags.through)
+def recipe_tags_bulk_deleted(sender, pks, using, **kwargs):
+    tag_ids = (
+        sender._base_manager.using(using).filter(pk__in=pks)
+        .order_by().values_list("tag_id", flat=True).distinct()
+    )
+    response_cache.invalidate(map(tag_label, tag_ids), using)
+
+
+@receiver(pre_bulk_delete, sender=Recipe)
+def recipes_bulk_deleted(sender, pks, using, **kwargs):
+    author_ids = (
+        sender._base_manager.using(using).filter(pk__in=pks)
+        .order_by().values_list("author_id", flat=True).distinct()
+    )
+    response_cache.invalidate([RECIPES, *map(author_label, author_ids)], using)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, using,
+                        **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if reverse:
+        tag_ids = [instance.pk]
+    elif action == "pre_clear":
+        tag_ids = instance.tags.values_list("pk", flat=True)
+    else:
+        tag_ids = pk_set
+    response_cache.invalidate(map(tag_label, tag_ids), using)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, instance, using, created=False, **kwargs):
+    labels = [tag_slug_label(instance.slug)]
+    if not created:
+        labels.append(tag_label(instance.pk))
+    response_cache.invalidate(labels, using)
@@ -0,0 +1,113 @@
+"""
+Одно вычисление на ключ: одинаковые запросы ждут того, что уже идёт.
+
+Внутри процесса ведущий поток держит threading.Event, остальные потоки
+ждут его. Между процессами ведущий тот, кто первым занял ключ в общем
+кеше (cache.add); ведомые опрашивают результат, пока ключ занят. Если
+ведущий упал, ключ истекает через SINGLE_FLIGHT_TIMEOUT секунд, и ведомые
+считают сами.
+"""
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+POLL_INTERVAL = 0.05
+
+
+class Flight:
+
+    def __init__(self, group, key, event, token):
+        self.group = group
+        self.key = key
+        self._event = event
+        self._token = token
+        # Ведущий: вычисляет сам, остальные ждут его.
+        self.leader = token is not None
+
+    def wait(self, check):
+        """
+        Ждёт ведущего; возвращает check() — результат, который тот
+        сохранил, — или None, если не дождались.
+        """
+        deadline = time.monotonic() + settings.SINGLE_FLIGHT_TIMEOUT
+        lock_key = self.group.lock_key(self.key)
+        while time.monotonic() < deadline:
+            if self._event is not None:
+                # Ведущий — поток этого процесса.
+                self._event.wait(deadline - time.monotonic())
+                return check()
+            result = check()
+            if result is not None:
+                return result
+            if cache.get(lock_key) is None:
+                return check()
+            time.sleep(POLL_INTERVAL)
+        return None
+
+    def leave(self):
+        """Ведомый не ждёт ведущего (например, отдал устаревший ответ)."""
+
+    def release(self):
+        if self._token is None:
+            return
+        lock_key = self.group.lock_key(self.key)
+        # Ключ мог истечь и достаться другому процессу — его не трогаем.
+        if cache.get(lock_key) == self._token:
+            cache.delete(lock_key)
+        self.group.finish(self.key)
+
+
+class SingleFlight:
+    """Группа ключей с общим префиксом в общем кеше."""
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self._events = {}
+        self._lock = threading.Lock()
+
+    def lock_key(self, key):
+        return f"single_flight:{self.prefix}:{key}"
+
+    def start(self, key):
+        """
+        Flight для ключа. Ведущий (flight.leader) обязан вызвать
+        release(), ведомый — ждать wait() или вызвать leave().
+        """
+        with self._lock:
+            event = self._events.get(key)
+            if event is not None:
+                return Flight(self, key, event, None)
+            event = self._events[key] = threading.Event()
+
+        token = uuid.uuid4().hex
+        if cache.add(
+            self.lock_key(key), token, settings.SINGLE_FLIGHT_TIMEOUT
+        ):
+            return Flight(self, key, None, token)
+        # Вычисляет другой процесс: этот поток ждёт его, а потоки этого
+        # процесса — этот поток.
+        return _RemoteFlight(self, key, None, None)
+
+    def finish(self, key):
+        with self._lock:
+            event = self._events.pop(key, None)
+        if event is not None:
+            event.set()
+
+
+class _RemoteFlight(Flight):
+    """Ведомый другого процесса, но ведущий для потоков своего."""
+
+    def wait(self, check):
+        try:
+            return super().wait(check)
+        finally:
+            self.group.finish(self.key)
+
+    def leave(self):
+        # Иначе потоки этого процесса ждали бы его до таймаута, а
+        # следующий запрос по ключу не стал бы ведущим.
+        self.group.finish(self.key)
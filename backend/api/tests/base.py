@@ -0,0 +1,77 @@
+import io
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag, User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_image(color=(255, 0, 0), name="image.png"):
+    buffer = io.BytesIO()
+    Image.new("RGB", (2, 2), color).save(buffer, "PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), "image/png")
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, INVALIDATION_TRANSPORT="")
+class FoodgramTestCase(TestCase):
+    """Медиа во временном каталоге, кеш чистый в начале каждого теста."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    @staticmethod
+    def create_user(username, avatar=False):
+        return User.objects.create_user(
+            username=username,
+            email=f"{username}@example.com",
+            first_name=username.capitalize(),
+            last_name="Test",
+            password="Password-123",
+            avatar=make_image(name="avatar.png") if avatar else None,
+        )
+
+    @staticmethod
+    def client_for(user):
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=user).key}")
+        return client
+
+    @staticmethod
+    def create_recipe(author, name, tags=(), ingredients=()):
+        recipe = Recipe.objects.create(
+            author=author,
+            name=name,
+            text=f"{name} text",
+            cooking_time=10,
+            image=make_image(),
+        )
+        recipe.tags.set(tags)
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                recipe=recipe, ingredient=ingredient, amount=amount)
+            for ingredient, amount in ingredients
+        )
+        return recipe
+
+    @classmethod
+    def create_catalog(cls):
+        cls.breakfast = Tag.objects.create(name="Завтрак", slug="breakfast")
+        cls.dinner = Tag.objects.create(name="Ужин", slug="dinner")
+        cls.eggs = Ingredient.objects.create(
+            name="яйца", measurement_unit="шт")
+        cls.milk = Ingredient.objects.create(
+            name="молоко", measurement_unit="мл")
@@ -0,0 +1,32 @@
+from recipes.models import Recipe, RecipeChange
+
+from .base import FoodgramTestCase
+
+
+class AuthorSavedTest(FoodgramTestCase):
+    """Рецепты автора сдвигаются, только если изменились его поля в них."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = cls.create_user("author")
+        cls.recipe = cls.create_recipe(cls.author, "Омлет")
+
+    def updated(self):
+        return Recipe.objects.get(pk=self.recipe.pk).updated
+
+    def test_password_change_keeps_recipes(self):
+        updated = self.updated()
+        changes = RecipeChange.objects.count()
+        self.author.set_password("new-password")
+        self.author.save()
+        self.author.save(update_fields=["last_login"])
+        self.assertEqual(self.updated(), updated)
+        self.assertEqual(RecipeChange.objects.count(), changes)
+
+    def test_name_change_touches_recipes(self):
+        updated = self.updated()
+        self.author.first_name = "Новое имя"
+        self.author.save()
+        self.assertGreater(self.updated(), updated)
+        self.assertTrue(
+            RecipeChange.objects.filter(recipe_id=self.recipe.pk).exists())
@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from recipes import changes
+from recipes.models import RecipeChange
+
+from .base import FoodgramTestCase
+
+CHANGES_URL = "/api/recipes/changes/"
+
+
+class RecipeChangesTest(FoodgramTestCase):
+    """Журнал упорядочен по транзакциям, а не по id."""
+
+    def add(self, recipe_id, txid):
+        return RecipeChange.objects.create(
+            target=RecipeChange.RECIPE, recipe_id=recipe_id, txid=txid,
+            deleted=True,
+        )
+
+    def test_cursor_follows_transactions(self):
+        first = self.add(1, txid=10)
+        # Транзакция 30 вставила запись раньше транзакции 20.
+        late = self.add(2, txid=30)
+        early = self.add(3, txid=20)
+
+        rows, cursor, has_more = changes.read(0, 2)
+        self.assertEqual([row.pk for row in rows], [first.pk, early.pk])
+        self.assertEqual(cursor, early.pk)
+        self.assertTrue(has_more)
+
+        rows, cursor, has_more = changes.read(cursor, 2)
+        self.assertEqual([row.pk for row in rows], [late.pk])
+        self.assertFalse(has_more)
+
+    def test_pruned_cursor_is_gone(self):
+        old = self.add(1, txid=0)
+        RecipeChange.objects.filter(pk=old.pk).update(
+            created=timezone.now() - timedelta(days=365))
+        self.add(2, txid=0)
+        self.assertEqual(changes.prune(), 1)
+
+        response = self.client.get(CHANGES_URL, {"since": old.pk})
+        self.assertEqual(response.status_code, 410)
+        response = self.client.get(CHANGES_URL, {"since": 0})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [row["recipe_id"] for row in response.json()["changes"]], [2])
@@ -0,0 +1,22 @@
+from recipes import relations
+from recipes.models import Subscription, User
+
+from .base import FoodgramTestCase
+
+
+class UserCountersTest(FoodgramTestCase):
+    """Сохранение пользователя не затирает его счётчики."""
+
+    def test_stale_save_keeps_counters(self):
+        author = self.create_user("author")
+        follower = self.create_user("follower")
+        stale = User.objects.get(pk=author.pk)
+        relations.add(Subscription, follower.pk, [author.pk])
+        author.refresh_from_db()
+        self.assertEqual(author.followers_count, 1)
+
+        stale.set_password("new-password")
+        stale.save()
+        author.refresh_from_db()
+        self.assertEqual(author.followers_count, 1)
+        self.assertTrue(author.check_password("new-password"))
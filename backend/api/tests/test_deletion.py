@@ -0,0 +1,59 @@
+from django.test import override_settings
+
+from recipes.deletion import bulk_delete, pre_bulk_delete
+from recipes.models import IngredientInRecipe, Recipe
+
+from .base import FoodgramTestCase
+
+
+class DeletionFailed(Exception):
+    pass
+
+
+def fail_on_recipe(sender, **kwargs):
+    raise DeletionFailed
+
+
+# Пачка в одну строку: ингредиенты удаляются отдельными DELETE
+# раньше, чем сам рецепт.
+@override_settings(BULK_DELETE_CHUNK_SIZE=1)
+class RecipeDeletionTest(FoodgramTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_catalog()
+        cls.author = cls.create_user("anna")
+        cls.recipe = cls.create_recipe(
+            cls.author, "Омлет",
+            tags=(cls.breakfast,),
+            ingredients=((cls.eggs, 3), (cls.milk, 100)),
+        )
+
+    def fail_recipe_deletes(self):
+        pre_bulk_delete.connect(fail_on_recipe, sender=Recipe)
+        self.addCleanup(
+            pre_bulk_delete.disconnect, fail_on_recipe, sender=Recipe)
+
+    def test_api_delete_removes_dependents(self):
+        response = self.client_for(self.author).delete(
+            f"/api/recipes/{self.recipe.pk}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Recipe.objects.exists())
+        self.assertFalse(IngredientInRecipe.objects.exists())
+
+    def test_failed_api_delete_leaves_recipe_intact(self):
+        self.fail_recipe_deletes()
+        with self.assertRaises(DeletionFailed):
+            self.client_for(self.author).delete(
+                f"/api/recipes/{self.recipe.pk}/")
+        self.assertTrue(Recipe.objects.filter(pk=self.recipe.pk).exists())
+        self.assertEqual(
+            IngredientInRecipe.objects.filter(recipe=self.recipe).count(), 2)
+
+    def test_bulk_delete_commits_chunks(self):
+        # Массовое удаление из админки: уже удалённые пачки остаются
+        # удалёнными.
+        self.fail_recipe_deletes()
+        with self.assertRaises(DeletionFailed):
+            bulk_delete(Recipe.objects.all())
+        self.assertFalse(IngredientInRecipe.objects.exists())
@@ -0,0 +1,129 @@
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.fast_serializers import (
+    RecipeMinifiedValuesSerializer,
+    RecipeValuesSerializer,
+)
+from api.fieldsets import get_requested_fields
+from api.serializers import RecipeMinifiedSerializer, RecipeReadSerializer
+from recipes.models import Favorite, Recipe, ShoppingCart, Subscription
+
+from .base import FoodgramTestCase
+
+
+class RecipeValuesSerializerParityTest(FoodgramTestCase):
+    """JSON из .values() совпадает с RecipeReadSerializer байт в байт."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_catalog()
+        cls.with_avatar = cls.create_user("anna", avatar=True)
+        cls.without_avatar = cls.create_user("boris")
+        cls.viewer = cls.create_user("viewer")
+        cls.omelette = cls.create_recipe(
+            cls.with_avatar, "Омлет",
+            tags=(cls.dinner, cls.breakfast),
+            ingredients=((cls.eggs, 3), (cls.milk, 100)),
+        )
+        cls.porridge = cls.create_recipe(
+            cls.without_avatar, "Каша",
+            tags=(cls.breakfast,), ingredients=((cls.milk, 200),),
+        )
+        cls.bare = cls.create_recipe(cls.without_avatar, "Без тегов")
+        Favorite.objects.create(user=cls.viewer, recipe=cls.omelette)
+        ShoppingCart.objects.create(user=cls.viewer, recipe=cls.porridge)
+        Subscription.objects.create(
+            user=cls.viewer, author=cls.with_avatar)
+
+    def request(self, user, **params):
+        request = Request(
+            APIRequestFactory().get("/api/recipes/", params))
+        request.user = user
+        return request
+
+    def assert_parity(self, user, **params):
+        request = self.request(user, **params)
+        fields = get_requested_fields(
+            request, RecipeReadSerializer.Meta.fields)
+        recipes = Recipe.objects.order_by("id")
+        expected = RecipeReadSerializer(
+            recipes.select_related("author").prefetch_related(
+                "tags", "recipe_ingredients__ingredient"),
+            many=True,
+            context={"request": request, "fields": fields},
+        ).data
+        actual = RecipeValuesSerializer(
+            request=request, fields=fields).serialize(recipes)
+        renderer = JSONRenderer()
+        self.assertEqual(
+            renderer.render(actual), renderer.render(expected))
+        return actual
+
+    def test_anonymous(self):
+        data = self.assert_parity(AnonymousUser())
+        self.assertFalse(any(item["is_favorited"] for item in data))
+
+    def test_flags_and_subscription(self):
+        data = {
+            item["id"]: item for item in self.assert_parity(self.viewer)}
+        self.assertTrue(data[self.omelette.pk]["is_favorited"])
+        self.assertTrue(data[self.porridge.pk]["is_in_shopping_cart"])
+        self.assertTrue(data[self.omelette.pk]["author"]["is_subscribed"])
+        self.assertFalse(data[self.porridge.pk]["author"]["is_subscribed"])
+
+    def test_avatars(self):
+        data = {item["id"]: item for item in self.assert_parity(self.viewer)}
+        self.assertTrue(data[self.omelette.pk]["author"]["avatar"])
+        self.assertIsNone(data[self.porridge.pk]["author"]["avatar"])
+
+    def test_tags_and_ingredients(self):
+        data = {item["id"]: item for item in self.assert_parity(self.viewer)}
+        self.assertEqual(
+            [tag["slug"] for tag in data[self.omelette.pk]["tags"]],
+            ["breakfast", "dinner"],
+        )
+        self.assertEqual(len(data[self.omelette.pk]["ingredients"]), 2)
+        self.assertEqual(data[self.bare.pk]["tags"], [])
+        self.assertEqual(data[self.bare.pk]["ingredients"], [])
+
+    def test_fields(self):
+        for fields in (
+            "id,name",
+            "author,is_favorited",
+            "tags,ingredients,image",
+            "is_in_shopping_cart",
+        ):
+            with self.subTest(fields=fields):
+                data = self.assert_parity(self.viewer, fields=fields)
+                self.assertEqual(
+                    list(data[0]),
+                    [
+                        name for name in RecipeReadSerializer.Meta.fields
+                        if name in fields.split(",")
+                    ],
+                )
+
+    def test_omit(self):
+        for omit in ("author", "tags,ingredients", "image,text"):
+            with self.subTest(omit=omit):
+                data = self.assert_parity(self.viewer, omit=omit)
+                self.assertFalse(set(omit.split(",")) & set(data[0]))
+
+    def test_fields_and_omit(self):
+        data = self.assert_parity(
+            AnonymousUser(), fields="id,author,tags", omit="tags")
+        self.assertEqual(list(data[0]), ["id", "author"])
+
+    def test_minified(self):
+        request = self.request(self.viewer)
+        recipes = Recipe.objects.order_by("id")
+        renderer = JSONRenderer()
+        self.assertEqual(
+            renderer.render(
+                RecipeMinifiedValuesSerializer(request).serialize(recipes)),
+            renderer.render(RecipeMinifiedSerializer(
+                recipes, many=True, context={"request": request}).data),
+        )
@@ -0,0 +1,23 @@
+import tempfile
+from pathlib import Path
+
+from django.test import SimpleTestCase, override_settings
+from foodgram.invalidation import FileTransport
+
+
+class FileTransportTest(SimpleTestCase):
+    """Файл шины не растёт, а каждое уведомление меняет его."""
+
+    def test_touch_is_bounded(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "bus"
+            with override_settings(INVALIDATION_FILE=path):
+                transport = FileTransport()
+            transport.max_size = 8
+            transport.listen(None)
+            for _ in range(3 * transport.max_size):
+                before = transport._stat()
+                transport._touch()
+                self.assertNotEqual(transport._stat(), before)
+                self.assertLessEqual(
+                    path.stat().st_size, transport.max_size + 1)
@@ -0,0 +1,77 @@
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.db import DatabaseError
+from django.test import override_settings
+from django.utils import timezone
+from foodgram import job_queue
+
+from recipes.models import Job
+
+from .base import FoodgramTestCase
+
+WORKER = "test:0"
+
+
+@job_queue.job("tests.broken", max_attempts=3)
+def broken():
+    raise ValueError("broken")
+
+
+@override_settings(JOBS_EAGER=False)
+class JobRetryDedupTest(FoodgramTestCase):
+    """Повтор не ставит задачу второй раз, пока такая же ждёт."""
+
+    def claim(self):
+        job = job_queue.enqueue("tests.broken", dedup_key="broken")
+        claimed = job_queue.claim([job_queue.DEFAULT_QUEUE], WORKER)
+        self.assertEqual(claimed.pk, job.pk)
+        # Пока задача выполнялась, такая же встала в очередь.
+        waiting = job_queue.enqueue("tests.broken", dedup_key="broken")
+        self.assertNotEqual(waiting.pk, job.pk)
+        return claimed, waiting
+
+    def assert_superseded(self, job, waiting):
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertIn(job_queue.SUPERSEDED, job.last_error)
+        waiting.refresh_from_db()
+        self.assertEqual(waiting.status, Job.QUEUED)
+
+    def run_job(self, job):
+        with self.assertLogs(job_queue.logger, "WARNING"):
+            self.assertFalse(job_queue.run(job))
+
+    def test_retry(self):
+        claimed, waiting = self.claim()
+        self.run_job(claimed)
+        self.assert_superseded(claimed, waiting)
+
+    def test_retry_without_waiting_copy(self):
+        job = job_queue.enqueue("tests.broken", dedup_key="broken")
+        self.run_job(job_queue.claim([job_queue.DEFAULT_QUEUE], WORKER))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(job.locked_by, "")
+
+    def test_recover_stale(self):
+        claimed, waiting = self.claim()
+        Job.objects.filter(pk=claimed.pk).update(
+            started=timezone.now() - timedelta(days=1))
+        self.assertEqual(job_queue.recover_stale(), 1)
+        self.assert_superseded(claimed, waiting)
+
+    def test_worker_survives_database_error(self):
+        job_queue.enqueue("tests.broken")
+        stop = threading.Event()
+
+        def run(job):
+            stop.set()
+            raise DatabaseError("connection lost")
+
+        with mock.patch.object(job_queue, "run", run), \
+                mock.patch.object(job_queue, "connections") as connections:
+            with self.assertLogs(job_queue.logger, "ERROR"):
+                job_queue.work([job_queue.DEFAULT_QUEUE], WORKER, stop)
+        connections["default"].close.assert_called_once_with()
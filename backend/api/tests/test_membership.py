@@ -0,0 +1,23 @@
+from django.contrib import admin
+
+from api import membership
+from recipes.models import Favorite
+
+from .base import FoodgramTestCase
+
+
+class AdminMembershipTest(FoodgramTestCase):
+    """Правки связей в админке сбрасывают множества membership."""
+
+    def test_admin_delete_resets_favorites(self):
+        user = self.create_user("user")
+        recipe = self.create_recipe(self.create_user("author"), "Омлет")
+        favorite = Favorite.objects.create(user=user, recipe=recipe)
+        self.assertEqual(
+            membership.get_members(membership.FAVORITES, user.pk),
+            {recipe.pk},
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            admin.site._registry[Favorite].delete_model(None, favorite)
+        self.assertEqual(
+            membership.get_members(membership.FAVORITES, user.pk), set())
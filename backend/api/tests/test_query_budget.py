@@ -0,0 +1,72 @@
+from foodgram.nplusone import (
+    NPlusOneError,
+    assert_endpoint_budget,
+    query_budget,
+)
+
+from recipes.models import Favorite, Recipe, ShoppingCart, Subscription
+
+from .base import FoodgramTestCase
+
+RECIPES_URL = "/api/recipes/"
+
+
+class RecipeQueryBudgetTest(FoodgramTestCase):
+    """Число запросов к рецептам не растёт с числом рецептов на странице."""
+
+    PAGE = 12
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_catalog()
+        cls.viewer = cls.create_user("viewer")
+        authors = [
+            cls.create_user(f"author{number}", avatar=number % 2)
+            for number in range(4)
+        ]
+        for number in range(cls.PAGE):
+            recipe = cls.create_recipe(
+                authors[number % len(authors)], f"Рецепт {number}",
+                tags=(cls.breakfast, cls.dinner)[:number % 2 + 1],
+                ingredients=((cls.eggs, number + 1), (cls.milk, 50)),
+            )
+            if number % 3 == 0:
+                Favorite.objects.create(user=cls.viewer, recipe=recipe)
+            if number % 4 == 0:
+                ShoppingCart.objects.create(user=cls.viewer, recipe=recipe)
+        Subscription.objects.create(user=cls.viewer, author=authors[0])
+
+    def list_recipes(self, client, max_queries, limit):
+        response = assert_endpoint_budget(
+            client, RECIPES_URL, max_queries, data={"limit": limit})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), limit)
+        return response
+
+    def test_anonymous_list(self):
+        for limit in (1, self.PAGE):
+            with self.subTest(limit=limit):
+                self.list_recipes(self.client, 6, limit)
+
+    def test_authenticated_list(self):
+        client = self.client_for(self.viewer)
+        for limit in (1, self.PAGE):
+            with self.subTest(limit=limit):
+                self.list_recipes(client, 10, limit)
+
+    def test_detail(self):
+        recipe = Recipe.objects.first()
+        response = assert_endpoint_budget(
+            self.client_for(self.viewer), f"{RECIPES_URL}{recipe.pk}/", 9)
+        self.assertEqual(response.status_code, 200)
+
+    def test_budget_catches_n_plus_one(self):
+        with self.assertRaises(NPlusOneError):
+            with query_budget(100):
+                [recipe.tags.count() for recipe in Recipe.objects.all()]
+
+    def test_budget_catches_total(self):
+        with self.assertRaises(NPlusOneError):
+            with query_budget(1):
+                list(Recipe.objects.all())
+                list(Recipe.objects.all())
@@ -0,0 +1,32 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+from foodgram import query_log
+
+
+class InstallForCommandTest(SimpleTestCase):
+    """Журнал запросов ведут management-команды, кроме служебных."""
+
+    def installed(self, argv):
+        with mock.patch.object(query_log, "install") as install:
+            query_log.install_for_command(argv)
+        return install.called
+
+    def test_commands(self):
+        for argv in (
+            ["manage.py", "run_workers"],
+            ["/srv/backend/manage.py", "export_foodgram"],
+            ["django-admin", "reconcile_user_counters"],
+        ):
+            with self.subTest(argv=argv):
+                self.assertTrue(self.installed(argv))
+
+    def test_skipped(self):
+        for argv in (
+            ["manage.py", "migrate"],
+            ["manage.py", "test"],
+            ["manage.py"],
+            ["gunicorn", "foodgram.wsgi"],
+        ):
+            with self.subTest(argv=argv):
+                self.assertFalse(self.installed(argv))
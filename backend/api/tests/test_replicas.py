@@ -0,0 +1,61 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import OperationalError, connections
+from django.test import TransactionTestCase, override_settings
+from foodgram import replicas
+
+from recipes.models import Tag
+
+
+def broken_replica(execute, sql, params, many, context):
+    raise OperationalError("server closed the connection unexpectedly")
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaFallbackTest(TransactionTestCase):
+    # Вне транзакции теста: внутри неё роутер читает с основной базы.
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        Tag.objects.create(name="Завтрак", slug="breakfast")
+        patcher = mock.patch.object(replicas.monitor, "start")
+        self.monitor_start = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(replicas._health.clear)
+
+    def get_tags(self):
+        with connections["replica"].execute_wrapper(broken_replica):
+            return self.client.get("/api/tags/")
+
+    def test_failed_replica_read_is_retried_on_primary(self):
+        replicas._health["replica"] = True
+        response = self.get_tags()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [tag["slug"] for tag in response.json()], ["breakfast"])
+        self.assertFalse(replicas.is_replica_healthy("replica"))
+
+    def test_unchecked_replica_is_not_used(self):
+        response = self.get_tags()
+        self.assertEqual(response.status_code, 200)
+        self.monitor_start.assert_called()
+        # Реплику не трогали: отказ пометил бы её недоступной.
+        self.assertNotIn("replica", replicas._health)
+
+    def test_request_does_not_probe_replica(self):
+        replicas._health["replica"] = True
+        with mock.patch.object(replicas, "_check_replica") as check:
+            self.client.get("/api/tags/")
+        check.assert_not_called()
+
+    def test_monitor_marks_replica_down_and_up(self):
+        with connections["replica"].execute_wrapper(broken_replica):
+            with mock.patch.object(
+                replicas, "_replica_lag", side_effect=OperationalError
+            ):
+                replicas.monitor.check()
+        self.assertFalse(replicas.is_replica_healthy("replica"))
+        replicas.monitor.check()
+        self.assertTrue(replicas.is_replica_healthy("replica"))
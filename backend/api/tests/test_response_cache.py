@@ -0,0 +1,58 @@
+import time
+
+from django.core.cache import cache
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api import response_cache
+from recipes.models import Tag
+
+from .base import FoodgramTestCase
+
+RECIPES_URL = "/api/recipes/"
+
+
+class ResponseCacheLabelsTest(FoodgramTestCase):
+    """Записи кеша ответов сбрасываются, когда меняются их данные."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_catalog()
+        cls.author = cls.create_user("author")
+        cls.create_recipe(cls.author, "Омлет", tags=(cls.breakfast,))
+
+    def labels(self, query):
+        request = Request(APIRequestFactory().get(RECIPES_URL, query))
+        return set(response_cache.filter_labels(request))
+
+    def test_new_tag_invalidates_its_slug(self):
+        labels = self.labels({"tags": "lunch"})
+        self.assertIn(response_cache.tag_slug_label("lunch"), labels)
+        response_cache.store(
+            "lunch", time.time(), labels, self.client.get(RECIPES_URL))
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name="Обед", slug="lunch")
+        self.assertFalse(response_cache.lookup("lunch").fresh)
+
+    def test_tagged_recipe_refreshes_filtered_list(self):
+        query = {"tags": self.breakfast.slug}
+        response = self.client.get(RECIPES_URL, query)
+        self.assertEqual(response.json()["count"], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_recipe(self.author, "Каша", tags=(self.breakfast,))
+        response = self.client.get(RECIPES_URL, query)
+        self.assertEqual(response.json()["count"], 2)
+
+    def test_password_change_keeps_author_entries(self):
+        label_key = response_cache._label_key(
+            response_cache.author_label(self.author.pk))
+        self.client.get(RECIPES_URL, {"author": self.author.pk})
+        stored = cache.get(label_key)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.set_password("new-password")
+            self.author.save()
+        self.assertEqual(cache.get(label_key), stored)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.first_name = "Новое имя"
+            self.author.save()
+        self.assertGreater(cache.get(label_key), stored)
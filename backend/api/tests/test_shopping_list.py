@@ -0,0 +1,87 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.shopping_list import get_shopping_list_file
+from api.views import RecipeViewSet
+
+from .base import MEDIA_ROOT, FoodgramTestCase
+
+DOWNLOAD_URL = "/api/recipes/download_shopping_cart/"
+
+
+@override_settings(SHOPPING_LISTS_ROOT=Path(MEDIA_ROOT) / "shopping_lists")
+class ShoppingListTest(FoodgramTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_catalog()
+        cls.user = cls.create_user("anna")
+        cls.omelette = cls.create_recipe(
+            cls.user, "Омлет",
+            tags=(cls.breakfast,), ingredients=((cls.eggs, 3),),
+        )
+        cls.porridge = cls.create_recipe(
+            cls.user, "Каша",
+            tags=(cls.breakfast,), ingredients=((cls.milk, 200),),
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.client_for(self.user)
+        self.client.post(f"/api/recipes/{self.omelette.pk}/shopping_cart/")
+
+    def download(self):
+        response = self.client.get(DOWNLOAD_URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("attachment", response["Content-Disposition"])
+        content = b"".join(response.streaming_content)
+        self.assertEqual(int(response["Content-Length"]), len(content))
+        return content.decode()
+
+    def files(self):
+        return list(
+            (Path(settings.SHOPPING_LISTS_ROOT) / str(self.user.pk))
+            .glob("*.txt")
+        )
+
+    def test_rendered_file_is_served_as_is(self):
+        first = self.download()
+        self.assertIn("Яйца — 3 шт", first)
+        # Тестовый клиент оборачивает поток, поэтому — прямо через view.
+        request = APIRequestFactory().get(DOWNLOAD_URL)
+        force_authenticate(request, self.user)
+        view = RecipeViewSet.as_view({"get": "download_shopping_cart"})
+        response = view(request)
+        # Открытый файл: WSGI-сервер отдаст его через sendfile.
+        self.assertIsNotNone(response.file_to_stream.fileno())
+        self.assertEqual(
+            b"".join(response.streaming_content).decode(), first)
+        response.close()
+        self.assertEqual(len(self.files()), 1)
+
+    def test_cart_change_replaces_file(self):
+        self.download()
+        old = self.files()
+        self.client.post(f"/api/recipes/{self.porridge.pk}/shopping_cart/")
+        text = self.download()
+        self.assertIn("Молоко — 200 мл", text)
+        self.assertEqual(len(self.files()), 1)
+        self.assertNotEqual(self.files(), old)
+
+    def test_file_removed_after_open_is_still_served(self):
+        self.download()
+        with get_shopping_list_file(self.user) as file:
+            # Как если бы sweep_shopping_lists или выгрузка новой версии
+            # удалили файл между открытием и отдачей.
+            for path in self.files():
+                path.unlink()
+            self.assertIn("Яйца — 3 шт", file.read().decode())
+
+    def test_fresh_file_removed_before_serving_is_still_served(self):
+        with get_shopping_list_file(self.user) as file:
+            for path in self.files():
+                path.unlink()
+            self.assertIn("Яйца — 3 шт", file.read().decode())
@@ -0,0 +1,62 @@
+from django.test import override_settings
+
+from recipes.deletion import delete_instance
+from recipes.models import Job, SimilarRecipe
+from recipes.similarity import (
+    rebuild_similar_recipes,
+    refresh_similar_recipes,
+)
+
+from .base import FoodgramTestCase
+
+
+def neighbors(recipe):
+    return dict(
+        SimilarRecipe.objects.filter(recipe=recipe)
+        .values_list("similar_id", "score")
+    )
+
+
+class SimilarRecipesTest(FoodgramTestCase):
+    """Пересчёт одного рецепта совпадает с полной перестройкой."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_catalog()
+        author = cls.create_user("author")
+        cls.omelet = cls.create_recipe(
+            author, "Омлет", tags=(cls.breakfast,),
+            ingredients=((cls.eggs, 2), (cls.milk, 50)),
+        )
+        cls.porridge = cls.create_recipe(
+            author, "Каша", tags=(cls.breakfast,),
+            ingredients=((cls.milk, 200),),
+        )
+        # Общий с омлетом только тег.
+        cls.toast = cls.create_recipe(author, "Тост", tags=(cls.breakfast,))
+        cls.soup = cls.create_recipe(
+            author, "Суп", tags=(cls.dinner,), ingredients=((cls.eggs, 1),))
+
+    def test_refresh_matches_rebuild(self):
+        rebuild_similar_recipes()
+        expected = neighbors(self.toast)
+        self.assertIn(self.omelet.pk, expected)
+        SimilarRecipe.objects.all().delete()
+        refresh_similar_recipes(self.toast.pk)
+        actual = neighbors(self.toast)
+        self.assertEqual(set(actual), set(expected))
+        for pk, score in expected.items():
+            self.assertAlmostEqual(actual[pk], score)
+
+    @override_settings(JOBS_EAGER=False)
+    def test_save_and_delete_schedule_refresh(self):
+        self.soup.name = "Суп с яйцом"
+        self.soup.save()
+        self.assertTrue(
+            Job.objects.filter(dedup_key=f"similar:{self.soup.pk}").exists())
+
+        rebuild_similar_recipes()
+        Job.objects.all().delete()
+        delete_instance(self.soup)
+        self.assertTrue(
+            Job.objects.filter(dedup_key=f"similar:{self.omelet.pk}").exists())
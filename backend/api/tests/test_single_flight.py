@@ -0,0 +1,42 @@
+from django.core.cache import cache
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api import response_cache
+from api.views import response_flights
+
+from .base import FoodgramTestCase
+
+RECIPES_URL = "/api/recipes/"
+
+
+class StaleResponseFlightTest(FoodgramTestCase):
+    """Устаревший ответ, пока список пересчитывает другой процесс."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = cls.create_user("author")
+        cls.create_recipe(cls.author, "Омлет")
+
+    def lock_key(self):
+        request = Request(APIRequestFactory().get(RECIPES_URL))
+        request.accepted_media_type = "application/json"
+        return response_flights.lock_key(response_cache.get_key(request))
+
+    def count(self):
+        response = self.client.get(RECIPES_URL)
+        self.assertEqual(response.status_code, 200)
+        return response.json()["count"]
+
+    def test_remote_leader_and_stale_entry(self):
+        self.assertEqual(self.count(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_recipe(self.author, "Суп")
+        # Список пересчитывает другой процесс: ждать его незачем.
+        cache.add(self.lock_key(), "other", 60)
+        self.assertEqual(self.count(), 1)
+        self.assertEqual(response_flights._events, {})
+
+        cache.delete(self.lock_key())
+        self.assertEqual(self.count(), 2)
+        self.assertEqual(response_flights._events, {})
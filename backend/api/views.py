@@ -1,52 +1,100 @@
+import os
+import time
+
 from django.contrib.auth import get_user_model
-from django.db.models import F, Sum
-from django.http import FileResponse
+from django.db import transaction
+from django.http import FileResponse, Http404
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
+from django.utils.functional import cached_property
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserUserViewSet
-from rest_framework import permissions, status, viewsets
+from rest_framework import generics, permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
-from api.filters import IngredientFilter, RecipeFilter
+from api import membership, response_cache
+from api.batch import IDS_PARAM, get_batch_ids
+from api.changes import get_changes_params
+from api.conditional import conditional_get
+from api.fast_serializers import (
+    IngredientValuesSerializer,
+    RecipeMinifiedValuesSerializer,
+    RecipeValuesSerializer,
+    TagValuesSerializer,
+)
+from api.fieldsets import get_requested_fields
+from api.filters import (
+    IngredientFilter,
+    RecipeFilter,
+    StableOrderingFilter,
+)
 from api.pagination import LimitPageNumberPagination
-from api.report import render_shopping_list
+from api.pantry import get_pantry_params
 from api.serializers import (
     AvatarSerializer,
     IngredientSerializer,
-    RecipeMinifiedSerializer,
+    RecipeIdsSerializer,
     RecipeReadSerializer,
     RecipeWriteSerializer,
     TagSerializer,
     UserSerializer,
+    UserStatsSerializer,
     UserWithRecipesSerializer,
 )
+from api.shopping_list import get_shopping_list_file
+from api.single_flight import SingleFlight
+from recipes import changes as recipe_changes, relations
+from recipes.counters import COUNTERS
+from recipes.deletion import delete_instance
 from recipes.models import (
     Favorite,
     Ingredient,
-    IngredientInRecipe,
     Recipe,
+    RecipeChange,
     ShoppingCart,
     Subscription,
     Tag,
 )
+from recipes.pantry import pantry_index
 
 User = get_user_model()
 
+response_flights = SingleFlight("response_cache")
+
+
+def _parse_pk(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise Http404
+
 
 class UsersViewSet(DjoserUserViewSet):
     queryset = User.objects.all()
     pagination_class = LimitPageNumberPagination
     serializer_class = UserSerializer
+    filter_backends = (StableOrderingFilter,)
+    ordering_fields = ("id", *COUNTERS)
+
+    def get_serializer_class(self):
+        if (
+            self.action in ("list", "retrieve", "me")
+            and self.request.query_params.get("with_counters") in ("1", "true")
+        ):
+            return UserStatsSerializer
+        return super().get_serializer_class()
 
     @action(detail=False, methods=["get"],
             permission_classes=[IsAuthenticated])
     def me(self, request, *args, **kwargs):
         return super().me(request, *args, **kwargs)
 
+    def perform_destroy(self, instance):
+        delete_instance(instance)
+
     @action(
         detail=False,
         methods=["put", "delete"],
@@ -56,8 +104,7 @@ class UsersViewSet(DjoserUserViewSet):
     def avatar(self, request):
 
         if request.method.lower() == "delete":
-            if request.user.avatar:
-                request.user.avatar.delete(save=False)
+            # Старый файл удалит сигнал после сохранения.
             request.user.avatar = None
             request.user.save(update_fields=["avatar"])
             return Response(status=status.HTTP_204_NO_CONTENT)
@@ -79,7 +126,8 @@ class UsersViewSet(DjoserUserViewSet):
         permission_classes=[permissions.IsAuthenticated],
     )
     def subscriptions(self, request):
-        authors_qs = User.objects.filter(authors__user=request.user)
+        authors_qs = self.filter_queryset(
+            User.objects.filter(authors__user=request.user))
         page = self.paginate_queryset(authors_qs)
         serializer = UserWithRecipesSerializer(
             page, many=True, context={"request": request}
@@ -93,23 +141,29 @@ class UsersViewSet(DjoserUserViewSet):
         permission_classes=[permissions.IsAuthenticated],
     )
     def subscribe(self, request, id=None):
+        author_id = _parse_pk(id)
         if request.method == "DELETE":
-            get_object_or_404(
-                Subscription, user=request.user, author_id=id).delete()
+            if not relations.remove(
+                Subscription, request.user.pk, [author_id]
+            ):
+                raise Http404
+            membership.remove_members(
+                membership.SUBSCRIPTIONS, request.user.pk, {author_id})
             return Response(status=status.HTTP_204_NO_CONTENT)
 
         # POST
-        author = get_object_or_404(User, pk=id)
-        if request.user == author:
+        if author_id == request.user.pk:
             raise ValidationError(
                 {"detail": "Нельзя подписаться на себя."})
 
-        _, created = Subscription.objects.get_or_create(
-            user=request.user, author_id=id)
+        created = relations.add(Subscription, request.user.pk, [author_id])
+        author = get_object_or_404(User, pk=author_id)
         if not created:
             raise ValidationError(
                 {"detail": f'Подписка на "{author.username}" уже существует.'}
             )
+        membership.add_members(
+            membership.SUBSCRIPTIONS, request.user.pk, {author_id})
 
         return Response(
             UserWithRecipesSerializer(
@@ -126,16 +180,57 @@ class IsAuthorOrReadOnly(permissions.BasePermission):
         )
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class ValuesReadMixin:
+    """
+    list и retrieve через сериализатор поверх .values():
+    без экземпляров моделей и объектов полей DRF.
+    Действия только читающие, поэтому проверка прав на объект
+    (get_object) здесь не нужна.
+    """
+
+    values_serializer_class = None
+
+    def get_values_serializer(self):
+        return self.values_serializer_class(request=self.request)
+
+    def list_response(self, queryset):
+        serializer = self.get_values_serializer()
+        rows = serializer.values(queryset)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(
+                serializer.to_representation(page))
+        return Response(serializer.to_representation(rows))
+
+    def retrieve_response(self, queryset):
+        serializer = self.get_values_serializer()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = generics.get_object_or_404(
+            serializer.values(queryset),
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]},
+        )
+        return Response(serializer.to_representation([row])[0])
+
+    def list(self, request, *args, **kwargs):
+        return self.list_response(self.filter_queryset(self.get_queryset()))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.retrieve_response(
+            self.filter_queryset(self.get_queryset()))
+
+
+class TagViewSet(ValuesReadMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    values_serializer_class = TagValuesSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ValuesReadMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
+    values_serializer_class = IngredientValuesSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
 
@@ -143,12 +238,8 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_class = IngredientFilter
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = (
-        Recipe.objects.all()
-        .select_related("author")
-        .prefetch_related("tags", "recipe_ingredients__ingredient")
-    )
+class RecipeViewSet(ValuesReadMixin, viewsets.ModelViewSet):
+    queryset = Recipe.objects.all()
     permission_classes = (
         permissions.IsAuthenticatedOrReadOnly,
         IsAuthorOrReadOnly,
@@ -158,34 +249,179 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    @cached_property
+    def requested_fields(self):
+        return get_requested_fields(
+            self.request, RecipeReadSerializer.Meta.fields)
+
+    def get_values_serializer(self):
+        return RecipeValuesSerializer(
+            request=self.request, fields=self.requested_fields)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ("list", "retrieve", "batch"):
+            # Колонки и связи выбирает RecipeValuesSerializer.
+            return queryset
+        return queryset.select_related("author")
+
     def get_serializer_class(self):
-        if self.action in ("list", "retrieve"):
+        if self.action in ("list", "retrieve", "batch"):
             return RecipeReadSerializer
         return RecipeWriteSerializer
 
+    def cached_response(self, respond, get_labels):
+        """
+        Ответ анониму из response_cache. При промахе одинаковые запросы
+        ждут один ведущий (api.single_flight), а устаревшую запись
+        получают сразу; ведущий вызывает respond(), а метки
+        get_labels(data) и отрисованный ответ сохранит finalize_response.
+        """
+        key = response_cache.get_key(self.request)
+        if key is None:
+            return respond()
+        entry = response_cache.lookup(key)
+        if entry is not None and entry.fresh:
+            return entry.respond(self.request)
+
+        flight = response_flights.start(key)
+        if not flight.leader:
+            if entry is not None and entry.servable_stale:
+                flight.leave()
+                return entry.respond(self.request)
+            entry = flight.wait(lambda: response_cache.get_fresh(key))
+            if entry is not None:
+                return entry.respond(self.request)
+
+        started = time.time()
+        try:
+            response = respond()
+        except BaseException:
+            flight.release()
+            raise
+        self.cache_flight = flight
+        if response.status_code == status.HTTP_200_OK:
+            self.cache_entry = (key, started, get_labels(response.data))
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        entry = self.__dict__.pop("cache_entry", None)
+        flight = self.__dict__.pop("cache_flight", None)
+        try:
+            if entry is not None:
+                response_cache.store(*entry, response.render())
+        finally:
+            if flight is not None:
+                flight.release()
+        return response
+
+    def batch_response(self, ids):
+        """
+        Рецепты по списку id в его порядке одной выборкой; id, которых
+        нет, перечисляются в missing. Фильтры списка не применяются.
+        """
+        serializer = self.get_values_serializer()
+        order = {pk: position for position, pk in enumerate(ids)}
+        rows = sorted(
+            serializer.values(self.get_queryset().filter(pk__in=ids)),
+            key=lambda row: order[row["id"]],
+        )
+        found = {row["id"] for row in rows}
+        return Response({
+            "results": serializer.to_representation(rows),
+            "missing": [pk for pk in ids if pk not in found],
+        })
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="batch",
+        permission_classes=[AllowAny],
+    )
+    def batch(self, request):
+        return self.batch_response(get_batch_ids(request))
+
+    def list(self, request, *args, **kwargs):
+        if IDS_PARAM in request.query_params:
+            return self.batch_response(get_batch_ids(request))
+
+        def respond():
+            queryset = self.filter_queryset(self.get_queryset())
+            return conditional_get(
+                request, queryset, lambda: self.list_response(queryset))
+
+        def get_labels(data):
+            return [
+                *response_cache.recipe_labels(data["results"]),
+                *response_cache.filter_labels(request),
+            ]
+
+        return self.cached_response(respond, get_labels)
+
+    def retrieve(self, request, *args, **kwargs):
+        def respond():
+            queryset = self.filter_queryset(self.get_queryset())
+            try:
+                recipe = queryset.filter(pk=kwargs[self.lookup_field])
+            except (TypeError, ValueError):
+                raise Http404
+            return conditional_get(
+                request,
+                recipe,
+                lambda: self.retrieve_response(queryset),
+                use_last_modified=True,
+            )
+
+        return self.cached_response(
+            respond, lambda data: list(response_cache.recipe_labels([data])))
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def perform_destroy(self, instance):
+        delete_instance(instance)
+
     def _process_relation(self, request, model, pk):
+        kind = membership.KIND_BY_MODEL[model]
+        recipe_id = _parse_pk(pk)
         if request.method == "DELETE":
-            get_object_or_404(model, user=request.user, recipe_id=pk).delete()
+            if not relations.remove(model, request.user.pk, [recipe_id]):
+                raise Http404
+            membership.remove_members(kind, request.user.pk, {recipe_id})
             return Response(status=status.HTTP_204_NO_CONTENT)
 
-        recipe = get_object_or_404(Recipe, pk=pk)
-
-        _, created = model.objects.get_or_create(
-            user=request.user, recipe=recipe)
-
-        if not created:
+        if not relations.add(model, request.user.pk, [recipe_id]):
+            recipe = get_object_or_404(Recipe, pk=recipe_id)
             raise ValidationError(
                 f'Рецепт "{recipe.name}" уже {model._meta.verbose_name}.'
             )
+        membership.add_members(kind, request.user.pk, {recipe_id})
+
+        data = RecipeMinifiedValuesSerializer(request).serialize(
+            Recipe.objects.filter(pk=recipe_id))
+        if not data:
+            raise Http404
+        return Response(data[0], status=status.HTTP_201_CREATED)
+
+    def _process_relations(self, request, model):
+        """Пакетное добавление (POST) или удаление (DELETE) рецептов."""
+        kind = membership.KIND_BY_MODEL[model]
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data["recipes"]
 
-        return Response(
-            RecipeMinifiedSerializer(
-                recipe, context={"request": request}).data,
-            status=status.HTTP_201_CREATED,
-        )
+        if request.method == "DELETE":
+            removed = relations.remove(model, request.user.pk, recipe_ids)
+            if removed:
+                membership.remove_members(kind, request.user.pk, removed)
+            return Response({"removed": sorted(removed)})
+
+        added = relations.add(model, request.user.pk, recipe_ids)
+        if added:
+            membership.add_members(kind, request.user.pk, added)
+        return Response({"added": sorted(added)})
 
     @action(detail=True, methods=["post", "delete"], url_path="favorite")
     def favorite(self, request, pk=None):
@@ -195,29 +431,143 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def shopping_cart(self, request, pk=None):
         return self._process_relation(request, ShoppingCart, pk)
 
-    @action(detail=False, methods=["get"], url_path="download_shopping_cart")
-    def download_shopping_cart(self, request):
-        products = (
-            IngredientInRecipe.objects.filter(
-                recipe__shopping_cart__user=request.user)
-            .values(name=F("ingredient__name"),
-                    unit=F("ingredient__measurement_unit"))
-            .annotate(total=Sum("amount"))
-            .order_by("name")
-        )
+    @action(
+        detail=False,
+        methods=["post", "delete"],
+        url_path="favorite",
+        permission_classes=[IsAuthenticated],
+    )
+    def favorite_many(self, request):
+        return self._process_relations(request, Favorite)
 
-        recipes = (
-            Recipe.objects.filter(shopping_cart__user=request.user)
-            .select_related("author")
-            .order_by("name")
-        )
+    @action(
+        detail=False,
+        methods=["post", "delete"],
+        url_path="shopping_cart",
+        permission_classes=[IsAuthenticated],
+    )
+    def shopping_cart_many(self, request):
+        return self._process_relations(request, ShoppingCart)
 
-        text = render_shopping_list(products, recipes)
-        return FileResponse(
-            text,
+    @action(
+        detail=False,
+        methods=["delete"],
+        url_path="shopping_cart/clear",
+        permission_classes=[IsAuthenticated],
+    )
+    def clear_shopping_cart(self, request):
+        removed = relations.remove(ShoppingCart, request.user.pk)
+        if removed:
+            membership.remove_members(
+                membership.SHOPPING_CART, request.user.pk, removed)
+        return Response({"removed": sorted(removed)})
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="download_shopping_cart",
+        permission_classes=[IsAuthenticated],
+    )
+    def download_shopping_cart(self, request):
+        file = get_shopping_list_file(request.user)
+        response = FileResponse(
+            file,
             as_attachment=True,
-            filename="shopping_list.txt"
+            filename="shopping_list.txt",
+            content_type="text/plain; charset=utf-8",
         )
+        # Размер открытого файла: путь к нему могли уже удалить.
+        response["Content-Length"] = os.fstat(file.fileno()).st_size
+        return response
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="pantry",
+        permission_classes=[AllowAny],
+    )
+    def pantry(self, request):
+        ingredient_ids, max_missing = get_pantry_params(request)
+        ids, matched, missing = pantry_index.search(
+            ingredient_ids, max_missing)
+        ranked = list(zip(ids.tolist(), matched.tolist(), missing.tolist()))
+        page = self.paginate_queryset(ranked)
+
+        rows = {
+            row["id"]: row
+            for row in RecipeMinifiedValuesSerializer(request).serialize(
+                Recipe.objects.filter(pk__in=[item[0] for item in page]))
+        }
+        data = [
+            {**rows[recipe_id], "matched": found, "missing": lacking}
+            for recipe_id, found, lacking in page
+            if recipe_id in rows
+        ]
+        return self.get_paginated_response(data)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="changes",
+        permission_classes=[AllowAny],
+    )
+    def changes(self, request):
+        since, limit = get_changes_params(request)
+        # Журнал и рецепты читаются с основной базы: реплика могла
+        # получить запись журнала раньше, чем клиент увидит рецепт.
+        with transaction.atomic():
+            try:
+                rows, cursor, has_more = recipe_changes.read(
+                    since, limit, request.user.pk)
+            except recipe_changes.CursorExpired:
+                return Response(
+                    {"detail": "Курсор устарел: загрузите рецепты заново "
+                               "и читайте журнал с since=0."},
+                    status=status.HTTP_410_GONE,
+                )
+            upserted = [
+                row.recipe_id for row in rows
+                if row.target == RecipeChange.RECIPE and not row.deleted
+            ]
+            recipes = {
+                recipe["id"]: recipe
+                for recipe in self.get_values_serializer().serialize(
+                    Recipe.objects.filter(pk__in=upserted))
+            } if upserted else {}
+
+        data = []
+        for row in rows:
+            item = {
+                "id": row.id,
+                "target": row.target,
+                "recipe_id": row.recipe_id,
+                "deleted": row.deleted,
+            }
+            if row.target == RecipeChange.RECIPE and not row.deleted:
+                if row.recipe_id not in recipes:
+                    # Рецепт удалён позже: запись об этом ещё впереди.
+                    continue
+                item["recipe"] = recipes[row.recipe_id]
+            data.append(item)
+        return Response(
+            {"cursor": cursor, "has_more": has_more, "changes": data})
+
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path="similar",
+        permission_classes=[AllowAny],
+    )
+    def similar(self, request, pk=None):
+        try:
+            recipes = Recipe.objects.filter(
+                neighbor_of__recipe_id=pk).order_by("-neighbor_of__score")
+        except (TypeError, ValueError):
+            raise Http404
+        data = RecipeMinifiedValuesSerializer(request).serialize(recipes)
+        if not data and not Recipe.objects.filter(pk=pk).exists():
+            raise Http404
+        return Response(data)
 
     @action(
         detail=True,
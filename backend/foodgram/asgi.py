@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
 application = get_asgi_application()
+
+from foodgram import invalidation, query_log  # noqa: E402
+
+invalidation.start()
+query_log.install()
@@ -0,0 +1,256 @@
+"""
+Шина инвалидации кешей в памяти процессов.
+
+Кеши в памяти (токены, индекс кладовой и т. п.) у каждого воркера gunicorn
+и каждого контейнера свои. publish() в той же транзакции, что и само
+изменение, пишет ключи изменённых объектов в InvalidationEvent и будит
+слушателей: PostgreSQL NOTIFY (доставляется после коммита) или запись в
+файл INVALIDATION_FILE — для тестов и локального запуска без Postgres.
+Слушатель — фоновый поток каждого процесса — перечитывает события после
+своей версии (id последнего обработанного события) и вызывает подписчиков
+по префиксу ключа. После обрыва соединения он догоняет пропущенное по
+той же версии; если события успели удалить, подписчики получают None —
+сбросить всё.
+
+Ключ — "<app>.<model>:<pk>", например "recipes.tag:5". Свой процесс
+вызывает подписчиков сразу после коммита, не дожидаясь слушателя.
+"""
+import logging
+import os
+import select
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from recipes.models import InvalidationEvent
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "invalidation"
+POSTGRES = "postgres"
+FILE = "file"
+BATCH_SIZE = 1000
+# Пропуски в id длиннее этого — скачок последовательности, а не
+# незакоммиченные транзакции: их не ждём.
+MAX_GAP = 1000
+
+# (префикс ключа, callback(key))
+_subscribers = []
+
+
+def model_key(model, pk=""):
+    """Ключ объекта; без pk — префикс для подписки на всю модель."""
+    return f"{model._meta.label_lower}:{pk}"
+
+
+def key_pk(key):
+    return key.partition(":")[2]
+
+
+def subscribe(prefix, callback):
+    """
+    callback(key) вызывается для каждого события с ключом, который
+    начинается с prefix, и с key=None, если события потеряны.
+    """
+    _subscribers.append((prefix, callback))
+
+
+def dispatch(key):
+    for prefix, callback in _subscribers:
+        if key is None or key.startswith(prefix):
+            try:
+                callback(key)
+            except Exception:
+                logger.exception("Invalidation subscriber failed on %s", key)
+
+
+def publish(keys, using=None):
+    """Рассылает ключи всем процессам после коммита текущей транзакции."""
+    keys = list(keys)
+    if not keys:
+        return
+    using = using or router.db_for_write(InvalidationEvent)
+    transport = _get_transport()
+    if transport is not None:
+        InvalidationEvent.objects.using(using).bulk_create(
+            [InvalidationEvent(key=key[:255]) for key in keys],
+            batch_size=BATCH_SIZE,
+        )
+        transport.notify(using)
+    transaction.on_commit(
+        lambda: [dispatch(key) for key in keys], using=using)
+
+
+class PostgresTransport:
+    """LISTEN/NOTIFY: уведомление уходит слушателям при коммите."""
+
+    def notify(self, using):
+        with connections[using].cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, '')", [CHANNEL])
+
+    def listen(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {CHANNEL}")
+        self._raw = connection.connection
+
+    def wait(self, timeout):
+        if select.select([self._raw], [], [], timeout)[0]:
+            self._raw.poll()
+            self._raw.notifies.clear()
+
+
+class FileTransport:
+    """
+    Дописывает байт в файл после коммита; слушатели следят за его размером
+    и временем изменения. Содержимое не нужно: дорастя до max_size, файл
+    начинается заново.
+    """
+
+    poll_interval = 0.05
+    max_size = 4096
+
+    def __init__(self):
+        self.path = settings.INVALIDATION_FILE
+
+    def notify(self, using):
+        transaction.on_commit(self._touch, using=using)
+
+    def _touch(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as file:
+            if file.tell() >= self.max_size:
+                file.truncate(0)
+            file.write("\n")
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def listen(self, connection):
+        self._last = self._stat()
+
+    def wait(self, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            stat = self._stat()
+            if stat != self._last:
+                self._last = stat
+                return
+            time.sleep(self.poll_interval)
+
+
+TRANSPORTS = {POSTGRES: PostgresTransport, FILE: FileTransport}
+
+
+def _get_transport():
+    name = settings.INVALIDATION_TRANSPORT
+    return TRANSPORTS[name]() if name else None
+
+
+class Listener:
+    """Фоновый поток процесса: догоняет события и вызывает подписчиков."""
+
+    def __init__(self):
+        # id последнего обработанного события; None — ещё не читали.
+        self.version = None
+        # Пропущенные id -> когда замечены: их транзакции могут
+        # закоммититься позже событий с большими id.
+        self._gaps = {}
+        self._pruned_at = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="invalidation-bus", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        transport = _get_transport()
+        alias = router.db_for_write(InvalidationEvent)
+        while True:
+            try:
+                transport.listen(connections[alias])
+                self.catch_up(alias, resumed=True)
+                while True:
+                    transport.wait(settings.INVALIDATION_POLL_INTERVAL)
+                    self.catch_up(alias)
+            except Exception:
+                logger.exception("Invalidation bus listener failed")
+                connections[alias].close()
+                time.sleep(settings.INVALIDATION_POLL_INTERVAL)
+
+    def catch_up(self, alias=None, resumed=False):
+        """Обрабатывает события после своей версии."""
+        alias = alias or router.db_for_write(InvalidationEvent)
+        events = InvalidationEvent.objects.using(alias)
+        with self._lock:
+            if self.version is None:
+                # Новый процесс: его кеши пусты, догонять нечего.
+                self.version = events.aggregate(last=Max("id"))["last"] or 0
+                return
+            if resumed:
+                oldest = events.aggregate(first=Min("id"))["first"]
+                if oldest is not None and oldest > self.version + 1:
+                    logger.warning(
+                        "Invalidation events after %s were pruned",
+                        self.version,
+                    )
+                    dispatch(None)
+                    self.version = oldest - 1
+                    self._gaps.clear()
+            while self._read(events) == BATCH_SIZE:
+                pass
+            self._expire_gaps()
+        self._prune(events)
+
+    def _read(self, events):
+        rows = list(
+            events.filter(Q(id__gt=self.version) | Q(id__in=self._gaps))
+            .order_by("id").values_list("id", "key")[:BATCH_SIZE]
+        )
+        now = time.monotonic()
+        for pk, key in rows:
+            self._gaps.pop(pk, None)
+            if pk > self.version:
+                if pk - self.version <= MAX_GAP:
+                    for missing in range(self.version + 1, pk):
+                        self._gaps[missing] = now
+                self.version = pk
+            dispatch(key)
+        return len(rows)
+
+    def _expire_gaps(self):
+        now = time.monotonic()
+        for pk, seen in list(self._gaps.items()):
+            if now - seen > settings.INVALIDATION_GAP_TIMEOUT:
+                del self._gaps[pk]
+
+    def _prune(self, events):
+        now = time.monotonic()
+        retention = settings.INVALIDATION_RETENTION
+        if now - self._pruned_at < retention / 10:
+            return
+        self._pruned_at = now
+        events.filter(
+            created__lt=timezone.now() - timedelta(seconds=retention)
+        ).delete()
+
+
+listener = Listener()
+
+
+def start():
+    """Запускает слушателя; вызывается при старте WSGI/ASGI-приложения."""
+    if settings.INVALIDATION_TRANSPORT:
+        listener.start()
@@ -0,0 +1,293 @@
+"""
+Фоновые задачи в базе данных, без внешнего брокера.
+
+enqueue() добавляет строку Job в текущей транзакции: воркеры увидят её
+после коммита, откат её отменит. Воркеры — процессы команды run_workers —
+забирают задачи через SELECT ... FOR UPDATE SKIP LOCKED: одну строку не
+заберут двое, и никто не ждёт чужих блокировок. Одновременно выполняются
+не больше JOB_QUEUES[очередь] задач очереди на всех воркерах. Упавшая
+задача повторяется с экспоненциальной задержкой, после max_attempts
+попыток остаётся в статусе failed. Задача с dedup_key не ставится второй
+раз, пока такая же ждёт в очереди; повтор при такой ждущей не ставится
+вовсе — задача закрывается как выполненная.
+
+Задачи объявляются декоратором @job в модулях <приложение>/jobs.py.
+При JOBS_EAGER задача выполняется в том же процессе после коммита —
+для локального запуска без воркеров.
+"""
+import logging
+import os
+import random
+import socket
+import traceback
+from dataclasses import dataclass
+from datetime import timedelta
+from hashlib import md5
+
+from django.conf import settings
+from django.db import (
+    DatabaseError,
+    IntegrityError,
+    connections,
+    router,
+    transaction,
+)
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from recipes.models import Job
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE = "default"
+SUPERSEDED = "Superseded by the same job waiting in the queue."
+
+
+@dataclass(frozen=True)
+class Handler:
+    func: object
+    queue: str
+    max_attempts: int
+
+
+# Имя задачи -> Handler.
+_handlers = {}
+_discovered = False
+
+
+def job(name, queue=DEFAULT_QUEUE, max_attempts=None):
+    """Регистрирует функцию как задачу; аргументы — из payload."""
+    def decorator(func):
+        _handlers[name] = Handler(
+            func, queue, max_attempts or settings.JOB_MAX_ATTEMPTS)
+        return func
+    return decorator
+
+
+def get_handler(name):
+    global _discovered
+
+    if not _discovered:
+        autodiscover_modules("jobs")
+        _discovered = True
+    try:
+        return _handlers[name]
+    except KeyError:
+        raise LookupError(f"Unknown job: {name}")
+
+
+def _alias():
+    return router.db_for_write(Job)
+
+
+def enqueue(name, payload=None, dedup_key=None, delay=0):
+    """
+    Ставит задачу name(**payload) в её очередь. Возвращает Job или,
+    если такая же (dedup_key) уже ждёт, ту задачу; при JOBS_EAGER — None.
+    """
+    handler = get_handler(name)
+    payload = payload or {}
+    if settings.JOBS_EAGER:
+        transaction.on_commit(lambda: _run_eager(name, handler, payload))
+        return None
+
+    alias = _alias()
+    new = Job(
+        queue=handler.queue,
+        name=name,
+        payload=payload,
+        dedup_key=dedup_key,
+        max_attempts=handler.max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+    try:
+        with transaction.atomic(using=alias):
+            new.save(using=alias)
+    except IntegrityError:
+        if dedup_key is None:
+            raise
+        return (
+            Job.objects.using(alias)
+            .filter(dedup_key=dedup_key, status=Job.QUEUED).first()
+        )
+    return new
+
+
+def _run_eager(name, handler, payload):
+    try:
+        handler.func(**payload)
+    except Exception:
+        logger.exception("Job %s failed", name)
+
+
+def _queue_lock_id(queue):
+    return int.from_bytes(md5(queue.encode()).digest()[:8], "big", signed=True)
+
+
+def _claim_from(queue, worker):
+    alias = _alias()
+    connection = connections[alias]
+    limit = settings.JOB_QUEUES.get(queue)
+    jobs = Job.objects.using(alias)
+    with transaction.atomic(using=alias):
+        if limit is not None:
+            # Подсчёт выполняющихся и захват — под одной блокировкой
+            # очереди, иначе два воркера превысят предел вместе.
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT pg_advisory_xact_lock(%s)",
+                        [_queue_lock_id(queue)],
+                    )
+            if jobs.filter(queue=queue, status=Job.RUNNING).count() >= limit:
+                return None
+        now = timezone.now()
+        job = (
+            jobs.select_for_update(skip_locked=True)
+            .filter(queue=queue, status=Job.QUEUED, run_at__lte=now)
+            .order_by("run_at", "id")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = Job.RUNNING
+        job.attempts += 1
+        job.locked_by = worker
+        job.started = now
+        job.save(update_fields=(
+            "status", "attempts", "locked_by", "started"))
+    return job
+
+
+def claim(queues, worker):
+    """Забирает одну готовую задачу из очередей (в случайном порядке)."""
+    queues = list(queues)
+    random.shuffle(queues)
+    for queue in queues:
+        claimed = _claim_from(queue, worker)
+        if claimed is not None:
+            return claimed
+    return None
+
+
+def retry_delay(attempts):
+    """Задержка перед повтором: удваивается с каждой попыткой, с разбросом."""
+    delay = min(
+        settings.JOB_RETRY_DELAY * 2 ** (attempts - 1),
+        settings.JOB_RETRY_MAX_DELAY,
+    )
+    return delay * random.uniform(0.5, 1)
+
+
+def _own(job):
+    # Задачу, которую сочли зависшей и отдали другому воркеру, не трогаем.
+    return Job.objects.using(_alias()).filter(
+        pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by)
+
+
+def _finish(job, **changes):
+    _own(job).update(**changes)
+
+
+def _requeue(jobs, run_at, error):
+    """
+    Возвращает задачу (выборку из одной строки) в очередь. Если такая же
+    (dedup_key) уже ждёт, вторую не ставит, а закрывает: работу сделает
+    ждущая.
+    """
+    try:
+        with transaction.atomic(using=_alias()):
+            return jobs.update(
+                status=Job.QUEUED, run_at=run_at, locked_by="",
+                last_error=error,
+            )
+    except IntegrityError:
+        return jobs.update(
+            status=Job.DONE, finished=timezone.now(),
+            last_error=f"{error}\n{SUPERSEDED}",
+        )
+
+
+def run(job):
+    """Выполняет забранную задачу и записывает результат."""
+    try:
+        get_handler(job.name).func(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        now = timezone.now()
+        if job.attempts >= job.max_attempts:
+            logger.error("Job %s #%s failed:\n%s", job.name, job.pk, error)
+            _finish(job, status=Job.FAILED, finished=now, last_error=error)
+        else:
+            delay = retry_delay(job.attempts)
+            logger.warning(
+                "Job %s #%s failed, retrying in %.0f s", job.name, job.pk,
+                delay,
+            )
+            _requeue(_own(job), now + timedelta(seconds=delay), error)
+        return False
+    _finish(job, status=Job.DONE, finished=timezone.now(), last_error="")
+    return True
+
+
+def recover_stale():
+    """
+    Задачи, выполняющиеся дольше JOB_TIMEOUT (воркер упал или завис),
+    возвращает в очередь или, если попытки кончились, помечает failed.
+    """
+    jobs = Job.objects.using(_alias())
+    now = timezone.now()
+    stale = jobs.filter(
+        status=Job.RUNNING,
+        started__lt=now - timedelta(seconds=settings.JOB_TIMEOUT),
+    )
+    message = "Worker did not finish the job in time."
+    recovered = 0
+    for pk, locked_by, attempts, max_attempts in stale.values_list(
+        "pk", "locked_by", "attempts", "max_attempts"
+    ):
+        # По одной: воркер мог успеть закончить задачу, а такая же
+        # могла встать в очередь.
+        row = stale.filter(pk=pk, locked_by=locked_by)
+        if attempts >= max_attempts:
+            recovered += row.update(
+                status=Job.FAILED, finished=now, last_error=message)
+        else:
+            recovered += _requeue(row, now, message)
+    return recovered
+
+
+def prune():
+    """Удаляет выполненные задачи старше JOB_RETENTION_DAYS."""
+    return Job.objects.using(_alias()).filter(
+        status=Job.DONE,
+        finished__lt=timezone.now() - timedelta(
+            days=settings.JOB_RETENTION_DAYS),
+    ).delete()[0]
+
+
+def worker_name(number):
+    return f"{socket.gethostname()}:{os.getpid()}:{number}"
+
+
+def work(queues, worker, stop):
+    """Цикл воркера: забирает и выполняет задачи, пока не выставлен stop."""
+    while not stop.is_set():
+        try:
+            claimed = claim(queues, worker)
+        except DatabaseError:
+            # База недоступна или занята: переподключимся и попробуем позже.
+            logger.exception("Could not claim a job")
+            connections[_alias()].close()
+            claimed = None
+        if claimed is None:
+            stop.wait(settings.JOB_POLL_INTERVAL)
+            continue
+        try:
+            run(claimed)
+        except Exception:
+            # Результат не записан: задачу вернёт recover_stale() по
+            # JOB_TIMEOUT, а воркер продолжит работу.
+            logger.exception(
+                "Could not run job %s #%s", claimed.name, claimed.pk)
+            connections[_alias()].close()
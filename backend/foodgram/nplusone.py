@@ -0,0 +1,164 @@
+"""
+Поиск N+1: одна и та же форма запроса много раз с разными параметрами.
+
+detect() записывает запросы блока и в конце сообщает о формах, которые
+выполнились с разными параметрами больше NPLUSONE_THRESHOLD раз: поле
+сериализатора DRF, из которого они пошли, место вызова и SQL.
+NPlusOneMiddleware делает то же для каждого запроса к сайту, если
+NPLUSONE_DETECTOR равен "log" или "raise". Для тестов — query_budget()
+и assert_endpoint_budget(): ещё и предел общего числа запросов.
+"""
+import logging
+import sys
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.fields import Field
+from rest_framework.serializers import BaseSerializer
+
+from .sqlshape import find_caller, fingerprint
+
+logger = logging.getLogger(__name__)
+
+LOG = "log"
+RAISE = "raise"
+
+
+class NPlusOneError(AssertionError):
+    """Повторяющиеся запросы или превышен бюджет запросов."""
+
+
+def find_serializer_field():
+    """Поле сериализатора, внутри которого выполняется запрос."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        # type(), а не isinstance(): isinstance вычислил бы ленивый
+        # объект (request.user) — новым запросом из этой же обёртки.
+        owner = frame.f_locals.get("self")
+        owner_type = type(owner)
+        if issubclass(owner_type, BaseSerializer):
+            # Метод SerializerMethodField: get_<поле>.
+            name = frame.f_code.co_name
+            if name.startswith("get_") and name != "get_attribute":
+                return f"{owner_type.__name__}.{name[4:]}"
+        elif issubclass(owner_type, Field) and owner.field_name:
+            return f"{type(owner.parent).__name__}.{owner.field_name}"
+        frame = frame.f_back
+    return ""
+
+
+class _Shape:
+
+    def __init__(self, sql, caller, field):
+        self.sql = sql
+        self.caller = caller
+        self.field = field
+        self.count = 0
+        self.params = set()
+
+    def describe(self):
+        source = " from ".join(filter(None, (self.field, self.caller)))
+        return (
+            f"{self.count} queries ({len(self.params)} distinct parameter "
+            f"sets){f' in {source}' if source else ''}: {self.sql[:300]}"
+        )
+
+
+class QueryRecorder:
+    """execute_wrapper: число запросов и их формы."""
+
+    def __init__(self):
+        self.total = 0
+        self.shapes = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        self.total += 1
+        key, normalized = fingerprint(sql)
+        shape = self.shapes.get(key)
+        if shape is None:
+            shape = self.shapes[key] = _Shape(
+                normalized, find_caller(), find_serializer_field())
+        shape.count += 1
+        shape.params.add(repr(params))
+        return execute(sql, params, many, context)
+
+    def repeated(self, threshold):
+        """Формы, выполненные с разными параметрами больше threshold раз."""
+        return sorted(
+            (
+                shape for shape in self.shapes.values()
+                if len(shape.params) > threshold
+            ),
+            key=lambda shape: -shape.count,
+        )
+
+    def summary(self, limit=10):
+        shapes = sorted(self.shapes.values(), key=lambda shape: -shape.count)
+        return "\n".join(shape.describe() for shape in shapes[:limit])
+
+
+@contextmanager
+def detect(threshold=None, action=RAISE, label=""):
+    """
+    Записывает запросы блока во всех базах. Найденные N+1 пишет в лог
+    (action="log") или поднимает NPlusOneError (action="raise").
+    """
+    if threshold is None:
+        threshold = settings.NPLUSONE_THRESHOLD
+    recorder = QueryRecorder()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield recorder
+
+    repeated = recorder.repeated(threshold)
+    if not repeated:
+        return
+    message = "\n".join(
+        [f"N+1 queries{f' in {label}' if label else ''}:"]
+        + [f"  {shape.describe()}" for shape in repeated]
+    )
+    if action == RAISE:
+        raise NPlusOneError(message)
+    logger.warning(message)
+
+
+class NPlusOneMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = settings.NPLUSONE_DETECTOR
+        if mode not in (LOG, RAISE):
+            return self.get_response(request)
+        with detect(action=mode, label=f"{request.method} {request.path}"):
+            return self.get_response(request)
+
+
+@contextmanager
+def query_budget(max_queries, threshold=None):
+    """
+    Для тестов (pytest и unittest): блок выполняет не больше max_queries
+    запросов и без N+1, иначе NPlusOneError (это AssertionError).
+    """
+    with detect(threshold, RAISE) as recorder:
+        yield recorder
+    if recorder.total > max_queries:
+        raise NPlusOneError(
+            f"{recorder.total} queries, the budget is {max_queries}:\n"
+            f"{recorder.summary()}"
+        )
+
+
+def assert_endpoint_budget(
+    client, path, max_queries, method="get", threshold=None, **kwargs
+):
+    """
+    Запрос тестовым клиентом (Django или DRF) в пределах бюджета:
+
+        assert_endpoint_budget(client, "/api/recipes/", 8)
+    """
+    with query_budget(max_queries, threshold):
+        return getattr(client, method)(path, **kwargs)
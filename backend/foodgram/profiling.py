@@ -0,0 +1,146 @@
+"""
+Профилирование отдельных запросов по требованию персонала.
+
+Запрос профилируется, если сотрудник передал заголовок X-Profile: 1 или
+параметр ?_profile=1, либо если запрос попал в случайную выборку
+PROFILING_SAMPLE_RATE. cProfile снимает весь запрос после этого
+middleware: view, сериализаторы и ORM; дополнительно считаются SQL-запросы
+и их время. Профиль сохраняется в PROFILES_ROOT, метаданные — в
+RequestProfile; смотреть и скачивать профили — в админке.
+Остальные запросы платят только проверкой заголовка и строки запроса.
+"""
+import cProfile
+import io
+import logging
+import pstats
+import random
+import time
+import uuid
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+
+from api.authentication import CachedTokenAuthentication
+from recipes.models import RequestProfile
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "HTTP_X_PROFILE"
+PROFILE_PARAM = "_profile"
+
+
+class QueryTimer:
+    """execute_wrapper: число и суммарное время SQL-запросов."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+def _is_staff(request):
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    # Токен API проверяет DRF уже во view; здесь — тот же кеш токенов.
+    try:
+        authenticated = CachedTokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return authenticated is not None and authenticated[0].is_staff
+
+
+def _is_requested(request):
+    if request.META.get(PROFILE_HEADER) not in (None, "", "0"):
+        return True
+    return (
+        PROFILE_PARAM in request.META.get("QUERY_STRING", "")
+        and request.GET.get(PROFILE_PARAM) not in (None, "", "0")
+    )
+
+
+def _save(request, response, profiler, duration, queries, sampled):
+    name = f"{timezone.now():%Y/%m/%d}/{uuid.uuid4().hex}.prof"
+    path = settings.PROFILES_ROOT / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    profiler.dump_stats(path)
+
+    user = getattr(request, "user", None)
+    profile = RequestProfile.objects.create(
+        method=request.method,
+        path=request.path[:500],
+        query_string=request.META.get("QUERY_STRING", ""),
+        user=user if user is not None and user.is_authenticated else None,
+        status_code=response.status_code,
+        duration_ms=duration * 1000,
+        sql_count=queries.count,
+        sql_time_ms=queries.seconds * 1000,
+        sampled=sampled,
+        file=name,
+    )
+    stale = RequestProfile.objects.order_by("-created", "-pk")[
+        settings.PROFILING_KEEP:]
+    for old in stale:
+        old.delete()
+    return profile
+
+
+def render_stats(profile, limit=40, sort="cumulative"):
+    """Текстовый отчёт pstats: limit самых тяжёлых функций."""
+    output = io.StringIO()
+    stats = pstats.Stats(str(profile.file_path), stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
+
+
+class ProfilingMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if _is_requested(request):
+            if not _is_staff(request):
+                return self.get_response(request)
+            sampled = False
+        elif (
+            settings.PROFILING_SAMPLE_RATE > 0
+            and random.random() < settings.PROFILING_SAMPLE_RATE
+        ):
+            sampled = True
+        else:
+            return self.get_response(request)
+        return self._profile(request, sampled)
+
+    def _profile(self, request, sampled):
+        profiler = cProfile.Profile()
+        queries = QueryTimer()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            started = time.perf_counter()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            duration = time.perf_counter() - started
+
+        try:
+            profile = _save(
+                request, response, profiler, duration, queries, sampled)
+        except Exception:
+            logger.exception("Could not save the request profile")
+        else:
+            response["X-Profile-Id"] = str(profile.pk)
+        return response
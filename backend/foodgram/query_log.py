@@ -0,0 +1,266 @@
+"""
+Журнал SQL-запросов по отпечаткам.
+
+install() при старте WSGI/ASGI-приложения и management-команд ставит
+обёртку execute_wrapper на каждое подключение к базе при его создании
+(сигнал connection_created). Команды из SKIPPED_COMMANDS журнал не ведут:
+таблицы QueryStat может ещё не быть, а тесты не должны писать в базу
+разработчика. Каждый запрос попадает в агрегат своего отпечатка (SQL без
+литералов, IN (...) любой длины — один отпечаток) за текущую минуту:
+число выполнений, суммарное и максимальное время и место вызова в коде
+проекта. Запросы дольше SLOW_QUERY_THRESHOLD_MS считаются медленными;
+для SELECT из них фоновый поток снимает EXPLAIN — не чаще раза
+в SLOW_QUERY_EXPLAIN_INTERVAL секунд на отпечаток. Тот же поток раз
+в SLOW_QUERY_FLUSH_INTERVAL секунд переносит агрегаты в QueryStat;
+отчёт по ним строит команда query_report.
+"""
+import atexit
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connections
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from recipes.models import QueryStat
+
+from .sqlshape import find_caller, fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Команды, которые журнал не ведут.
+SKIPPED_COMMANDS = frozenset((
+    "migrate",
+    "makemigrations",
+    "showmigrations",
+    "sqlmigrate",
+    "squashmigrations",
+    "flush",
+    "test",
+))
+# Имена скриптов, которыми запускают management-команды.
+_COMMAND_SCRIPTS = (
+    "manage.py", "django-admin", "django-admin.py", "__main__.py")
+
+_EXPLAINABLE = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+
+# Запросы самого журнала (EXPLAIN и сброс агрегатов) не учитываются.
+_local = threading.local()
+_lock = threading.Lock()
+# (отпечаток, начало минуты) -> _Stat
+_stats = {}
+# отпечаток -> time.monotonic() последнего EXPLAIN
+_explained = {}
+_last_flush = time.monotonic()
+_installed = False
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="query-log")
+
+
+class _Stat:
+    __slots__ = (
+        "sql", "caller", "count", "slow_count", "total_ms", "max_ms", "plan")
+
+    def __init__(self, sql, caller):
+        self.sql = sql
+        self.caller = caller
+        self.count = self.slow_count = 0
+        self.total_ms = self.max_ms = 0.0
+        self.plan = ""
+
+
+def _observe(alias, sql, params, many, elapsed_ms):
+    global _last_flush
+
+    key, normalized = fingerprint(sql)
+    window = int(time.time()) // 60 * 60
+    slow = elapsed_ms >= settings.SLOW_QUERY_THRESHOLD_MS
+    caller = find_caller() if (key, window) not in _stats else ""
+    now = time.monotonic()
+    with _lock:
+        stat = _stats.get((key, window))
+        if stat is None:
+            stat = _stats[(key, window)] = _Stat(normalized, caller)
+        stat.count += 1
+        stat.total_ms += elapsed_ms
+        stat.max_ms = max(stat.max_ms, elapsed_ms)
+        explain = False
+        if slow:
+            stat.slow_count += 1
+            explain = (
+                not many
+                and _EXPLAINABLE.match(sql) is not None
+                and now - _explained.get(key, -float("inf"))
+                >= settings.SLOW_QUERY_EXPLAIN_INTERVAL
+            )
+            if explain:
+                _explained[key] = now
+        flush = now - _last_flush >= settings.SLOW_QUERY_FLUSH_INTERVAL
+        if flush:
+            _last_flush = now
+
+    if explain:
+        _executor.submit(_explain, alias, key, window, sql, params)
+    if flush:
+        _executor.submit(flush_stats)
+
+
+class QueryObserver:
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_local, "busy", False):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            try:
+                _observe(
+                    context["connection"].alias,
+                    sql, params, many, elapsed_ms,
+                )
+            except Exception:
+                logger.exception("Query log failed")
+
+
+observer = QueryObserver()
+
+
+def install_observer(sender, connection, **kwargs):
+    # В начало списка: временные обёртки (execute_wrapper() как
+    # контекстный менеджер) снимаются с конца и не заденут эту.
+    if observer not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, observer)
+
+
+def _explain(alias, key, window, sql, params):
+    _local.busy = True
+    try:
+        connection = connections[alias]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"{connection.ops.explain_query_prefix()} {sql}", params)
+            plan = "\n".join(
+                " ".join(str(value) for value in row)
+                for row in cursor.fetchall()
+            )
+        with _lock:
+            stat = _stats.get((key, window))
+            if stat is None:
+                sql_text = fingerprint(sql)[1]
+                stat = _stats[(key, window)] = _Stat(sql_text, "")
+            stat.plan = plan
+    except DatabaseError as error:
+        logger.warning("Could not EXPLAIN %s: %s", key, error)
+    finally:
+        _local.busy = False
+        connections.close_all()
+
+
+def flush_stats():
+    """Переносит накопленные агрегаты в QueryStat и чистит старые."""
+    global _stats
+
+    with _lock:
+        stats, _stats = _stats, {}
+    if not stats:
+        return
+    _local.busy = True
+    try:
+        for (key, window), stat in stats.items():
+            _save(key, datetime.fromtimestamp(window, dt_timezone.utc), stat)
+        QueryStat.objects.filter(
+            window__lt=timezone.now() - timedelta(
+                hours=settings.SLOW_QUERY_RETENTION_HOURS)
+        ).delete()
+    except DatabaseError as error:
+        logger.warning("Could not save query stats: %s", error)
+    finally:
+        _local.busy = False
+        connections.close_all()
+
+
+def _save(key, window, stat):
+    changes = {
+        "count": F("count") + stat.count,
+        "slow_count": F("slow_count") + stat.slow_count,
+        "total_ms": F("total_ms") + stat.total_ms,
+        "max_ms": Greatest(F("max_ms"), stat.max_ms),
+    }
+    if stat.plan:
+        changes["plan"] = stat.plan
+    rows = QueryStat.objects.filter(fingerprint=key, window=window)
+    if rows.update(**changes):
+        return
+    try:
+        QueryStat.objects.create(
+            fingerprint=key,
+            window=window,
+            sql=stat.sql,
+            caller=stat.caller,
+            count=stat.count,
+            slow_count=stat.slow_count,
+            total_ms=stat.total_ms,
+            max_ms=stat.max_ms,
+            plan=stat.plan,
+        )
+    except IntegrityError:
+        # Ту же минуту успел создать другой процесс.
+        rows.update(**changes)
+
+
+def _flush_on_exit():
+    # Остаток с последнего планового сброса.
+    try:
+        flush_stats()
+    except Exception:
+        logger.exception("Could not save query stats on exit")
+
+
+def install():
+    """Включает журнал в этом процессе, если SLOW_QUERY_LOG."""
+    global _installed
+
+    if _installed or not settings.SLOW_QUERY_LOG:
+        return
+    _installed = True
+    connection_created.connect(install_observer)
+    atexit.register(_flush_on_exit)
+    os.register_at_fork(after_in_child=_after_fork)
+    # Подключения, открытые до вызова, — например, при загрузке WSGI.
+    for connection in connections.all():
+        if connection.connection is not None:
+            install_observer(None, connection)
+
+
+def install_for_command(argv):
+    """
+    Включает журнал, если процесс — management-команда (argv — sys.argv)
+    не из SKIPPED_COMMANDS.
+    """
+    if (
+        len(argv) > 1
+        and os.path.basename(argv[0]) in _COMMAND_SCRIPTS
+        and argv[1] not in SKIPPED_COMMANDS
+    ):
+        install()
+
+
+def _after_fork():
+    # Поток сброса в дочерний процесс не переходит, а накопленное до
+    # fork сбросит родитель.
+    global _executor, _lock, _stats, _last_flush
+
+    _lock = threading.Lock()
+    _stats = {}
+    _last_flush = time.monotonic()
+    _executor = ThreadPoolExecutor(
+        max_workers=1, thread_name_prefix="query-log")
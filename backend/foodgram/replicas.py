@@ -0,0 +1,220 @@
+"""
+Чтение с реплик для безопасных запросов.
+
+ReplicaMiddleware выбирает на время запроса одну живую реплику,
+ReplicaRouter направляет на неё чтения. После успешной записи клиент
+(токен или сессия) на REPLICA_STICKY_SECONDS закрепляется за основной
+базой — так он сразу видит свои изменения, несмотря на отставание реплик.
+
+Доступность и отставание реплик раз в REPLICA_CHECK_INTERVAL секунд
+проверяет фоновый поток процесса, запрос только читает результат: зависшая
+реплика не задерживает запросы. Если реплика отказала посреди безопасного
+запроса, он повторяется на основной базе.
+"""
+import hashlib
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import (
+    DEFAULT_DB_ALIAS,
+    DatabaseError,
+    OperationalError,
+    connections,
+)
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+PIN_COOKIE = "replica_pin"
+
+# Модели, которые всегда читаются с основной базы: только что выданный
+# токен может ещё не доехать до реплики.
+PRIMARY_ONLY_MODELS = frozenset(("authtoken.token",))
+
+LAG_SQL = """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+_read_alias = ContextVar("read_alias", default=None)
+
+# alias -> реплика пригодна; непроверенная — непригодна.
+_health = {}
+
+
+def _replica_lag(connection):
+    if connection.vendor != "postgresql":
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(LAG_SQL)
+        return cursor.fetchone()[0] or 0
+
+
+def _check_replica(alias):
+    connection = connections[alias]
+    try:
+        connection.ensure_connection()
+        lag = _replica_lag(connection)
+    except DatabaseError as error:
+        logger.warning("Replica %s is unavailable: %s", alias, error)
+        connection.close()
+        return False
+    if lag > settings.REPLICA_MAX_LAG:
+        logger.warning("Replica %s lags by %.1f s", alias, lag)
+        return False
+    return True
+
+
+class ReplicaMonitor:
+    """Фоновый поток процесса: проверяет реплики и обновляет _health."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        # Поток не переживает fork: воркер запустит свой.
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="replica-monitor", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Replica monitor failed")
+            time.sleep(settings.REPLICA_CHECK_INTERVAL)
+
+    def check(self):
+        for alias in settings.DATABASE_REPLICAS:
+            _health[alias] = _check_replica(alias)
+
+
+monitor = ReplicaMonitor()
+
+
+def is_replica_healthy(alias):
+    return _health.get(alias, False)
+
+
+def mark_replica_down(alias):
+    # До следующей проверки монитором.
+    _health[alias] = False
+
+
+def _client_key(request):
+    credentials = (
+        request.META.get("HTTP_AUTHORIZATION")
+        or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    )
+    if not credentials:
+        return None
+    digest = hashlib.sha1(credentials.encode()).hexdigest()
+    return f"replica-pin:{digest}"
+
+
+def is_pinned(request):
+    if request.COOKIES.get(PIN_COOKIE):
+        return True
+    key = _client_key(request)
+    return key is not None and cache.get(key) is not None
+
+
+def pin_to_primary(request, response):
+    timeout = settings.REPLICA_STICKY_SECONDS
+    key = _client_key(request)
+    if key is not None:
+        cache.set(key, 1, timeout)
+    # Cookie закрепляет браузер и без общего кеша между воркерами.
+    response.set_cookie(PIN_COOKIE, "1", max_age=timeout, httponly=True)
+
+
+def choose_read_alias(request):
+    if (
+        not settings.DATABASE_REPLICAS
+        or request.method not in SAFE_METHODS
+        or is_pinned(request)
+    ):
+        return None
+    monitor.start()
+    replicas = [
+        alias for alias in settings.DATABASE_REPLICAS
+        if is_replica_healthy(alias)
+    ]
+    return random.choice(replicas) if replicas else None
+
+
+class ReplicaMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        alias = choose_read_alias(request)
+        token = _read_alias.set(alias)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            pin_to_primary(request, response)
+        return response
+
+    def process_exception(self, request, exception):
+        alias = _read_alias.get()
+        if alias is None or not isinstance(exception, DatabaseError):
+            return None
+        mark_replica_down(alias)
+        if (
+            request.method not in SAFE_METHODS
+            or not isinstance(exception, OperationalError)
+        ):
+            return None
+        # Безопасный запрос можно повторить; повторная ошибка — уже
+        # с основной базы — обрабатывается как обычно.
+        logger.warning(
+            "Replica %s failed, retrying %s on the primary: %s",
+            alias, request.path, exception,
+        )
+        token = _read_alias.set(None)
+        try:
+            return self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    """Чтения — на реплику текущего запроса, записи — на основную базу."""
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if (
+            alias is None
+            or model._meta.label_lower in PRIMARY_ONLY_MODELS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.DATABASE_REPLICAS
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -49,11 +50,14 @@ if DJANGO_ENV == "local":
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'foodgram.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'foodgram.profiling.ProfilingMiddleware',
+    'foodgram.nplusone.NPlusOneMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -89,6 +93,12 @@ if DJANGO_ENV == "local":
             "NAME": BASE_DIR / "db.sqlite3",
         }
     }
+    # Локальная «реплика» — тот же файл: роутинг проверяется без Postgres.
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS = ["replica"]
 else:
     DATABASES = {
         'default': {
@@ -100,6 +110,50 @@ else:
             'PORT': os.getenv('DB_PORT', 5432)
         }
     }
+    # DB_REPLICA_HOSTS=replica1,replica2 — хосты реплик с теми же учётными данными.
+    DATABASE_REPLICAS = []
+    replica_hosts = os.getenv('DB_REPLICA_HOSTS', '')
+    for number, host in enumerate(filter(None, replica_hosts.split(',')), 1):
+        alias = f'replica_{number}'
+        DATABASES[alias] = {
+            **DATABASES['default'],
+            'HOST': host.strip(),
+            # Упавшая между проверками реплика не держит запрос долго.
+            'OPTIONS': {
+                'connect_timeout': int(
+                    os.getenv('REPLICA_CONNECT_TIMEOUT', 2)),
+            },
+            'TEST': {'MIRROR': 'default'},
+        }
+        DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['foodgram.replicas.ReplicaRouter']
+
+# Сколько секунд после записи клиент читает с основной базы.
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+# Допустимое отставание реплики, секунд, и период его проверки
+# фоновым потоком (foodgram.replicas.ReplicaMonitor).
+REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', 10))
+REPLICA_CHECK_INTERVAL = float(os.getenv('REPLICA_CHECK_INTERVAL', 5))
+
+# Кеш общий для всех воркеров и контейнеров: через него работают
+# закрепление за основной базой, множества membership и другие кеши.
+if DJANGO_ENV == "local":
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': os.getenv(
+                'CACHE_BACKEND',
+                'django.core.cache.backends.memcached.PyMemcacheCache',
+            ),
+            'LOCATION': os.getenv('CACHE_LOCATION', 'memcached:11211'),
+        }
+    }
 
 AUTH_USER_MODEL = 'recipes.User'
 
@@ -112,7 +166,7 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -124,6 +178,90 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 6,
 }
 
+# Кеш токенов в памяти процесса: время жизни записи, секунд, размер
+# и как часто (в обращениях) писать в лог статистику попаданий.
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 30))
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+TOKEN_CACHE_STATS_EVERY = 10000
+
+# Множества избранного, корзины и подписок пользователя в кеше:
+# время жизни, секунд, и размер, до которого фильтры используют id__in.
+MEMBERSHIP_CACHE_TTL = 24 * 60 * 60
+MEMBERSHIP_IN_THRESHOLD = 1000
+
+# Кеш ответов о рецептах для анонимов (api.response_cache): время
+# жизни записи, секунд (0 — кеш выключен), и сколько ещё секунд
+# устаревшую запись отдают, пока её пересчитывает другой запрос.
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 300))
+RESPONSE_CACHE_STALE = int(os.getenv('RESPONSE_CACHE_STALE', 30))
+# Сколько секунд одинаковые запросы ждут уже идущее вычисление
+# (api.single_flight), прежде чем считать сами.
+SINGLE_FLIGHT_TIMEOUT = 10
+
+# Шина инвалидации кешей процессов (foodgram.invalidation): "postgres" —
+# LISTEN/NOTIFY, "file" — файл INVALIDATION_FILE (тесты и локальный
+# запуск), пусто — только свой процесс. Раз в INVALIDATION_POLL_INTERVAL
+# секунд слушатель перечитывает события и без уведомления; незакоммиченные
+# пропуски в id ждёт INVALIDATION_GAP_TIMEOUT секунд, события хранятся
+# INVALIDATION_RETENTION секунд.
+INVALIDATION_TRANSPORT = os.getenv(
+    'INVALIDATION_TRANSPORT', 'file' if DJANGO_ENV == 'local' else 'postgres')
+INVALIDATION_FILE = Path(os.getenv(
+    'INVALIDATION_FILE',
+    Path(tempfile.gettempdir()) / 'foodgram-invalidation.bus',
+))
+INVALIDATION_POLL_INTERVAL = 5
+INVALIDATION_GAP_TIMEOUT = 60
+INVALIDATION_RETENTION = 60 * 60
+
+# Фоновые задачи (foodgram.job_queue, команда run_workers). JOBS_EAGER —
+# выполнять задачи в самом процессе после коммита, без воркеров.
+# JOB_QUEUES — сколько задач очереди выполняется одновременно на всех
+# воркерах (None — без ограничения). Повтор упавшей задачи — через
+# JOB_RETRY_DELAY * 2^(попытка-1) секунд, но не дольше JOB_RETRY_MAX_DELAY;
+# задача, выполняющаяся дольше JOB_TIMEOUT секунд, возвращается в очередь.
+JOBS_EAGER = os.getenv(
+    'JOBS_EAGER', '1' if DJANGO_ENV == 'local' else '') == '1'
+JOB_QUEUES = {
+    'default': None,
+    'similar': 2,
+    'maintenance': 1,
+}
+JOB_WORKER_PROCESSES = int(os.getenv('JOB_WORKER_PROCESSES', 2))
+JOB_POLL_INTERVAL = 1
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_DELAY = 10
+JOB_RETRY_MAX_DELAY = 60 * 60
+JOB_TIMEOUT = 30 * 60
+JOB_RETENTION_DAYS = 7
+JOB_SHUTDOWN_TIMEOUT = 30
+
+# Сколько похожих рецептов хранится для каждого рецепта.
+SIMILAR_RECIPES_K = int(os.getenv('SIMILAR_RECIPES_K', 10))
+
+# Поиск по кладовой: как часто, секунд, индекс сверяется с базой
+# и сколько ингредиентов можно передать в одном запросе.
+PANTRY_INDEX_CHECK_INTERVAL = 5
+PANTRY_MAX_INGREDIENTS = 100
+
+# Сколько строк удаляет один DELETE в recipes.deletion.
+BULK_DELETE_CHUNK_SIZE = 1000
+
+# Сколько рецептов можно добавить в избранное или корзину
+# (или убрать оттуда) одним запросом.
+RELATION_BULK_MAX_SIZE = 500
+
+# Сколько рецептов можно запросить по списку id (ids= или batch/).
+RECIPE_BATCH_MAX_SIZE = 100
+
+# Журнал изменений рецептов: сколько записей отдаётся за запрос
+# по умолчанию и максимум, и сколько дней хранятся записи (их удаляет
+# run_workers; клиент с более старым курсором загружает всё заново).
+RECIPE_CHANGES_LIMIT = 100
+RECIPE_CHANGES_MAX_LIMIT = 1000
+RECIPE_CHANGES_RETENTION_DAYS = int(
+    os.getenv('RECIPE_CHANGES_RETENTION_DAYS', 30))
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'SERIALIZERS': {
@@ -156,6 +294,35 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Файлы именуются по sha256 содержимого и раскладываются по вложенным
+# каталогам; существующие переносит migrate_media_storage.
+DEFAULT_FILE_STORAGE = 'recipes.storage.ContentAddressedStorage'
+
+# Готовые списки покупок; файлы старше TTL удаляет sweep_shopping_lists.
+SHOPPING_LISTS_ROOT = BASE_DIR / 'shopping_lists'
+SHOPPING_LISTS_TTL = 7 * 24 * 60 * 60
+
+# Профили запросов (foodgram.profiling): каталог, доля случайно
+# профилируемых запросов (0 — только по запросу сотрудника)
+# и сколько последних профилей хранить.
+PROFILES_ROOT = BASE_DIR / 'profiles'
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0))
+PROFILING_KEEP = 500
+
+# Журнал SQL по отпечаткам (foodgram.query_log): включён ли, с какого
+# времени, мс, запрос считается медленным и получает EXPLAIN, как часто,
+# секунд, агрегаты сбрасываются в базу и сколько часов они хранятся.
+SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG', '1') == '1'
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 100))
+SLOW_QUERY_FLUSH_INTERVAL = 60
+SLOW_QUERY_EXPLAIN_INTERVAL = 600
+SLOW_QUERY_RETENTION_HOURS = 24
+
+# Поиск N+1 (foodgram.nplusone): "log", "raise" или пусто — выключен;
+# сколько раз одна форма запроса может повториться с разными параметрами.
+NPLUSONE_DETECTOR = os.getenv(
+    'NPLUSONE_DETECTOR', 'log' if DJANGO_ENV == 'local' else '')
+NPLUSONE_THRESHOLD = int(os.getenv('NPLUSONE_THRESHOLD', 5))
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
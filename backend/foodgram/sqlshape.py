@@ -0,0 +1,60 @@
+"""
+Форма SQL-запроса: отпечаток без литералов и место вызова в коде.
+Общие для журнала запросов (query_log) и поиска N+1 (nplusone).
+"""
+import hashlib
+import os
+import re
+import sys
+from functools import lru_cache
+
+from django.conf import settings
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w\"])-?\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN \(\?(?:\s*,\s*\?)*\)", re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+_HERE = os.path.dirname(__file__) + os.sep
+# Библиотеки, чьи кадры не годятся в места вызова: сам ORM и обёртки
+# курсора из debug_toolbar.
+_SKIPPED_PACKAGES = tuple(
+    f"site-packages{os.sep}{name}{os.sep}"
+    for name in ("django", "debug_toolbar")
+)
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """(sha1, нормализованный SQL) — одинаковы у запросов одной формы."""
+    normalized = _STRING.sub("?", sql).replace("%s", "?")
+    normalized = _NUMBER.sub("?", normalized)
+    normalized = _IN_LIST.sub("IN (...)", normalized)
+    normalized = _SPACES.sub(" ", normalized).strip()
+    return hashlib.sha1(normalized.encode()).hexdigest(), normalized
+
+
+def find_caller():
+    """
+    Ближайший к запросу кадр из кода приложений проекта (без middleware
+    из foodgram), а если его нет — ближайший кадр вне Django:
+    файл:строка функция.
+    """
+    root = str(settings.BASE_DIR) + os.sep
+    fallback = ""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if "site-packages" in filename:
+            if not fallback and not any(
+                name in filename for name in _SKIPPED_PACKAGES
+            ):
+                fallback = _frame_label(
+                    frame, filename.rpartition("site-packages" + os.sep)[2])
+        elif filename.startswith(root) and not filename.startswith(_HERE):
+            return _frame_label(frame, filename[len(root):])
+        frame = frame.f_back
+    return fallback
+
+
+def _frame_label(frame, filename):
+    return f"{filename}:{frame.f_lineno} {frame.f_code.co_name}"[:255]
@@ -1,17 +1,28 @@
 from django.contrib import admin
-from django.db.models import Count, Exists, OuterRef
+from django.db.models import Count, Exists, OuterRef, QuerySet
+from django.http import FileResponse, Http404
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.html import format_html
 from django.utils.safestring import mark_safe
+from django.utils.text import capfirst
+from foodgram.profiling import render_stats
 
+from .deletion import bulk_delete, count_related
 from .models import (
     Favorite,
     Ingredient,
     IngredientInRecipe,
+    Job,
+    MediaBlob,
     Recipe,
+    RequestProfile,
     ShoppingCart,
     Subscription,
     Tag,
     User,
 )
+from .relations import relations_changed
 
 
 class BaseExistsFilter(admin.SimpleListFilter):
@@ -68,6 +79,67 @@ class HasSubscribersFilter(BaseExistsFilter):
 # ------------------------
 
 
+class RelationsChangedMixin:
+    """
+    Правки связей пользователя в админке отправляют relations_changed:
+    API обновляет свои кеши связей на месте, а админка — нет.
+    """
+
+    def _relations_changed(self, user_ids):
+        relations_changed.send(
+            sender=self.model, user_ids=set(user_ids) - {None})
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        self._relations_changed((obj.user_id, form.initial.get("user")))
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self._relations_changed((obj.user_id,))
+
+    def delete_queryset(self, request, queryset):
+        user_ids = list(queryset.values_list("user_id", flat=True))
+        super().delete_queryset(request, queryset)
+        self._relations_changed(user_ids)
+
+
+class BulkDeleteMixin:
+    """
+    Удаление через recipes.deletion: зависимые строки не загружаются
+    ни для удаления, ни для страницы подтверждения — там только их число.
+    """
+
+    def delete_model(self, request, obj):
+        bulk_delete(self.model._base_manager.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        bulk_delete(queryset)
+
+    def get_deleted_objects(self, objs, request):
+        if not isinstance(objs, QuerySet):
+            objs = self.model._base_manager.filter(
+                pk__in=[obj.pk for obj in objs])
+        counts = count_related(objs)
+
+        perms_needed = set()
+        for model in counts:
+            model_admin = self.admin_site._registry.get(model)
+            if (
+                model_admin is not None
+                and not model_admin.has_delete_permission(request)
+            ):
+                perms_needed.add(model._meta.verbose_name)
+        deleted_objects = [
+            f"{capfirst(model._meta.verbose_name_plural)}: {count}"
+            for model, count in counts.items()
+        ]
+        model_count = {
+            model._meta.verbose_name_plural: count
+            for model, count in counts.items()
+        }
+        return deleted_objects, model_count, perms_needed, []
+
+
 class BaseRecipeRelationAdmin(admin.ModelAdmin):
 
     list_display = ("recipes_count",)
@@ -78,7 +150,7 @@ class BaseRecipeRelationAdmin(admin.ModelAdmin):
 
 
 @admin.register(User)
-class UserAdmin(BaseRecipeRelationAdmin):
+class UserAdmin(BulkDeleteMixin, admin.ModelAdmin):
     fieldsets = (
         (None, {"fields": ("email", "password")}),
         (
@@ -123,9 +195,9 @@ class UserAdmin(BaseRecipeRelationAdmin):
         "full_name",
         "email",
         "avatar_preview",
-        *BaseRecipeRelationAdmin.list_display,
-        "subscriptions_count",
-        "subscribers_count",
+        "recipes_count",
+        "following_count",
+        "followers_count",
     )
 
     list_filter = (
@@ -154,17 +226,9 @@ class UserAdmin(BaseRecipeRelationAdmin):
             )
         return "—"
 
-    @admin.display(description="Подписок")
-    def subscriptions_count(self, user):
-        return user.followers.count()
-
-    @admin.display(description="Подписчиков")
-    def subscribers_count(self, user):
-        return user.authors.count()
-
 
 @admin.register(Subscription)
-class SubscriptionAdmin(admin.ModelAdmin):
+class SubscriptionAdmin(RelationsChangedMixin, admin.ModelAdmin):
     list_display = ("id", "user", "author")
     search_fields = (
         "user__email",
@@ -211,7 +275,7 @@ class IngredientAdmin(BaseRecipeRelationAdmin):
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(BulkDeleteMixin, admin.ModelAdmin):
     list_display = (
         "id",
         "name",
@@ -287,7 +351,7 @@ class RecipeAdmin(admin.ModelAdmin):
 
 
 @admin.register(Favorite, ShoppingCart)
-class UserRecipeRelationAdmin(admin.ModelAdmin):
+class UserRecipeRelationAdmin(RelationsChangedMixin, admin.ModelAdmin):
     list_display = ("id", "user", "recipe")
     list_select_related = ("user", "recipe")
     search_fields = (
@@ -306,3 +370,144 @@ class IngredientInRecipeAdmin(admin.ModelAdmin):
     list_select_related = ("recipe", "ingredient")
     search_fields = ("recipe__name", "ingredient__name")
     autocomplete_fields = ("recipe", "ingredient")
+
+
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ("name", "size", "references", "created")
+    search_fields = ("name",)
+    readonly_fields = ("name", "size", "references", "created")
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = (
+        "created",
+        "method",
+        "path",
+        "status_code",
+        "duration_ms",
+        "sql_count",
+        "sql_time_ms",
+        "user",
+        "sampled",
+    )
+    list_filter = ("method", "status_code", "sampled")
+    search_fields = ("path", "query_string", "user__email")
+    list_select_related = ("user",)
+    readonly_fields = (
+        "created",
+        "method",
+        "path",
+        "query_string",
+        "user",
+        "status_code",
+        "duration_ms",
+        "sql_count",
+        "sql_time_ms",
+        "sampled",
+        "download",
+        "stats",
+    )
+    fields = readonly_fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                "<path:object_id>/download/",
+                self.admin_site.admin_view(self.download_view),
+                name="recipes_requestprofile_download",
+            ),
+            *super().get_urls(),
+        ]
+
+    def download_view(self, request, object_id):
+        profile = self.get_object(request, object_id)
+        if profile is None or not self.has_view_permission(request, profile):
+            raise Http404
+        if not profile.file_path.exists():
+            raise Http404("Файл профиля не найден.")
+        return FileResponse(
+            open(profile.file_path, "rb"),
+            as_attachment=True,
+            filename=f"profile-{profile.pk}.prof",
+        )
+
+    @admin.display(description="Файл")
+    def download(self, profile):
+        return format_html(
+            '<a href="{}">Скачать .prof</a> (snakeviz, pstats)',
+            reverse(
+                "admin:recipes_requestprofile_download", args=[profile.pk]),
+        )
+
+    @admin.display(description="Самые тяжёлые функции")
+    def stats(self, profile):
+        try:
+            report = render_stats(profile)
+        except OSError:
+            return "Файл профиля не найден."
+        return format_html("<pre>{}</pre>", report)
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        "created",
+        "name",
+        "queue",
+        "status",
+        "attempts",
+        "run_at",
+        "finished",
+        "locked_by",
+    )
+    list_filter = ("status", "queue", "name")
+    search_fields = ("name", "dedup_key")
+    readonly_fields = (
+        "created",
+        "queue",
+        "name",
+        "payload",
+        "dedup_key",
+        "status",
+        "attempts",
+        "max_attempts",
+        "run_at",
+        "locked_by",
+        "started",
+        "finished",
+        "last_error",
+    )
+    fields = readonly_fields
+    actions = ("retry",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.action(description="Повторить неудавшиеся задачи")
+    def retry(self, request, queryset):
+        # Задачу, чей двойник (тот же dedup_key) уже ждёт в очереди,
+        # повторять незачем.
+        waiting = Job.objects.filter(
+            status=Job.QUEUED, dedup_key__isnull=False,
+        ).values("dedup_key")
+        retried = queryset.filter(status=Job.FAILED).exclude(
+            dedup_key__in=waiting,
+        ).update(
+            status=Job.QUEUED,
+            attempts=0,
+            run_at=timezone.now(),
+            finished=None,
+            locked_by="",
+        )
+        self.message_user(request, f"Поставлено в очередь задач: {retried}.")
@@ -1,6 +1,16 @@
+import sys
+
 from django.apps import AppConfig
 
 
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        from foodgram import query_log
+
+        from . import signals  # noqa: F401
+
+        # Веб-процесс включает журнал в foodgram.wsgi и foodgram.asgi.
+        query_log.install_for_command(sys.argv)
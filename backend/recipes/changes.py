@@ -0,0 +1,120 @@
+"""
+Журнал изменений рецептов (RecipeChange) для синхронизации клиентов.
+
+Записи делаются в той же транзакции, что и само изменение: сигналами
+из recipes.signals, в touch_recipes и в recipes.relations. Курсор —
+id последней отданной клиенту записи.
+
+Запись с меньшим id может закоммититься позже записи с большим, поэтому
+журнал упорядочен по (txid, id), где txid — номер записавшей транзакции
+в PostgreSQL, и отдаются только записи транзакций старше xmin текущего
+снимка: все они уже завершены, и новые записи встают только после них.
+Долгая пишущая транзакция задерживает журнал, но ничего не теряет.
+SQLite выполняет пишущие транзакции по одной: там txid = 0 и порядок — id.
+
+Записи старше RECIPE_CHANGES_RETENTION_DAYS удаляет prune(); курсор на
+удалённую запись больше не годится — клиент загружает рецепты заново.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Favorite, RecipeChange, ShoppingCart
+
+TARGET_BY_MODEL = {
+    Favorite: RecipeChange.FAVORITE,
+    ShoppingCart: RecipeChange.SHOPPING_CART,
+}
+
+# Отправляется после каждой записи в журнал: sender — RecipeChange,
+# target, recipe_ids, user_id, deleted и using — как в record().
+recorded = Signal()
+
+
+class CursorExpired(Exception):
+    """Записи курсора нет: её удалил prune(), или курсор выдуман."""
+
+
+def _is_postgresql(using):
+    return connections[using].vendor == "postgresql"
+
+
+def _current_txid(using):
+    if not _is_postgresql(using):
+        return 0
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT txid_current()")
+        return cursor.fetchone()[0]
+
+
+def record(target, recipe_ids, user_id=None, deleted=False, using=None):
+    using = using or router.db_for_write(RecipeChange)
+    txid = _current_txid(using)
+    RecipeChange.objects.using(using).bulk_create(
+        [
+            RecipeChange(
+                target=target,
+                recipe_id=recipe_id,
+                user_id=user_id,
+                deleted=deleted,
+                txid=txid,
+            )
+            for recipe_id in recipe_ids
+        ],
+        batch_size=1000,
+    )
+    recorded.send(
+        sender=RecipeChange,
+        target=target,
+        recipe_ids=recipe_ids,
+        user_id=user_id,
+        deleted=deleted,
+        using=using,
+    )
+
+
+def read(since, limit, user_id=None):
+    """
+    Изменения после курсора since, видимые пользователю user_id: не больше
+    limit записей, свёрнутых до последней по каждой паре (target, рецепт).
+    Возвращает (записи, новый курсор, есть ли ещё записи); на курсор
+    удалённой записи — CursorExpired.
+    """
+    changes = RecipeChange.objects.all()
+    visible = Q(user_id__isnull=True)
+    if user_id is not None:
+        visible |= Q(user_id=user_id)
+    rows = changes.filter(visible)
+    if _is_postgresql(changes.db):
+        # В том же запросе, что и выборка: xmin её же снимка.
+        rows = rows.filter(txid__lt=RawSQL(
+            "txid_snapshot_xmin(txid_current_snapshot())", ()))
+    if since:
+        txid = changes.filter(pk=since).values_list("txid", flat=True).first()
+        if txid is None:
+            raise CursorExpired(since)
+        rows = rows.filter(Q(txid__gt=txid) | Q(txid=txid, id__gt=since))
+    rows = list(rows.order_by("txid", "id")[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    cursor = rows[-1].id if rows else since
+
+    latest = {}
+    for row in rows:
+        key = (row.target, row.recipe_id)
+        latest.pop(key, None)
+        latest[key] = row
+    return list(latest.values()), cursor, has_more
+
+
+def prune():
+    """Удаляет записи старше RECIPE_CHANGES_RETENTION_DAYS."""
+    return RecipeChange.objects.filter(
+        created__lt=timezone.now() - timedelta(
+            days=settings.RECIPE_CHANGES_RETENTION_DAYS),
+    ).delete()[0]
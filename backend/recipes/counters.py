@@ -0,0 +1,76 @@
+"""
+Денормализованные счётчики пользователя: рецепты, подписчики, подписки.
+
+Сигналы сдвигают их атомарными UPDATE ... SET x = x + n в той же
+транзакции, что и сама запись; пересчёт из связанных таблиц —
+только в reconcile() и миграции, которая их заполнила.
+"""
+from collections import defaultdict
+
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Recipe, Subscription, User
+
+# Счётчик -> (модель, поле, ссылающееся на пользователя).
+COUNTERS = {
+    "recipes_count": (Recipe, "author"),
+    "followers_count": (Subscription, "author"),
+    "following_count": (Subscription, "user"),
+}
+
+# Модель -> ((поле, счётчик), ...), для сигналов.
+COUNTED_FIELDS = {
+    model: tuple(
+        (field, counter)
+        for counter, (counted, field) in COUNTERS.items()
+        if counted is model
+    )
+    for model, _ in COUNTERS.values()
+}
+
+
+def actual_count(counter):
+    """Подзапрос с настоящим значением счётчика для строки User."""
+    model, field = COUNTERS[counter]
+    return Coalesce(
+        Subquery(
+            model._base_manager.filter(**{field: OuterRef("pk")})
+            .order_by().values(field)
+            .annotate(total=Count("*")).values("total"),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def shift(counter, deltas, using=None):
+    """
+    Прибавляет к счётчику {user_id: delta}: по одному UPDATE на каждое
+    различное значение delta. Ниже нуля счётчик не опускается —
+    такое расхождение исправит reconcile().
+    """
+    by_delta = defaultdict(list)
+    for user_id, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(user_id)
+    for delta, user_ids in by_delta.items():
+        User._base_manager.using(using).filter(pk__in=user_ids).update(
+            **{counter: Greatest(F(counter) + delta, 0)})
+
+
+def reconcile(queryset, fix=True):
+    """
+    Исправляет разошедшиеся счётчики у пользователей из выборки.
+    Возвращает число строк с расхождением; с fix=False только считает.
+    """
+    actual = {f"actual_{name}": actual_count(name) for name in COUNTERS}
+    drifted = list(
+        queryset.annotate(**actual)
+        .exclude(**{name: F(f"actual_{name}") for name in COUNTERS})
+        .values_list("pk", flat=True)
+    )
+    if drifted and fix:
+        User._base_manager.using(queryset.db).filter(pk__in=drifted).update(
+            **{name: actual_count(name) for name in COUNTERS})
+    return len(drifted)
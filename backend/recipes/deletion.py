@@ -0,0 +1,130 @@
+"""
+Удаление строк вместе с зависимыми без загрузки объектов в Python.
+
+В отличие от Collector, строки не превращаются в экземпляры моделей,
+а pre_delete/post_delete не отправляются для каждой строки. Зависимые
+таблицы обходятся по тем же связям, что и у Collector, и очищаются
+пачками первичных ключей от листьев к корню; каждая пачка — отдельный
+короткий DELETE (и отдельная транзакция, если вызывающий код сам не
+открыл общую — так удаляет массовое действие админки). Один объект
+delete_instance() удаляет целиком в одной транзакции. Вместо построчных
+сигналов перед каждой пачкой отправляется pre_bulk_delete — его
+получатели чистят кеши и файлы.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import (
+    CASCADE,
+    DO_NOTHING,
+    SET_NULL,
+    ProtectedError,
+    Q,
+)
+from django.db.models.deletion import get_candidate_relations_to_delete
+from django.dispatch import Signal
+
+# Отправляется перед удалением пачки: sender — модель, pks — ключи строк,
+# using — база. Строки ещё существуют, их можно прочитать.
+pre_bulk_delete = Signal()
+
+
+def _relations(model):
+    for relation in get_candidate_relations_to_delete(model._meta):
+        yield relation.related_model, relation.field
+
+
+def _chunks(queryset, chunk_size):
+    """Ключи строк выборки пачками; удалённые строки в неё не попадают."""
+    while True:
+        pks = list(
+            queryset.order_by("pk").values_list("pk", flat=True)[:chunk_size]
+        )
+        if not pks:
+            return
+        yield pks
+
+
+def _delete_pks(model, pks, using, chunk_size, counts):
+    for related_model, field in _relations(model):
+        on_delete = field.remote_field.on_delete
+        related = related_model._base_manager.using(using).filter(
+            **{f"{field.name}__in": pks})
+        if on_delete is DO_NOTHING:
+            continue
+        if on_delete is SET_NULL:
+            related.update(**{field.name: None})
+            continue
+        if on_delete is not CASCADE:
+            if related.exists():
+                raise ProtectedError(
+                    f"{related_model._meta.label} ссылается на удаляемые "
+                    f"строки {model._meta.label}.",
+                    set(),
+                )
+            continue
+        for related_pks in _chunks(related, chunk_size):
+            _delete_pks(related_model, related_pks, using, chunk_size, counts)
+
+    with transaction.atomic(using=using):
+        pre_bulk_delete.send(sender=model, pks=pks, using=using)
+        counts[model._meta.label] += (
+            model._base_manager.using(using).filter(pk__in=pks)
+            ._raw_delete(using)
+        )
+
+
+def bulk_delete(queryset, chunk_size=None):
+    """
+    Удаляет строки выборки и всё, что на них ссылается с CASCADE.
+    Возвращает то же, что QuerySet.delete(): (всего, {модель: строк}).
+    """
+    chunk_size = chunk_size or settings.BULK_DELETE_CHUNK_SIZE
+    model = queryset.model
+    using = router.db_for_write(model)
+    counts = Counter()
+    for pks in _chunks(queryset.using(using), chunk_size):
+        _delete_pks(model, pks, using, chunk_size, counts)
+    return sum(counts.values()), dict(counts)
+
+
+def delete_instance(instance):
+    """
+    Удаляет объект и всё зависимое в одной транзакции: ошибка посреди
+    удаления не оставит его наполовину удалённым.
+    """
+    model = type(instance)
+    with transaction.atomic(using=router.db_for_write(model)):
+        return bulk_delete(model._base_manager.filter(pk=instance.pk))
+
+
+def count_related(queryset):
+    """
+    Сколько строк каждой модели удалит bulk_delete — подзапросами,
+    без загрузки строк. Для страницы подтверждения в админке.
+    """
+    # Модель -> выборки строк, дошедших до неё разными путями:
+    # SimilarRecipe, например, связан с рецептом дважды.
+    reached = {}
+
+    def visit(model, rows):
+        reached.setdefault(model, []).append(rows)
+        for related_model, field in _relations(model):
+            if field.remote_field.on_delete is CASCADE:
+                visit(
+                    related_model,
+                    related_model._base_manager.filter(
+                        **{f"{field.name}__in": rows.values("pk")}),
+                )
+
+    visit(queryset.model, queryset)
+    counts = {}
+    for model, querysets in reached.items():
+        condition = Q()
+        for rows in querysets:
+            condition |= Q(pk__in=rows.values("pk"))
+        total = model._base_manager.filter(condition).count()
+        if total:
+            counts[model] = total
+    return counts
@@ -0,0 +1,30 @@
+"""Фоновые задачи приложения recipes (foodgram.job_queue)."""
+from django.db import transaction
+from foodgram.job_queue import job
+
+from .counters import reconcile
+from .models import User
+from .similarity import refresh_similar_recipes
+
+RECONCILE_BATCH_SIZE = 1000
+
+
+@job("recipes.refresh_similar", queue="similar")
+def refresh_similar(recipe_id):
+    refresh_similar_recipes(recipe_id)
+
+
+@job("recipes.reconcile_counters", queue="maintenance", max_attempts=1)
+def reconcile_counters():
+    """Исправляет разошедшиеся счётчики всех пользователей."""
+    last_pk = 0
+    while True:
+        pks = list(
+            User.objects.filter(pk__gt=last_pk).order_by("pk")
+            .values_list("pk", flat=True)[:RECONCILE_BATCH_SIZE]
+        )
+        if not pks:
+            return
+        last_pk = pks[-1]
+        with transaction.atomic():
+            reconcile(User.objects.filter(pk__in=pks))
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.similarity import rebuild_similar_recipes
+
+
+class Command(BaseCommand):
+    help = "Rebuild the table of similar recipes from scratch"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--k",
+            type=int,
+            default=settings.SIMILAR_RECIPES_K,
+            help="Neighbors stored per recipe",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Recipes compared per matrix product",
+        )
+
+    def handle(self, *args, **options):
+        total = rebuild_similar_recipes(
+            k=options["k"], batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"✓ Similar recipes rebuilt for {total}"))
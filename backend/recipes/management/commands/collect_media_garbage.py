@@ -0,0 +1,134 @@
+import heapq
+import os
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models.functions import Collate
+
+from recipes.models import MediaBlob, Recipe, User
+
+# Колонки, в которых хранятся ссылки на файлы MEDIA_ROOT.
+FILE_COLUMNS = ((Recipe, "image"), (User, "avatar"))
+
+
+def walk_sorted(root, prefix=""):
+    """
+    Относительные пути файлов в побайтовом порядке строк.
+    Каталог сортируется как «имя/», иначе «a.b/x» оказался бы после «a/x».
+    """
+    with os.scandir(os.path.join(root, prefix)) as entries:
+        entries = sorted(
+            entries,
+            key=lambda entry: entry.name + "/" * entry.is_dir(),
+        )
+    for entry in entries:
+        name = prefix + entry.name
+        if entry.is_dir(follow_symlinks=False):
+            yield from walk_sorted(root, name + "/")
+        elif entry.is_file(follow_symlinks=False):
+            yield name, entry.stat(follow_symlinks=False)
+
+
+def referenced_names(chunk_size):
+    """Имена из всех файловых колонок, отсортированные и без пустых."""
+    streams = []
+    for model, column in FILE_COLUMNS:
+        queryset = model.objects.exclude(**{column: ""}).exclude(
+            **{f"{column}__isnull": True})
+        if connection.vendor == "postgresql":
+            # Порядок строк Python — побайтовый, как у сортировки "C".
+            queryset = queryset.order_by(Collate(column, "C"))
+        else:
+            queryset = queryset.order_by(column)
+        streams.append(
+            queryset.values_list(column, flat=True).iterator(chunk_size))
+    return heapq.merge(*streams)
+
+
+def orphans(root, chunk_size, min_age):
+    """Файлы без ссылок: слияние двух отсортированных потоков."""
+    deadline = time.time() - min_age
+    names = referenced_names(chunk_size)
+    current = next(names, None)
+    for name, stat in walk_sorted(root):
+        while current is not None and current < name:
+            current = next(names, None)
+        if current == name:
+            continue
+        # Свежие файлы могут принадлежать ещё не закоммиченной записи.
+        if stat.st_mtime < deadline:
+            yield name, stat.st_size
+
+
+class Command(BaseCommand):
+    help = "Delete media files that no database row refers to"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report unreferenced files",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Files deleted per batch and rows fetched per round trip",
+        )
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=60 * 60,
+            help="Skip files modified less than this many seconds ago",
+        )
+
+    def handle(self, *args, **options):
+        root = str(settings.MEDIA_ROOT)
+        if not os.path.isdir(root):
+            return
+        found = size = deleted = 0
+        batch = []
+        for name, file_size in orphans(
+            root, options["batch_size"], options["min_age"]
+        ):
+            found += 1
+            size += file_size
+            if options["verbosity"] > 1:
+                self.stdout.write(name)
+            if options["dry_run"]:
+                continue
+            batch.append(name)
+            if len(batch) >= options["batch_size"]:
+                deleted += self._delete(batch)
+                batch = []
+        if batch:
+            deleted += self._delete(batch)
+
+        verb = "found" if options["dry_run"] else f"deleted {deleted} of"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✓ Unreferenced media files {verb} {found} "
+                f"({size / 1024 / 1024:.1f} MiB)"
+            )
+        )
+
+    def _delete(self, names):
+        # Перепроверка: пока шёл обход, на файл могла появиться ссылка.
+        referenced = set()
+        for model, column in FILE_COLUMNS:
+            referenced.update(
+                model.objects.filter(**{f"{column}__in": names})
+                .values_list(column, flat=True)
+            )
+        names = [name for name in names if name not in referenced]
+        MediaBlob.objects.filter(name__in=names).delete()
+        for name in names:
+            # Мимо учёта ссылок: строк, ссылающихся на файл, уже нет.
+            try:
+                os.remove(default_storage.path(name))
+            except FileNotFoundError:
+                pass
+        return len(names)
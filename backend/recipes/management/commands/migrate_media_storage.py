@@ -0,0 +1,93 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.models import Recipe, User
+from recipes.storage import is_content_addressed
+
+FIELDS = (
+    (Recipe, "image"),
+    (User, "avatar"),
+)
+
+
+class Command(BaseCommand):
+    help = "Move existing media files to content-addressed names"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Rows read per query",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count files that would be moved",
+        )
+        parser.add_argument(
+            "--keep-originals",
+            action="store_true",
+            help="Do not delete files under the old names",
+        )
+
+    def handle(self, *args, **options):
+        verb = "to move" if options["dry_run"] else "moved"
+        for model, field_name in FIELDS:
+            moved, missing = self._migrate(model, field_name, options)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"✓ {model._meta.label}.{field_name}: {verb} {moved}, "
+                    f"missing {missing}"
+                )
+            )
+
+    def _rows(self, model, field_name, batch_size):
+        # Пагинация по ключу: таблица меняется по ходу обхода.
+        last_pk = 0
+        while True:
+            rows = list(
+                model.objects.filter(pk__gt=last_pk)
+                .exclude(**{field_name: ""})
+                .exclude(**{f"{field_name}__isnull": True})
+                .order_by("pk")
+                .values_list("pk", field_name)[:batch_size]
+            )
+            if not rows:
+                return
+            yield from rows
+            last_pk = rows[-1][0]
+
+    def _migrate(self, model, field_name, options):
+        moved = missing = 0
+        for pk, name in self._rows(model, field_name, options["batch_size"]):
+            if is_content_addressed(name):
+                continue
+            if not default_storage.exists(name):
+                missing += 1
+                continue
+            moved += 1
+            if options["dry_run"]:
+                continue
+
+            with default_storage.open(name) as file:
+                new_name = default_storage.save(name, file)
+            self._update(model, pk, field_name, new_name)
+            # Старые имена уникальны (uuid4), другие строки на них
+            # не ссылаются.
+            if not options["keep_originals"]:
+                default_storage.delete(name)
+        return moved, missing
+
+    def _update(self, model, pk, field_name, new_name):
+        # URL файла меняется — валидаторы кеша должны это заметить.
+        if model is Recipe:
+            Recipe.objects.filter(pk=pk).update(
+                **{field_name: new_name}, updated=timezone.now())
+            return
+        # save() с update_fields запускает сигналы: обновятся рецепты
+        # автора и кеш токенов.
+        instance = model.objects.get(pk=pk)
+        setattr(instance, field_name, new_name)
+        instance.save(update_fields=[field_name])
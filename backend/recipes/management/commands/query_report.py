@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from recipes.models import QueryStat
+
+SORT_KEYS = {
+    "total": "-total_ms",
+    "count": "-count",
+    "max": "-max_ms",
+    "slow": "-slow_count",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Report SQL statements aggregated by fingerprint over the last "
+        "minutes: executions per minute, total and max time, slow runs, "
+        "calling code and the captured EXPLAIN plan"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--minutes", type=int, default=60,
+            help="Size of the rolling window",
+        )
+        parser.add_argument(
+            "--sort", choices=sorted(SORT_KEYS), default="total",
+        )
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument(
+            "--slow-only", action="store_true",
+            help="Only fingerprints with statements above the threshold",
+        )
+        parser.add_argument(
+            "--plans", action="store_true",
+            help="Print the latest EXPLAIN plan of each fingerprint",
+        )
+
+    def handle(self, *args, **options):
+        minutes = options["minutes"]
+        since = timezone.now() - timedelta(minutes=minutes)
+        rows = (
+            QueryStat.objects.filter(window__gte=since)
+            .values("fingerprint")
+            .annotate(
+                count=Sum("count"),
+                slow_count=Sum("slow_count"),
+                total_ms=Sum("total_ms"),
+                max_ms=Max("max_ms"),
+                sql=Max("sql"),
+                caller=Max("caller"),
+            )
+            .order_by(SORT_KEYS[options["sort"]])
+        )
+        if options["slow_only"]:
+            rows = rows.filter(slow_count__gt=0)
+        rows = list(rows[:options["limit"]])
+
+        plans = {}
+        if options["plans"]:
+            for fingerprint, plan in (
+                QueryStat.objects.filter(
+                    fingerprint__in=[row["fingerprint"] for row in rows],
+                    window__gte=since,
+                )
+                .exclude(plan="")
+                .order_by("window")
+                .values_list("fingerprint", "plan")
+            ):
+                plans[fingerprint] = plan
+
+        self.stdout.write(
+            f"{'per min':>9} {'count':>9} {'slow':>6} {'total ms':>11} "
+            f"{'avg ms':>8} {'max ms':>8}  caller / sql"
+        )
+        for row in rows:
+            self.stdout.write(
+                f"{row['count'] / minutes:>9.1f} {row['count']:>9} "
+                f"{row['slow_count']:>6} {row['total_ms']:>11.1f} "
+                f"{row['total_ms'] / row['count']:>8.2f} "
+                f"{row['max_ms']:>8.1f}  {row['caller'] or '-'}"
+            )
+            self.stdout.write(f"    {row['sql'][:300]}")
+            if row["fingerprint"] in plans:
+                for line in plans[row["fingerprint"]].splitlines():
+                    self.stdout.write(f"      {line}")
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import reconcile
+from recipes.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount recipes, followers and followings of every user and fix "
+        "the stored counters that drifted"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Users checked per transaction",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Only report how many users have drifted counters",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        checked = drifted = 0
+        last_pk = 0
+        while True:
+            pks = list(
+                User.objects.filter(pk__gt=last_pk).order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not pks:
+                break
+            last_pk = pks[-1]
+            # Короткая транзакция на пачку: строки пользователей
+            # блокируются ненадолго.
+            with transaction.atomic():
+                drifted += reconcile(
+                    User.objects.filter(pk__in=pks),
+                    fix=not options["dry_run"],
+                )
+            checked += len(pks)
+
+        action = "found" if options["dry_run"] else "fixed"
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Checked {checked} users, {action} {drifted} with drifted "
+            "counters"
+        ))
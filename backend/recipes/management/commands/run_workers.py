@@ -0,0 +1,121 @@
+import multiprocessing
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from foodgram import job_queue, query_log
+
+from recipes import changes
+
+# Как часто, секунд, главный процесс возвращает зависшие задачи
+# в очередь и удаляет старые выполненные задачи и записи журнала
+# изменений рецептов.
+MAINTENANCE_INTERVAL = 60
+
+
+def _child(number, queues, stop):
+    # Сигналы ловит главный процесс и останавливает воркеров через stop:
+    # текущая задача доделывается.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    try:
+        job_queue.work(queues, job_queue.worker_name(number), stop)
+    finally:
+        # atexit в дочернем процессе multiprocessing не срабатывает.
+        query_log.flush_stats()
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background job workers: a pool of processes that claim jobs "
+        "from the database until stopped with SIGTERM or SIGINT"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes", type=int, default=settings.JOB_WORKER_PROCESSES,
+            help="Worker processes in the pool",
+        )
+        parser.add_argument(
+            "--queue", action="append", dest="queues",
+            help="Queue to take jobs from, may be repeated (default: all "
+                 "queues in JOB_QUEUES)",
+        )
+        parser.add_argument(
+            "--burst", action="store_true",
+            help="Run ready jobs in this process and exit when none are left",
+        )
+
+    def handle(self, *args, **options):
+        queues = options["queues"] or list(settings.JOB_QUEUES)
+        unknown = set(queues) - set(settings.JOB_QUEUES)
+        if unknown:
+            raise CommandError(f"Unknown queues: {', '.join(sorted(unknown))}")
+        if options["processes"] < 1:
+            raise CommandError("--processes must be at least 1")
+
+        job_queue.recover_stale()
+        if options["burst"]:
+            done = self.burst(queues)
+            self.stdout.write(self.style.SUCCESS(f"✓ Ran {done} jobs"))
+            return
+
+        context = multiprocessing.get_context("fork")
+        stop = context.Event()
+        # Обработчик только поднимает флаг: stop.set() из обработчика
+        # сигнала может зависнуть на замке события, которое ждёт цикл.
+        stopping = []
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stopping.append(True))
+        self.stdout.write(
+            f"Starting {options['processes']} workers for queues: "
+            f"{', '.join(queues)}"
+        )
+
+        pool = [None] * options["processes"]
+        maintained = time.monotonic()
+        while not stopping:
+            for number, process in enumerate(pool):
+                if process is not None and process.is_alive():
+                    continue
+                if process is not None:
+                    self.stderr.write(
+                        f"Worker {number} exited with code "
+                        f"{process.exitcode}, restarting"
+                    )
+                # Дочерний процесс не должен унаследовать открытые
+                # подключения к базе.
+                connections.close_all()
+                pool[number] = context.Process(
+                    target=_child, args=(number, queues, stop), daemon=True)
+                pool[number].start()
+            if time.monotonic() - maintained >= MAINTENANCE_INTERVAL:
+                maintained = time.monotonic()
+                job_queue.recover_stale()
+                job_queue.prune()
+                changes.prune()
+            time.sleep(1)
+
+        self.stdout.write("Stopping workers")
+        stop.set()
+        deadline = time.monotonic() + settings.JOB_SHUTDOWN_TIMEOUT
+        for process in pool:
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                # Задачу вернёт в очередь recover_stale() по JOB_TIMEOUT.
+                process.terminate()
+                process.join()
+        self.stdout.write(self.style.SUCCESS("✓ Workers stopped"))
+
+    def burst(self, queues):
+        done = 0
+        worker = job_queue.worker_name(0)
+        while True:
+            job = job_queue.claim(queues, worker)
+            if job is None:
+                return done
+            job_queue.run(job)
+            done += 1
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-19 08:57
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_updated'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='ingredientinrecipe',
+            options={'ordering': ('id',), 'verbose_name': 'Ингредиент в рецепте', 'verbose_name_plural': 'Ингредиенты в рецептах'},
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 3.2.25 on 2026-10-19 09:18
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef("pk")})
+            .order_by().values(field)
+            .annotate(total=Count("*")).values("total"),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model("recipes", "User")
+    Recipe = apps.get_model("recipes", "Recipe")
+    Subscription = apps.get_model("recipes", "Subscription")
+    User.objects.using(schema_editor.connection.alias).update(
+        recipes_count=count_of(Recipe, "author"),
+        followers_count=count_of(Subscription, "author"),
+        following_count=count_of(Subscription, "user"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_relation_created'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='Подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Подписок'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='Рецептов'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
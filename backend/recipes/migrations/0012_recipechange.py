@@ -0,0 +1,43 @@
+# Generated by Django 3.2.25 on 2026-10-19 09:23
+
+from django.db import migrations, models
+
+
+def seed_changes(apps, schema_editor):
+    """Все существующие рецепты — в журнал: с since=0 клиент получит их."""
+    Recipe = apps.get_model("recipes", "Recipe")
+    RecipeChange = apps.get_model("recipes", "RecipeChange")
+    alias = schema_editor.connection.alias
+    pks = Recipe.objects.using(alias).order_by("pk").values_list(
+        "pk", flat=True)
+    RecipeChange.objects.using(alias).bulk_create(
+        (RecipeChange(target="recipe", recipe_id=pk) for pk in pks.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_user_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target', models.CharField(choices=[('recipe', 'Рецепт'), ('favorite', 'Избранное'), ('shopping_cart', 'Корзина')], max_length=16, verbose_name='Что изменилось')),
+                ('recipe_id', models.BigIntegerField(verbose_name='Рецепт')),
+                ('user_id', models.BigIntegerField(blank=True, help_text='Владелец избранного или корзины; пусто для рецепта.', null=True, verbose_name='Пользователь')),
+                ('deleted', models.BooleanField(default=False, verbose_name='Удалено')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Изменение рецепта',
+                'verbose_name_plural': 'Изменения рецептов',
+                'ordering': ('id',),
+            },
+        ),
+        migrations.RunPython(seed_changes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.2.25 on 2026-10-19 09:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_requestprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueryStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=40, verbose_name='Отпечаток')),
+                ('window', models.DateTimeField(verbose_name='Минута')),
+                ('sql', models.TextField(verbose_name='SQL без литералов')),
+                ('caller', models.CharField(blank=True, max_length=255, verbose_name='Место вызова')),
+                ('count', models.PositiveBigIntegerField(default=0, verbose_name='Выполнений')),
+                ('slow_count', models.PositiveBigIntegerField(default=0, verbose_name='Медленных')),
+                ('total_ms', models.FloatField(default=0, verbose_name='Суммарное время, мс')),
+                ('max_ms', models.FloatField(default=0, verbose_name='Максимальное время, мс')),
+                ('plan', models.TextField(blank=True, verbose_name='План (EXPLAIN)')),
+            ],
+            options={
+                'verbose_name': 'Статистика запроса',
+                'verbose_name_plural': 'Статистика запросов',
+                'ordering': ('-window', '-total_ms'),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='querystat',
+            index=models.Index(fields=['window'], name='recipes_que_window_5b6500_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='querystat',
+            constraint=models.UniqueConstraint(fields=('fingerprint', 'window'), name='uniq_query_stat_fingerprint_window'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.25 on 2026-10-19 10:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_job'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='recipechange',
+            options={'ordering': ('txid', 'id'), 'verbose_name': 'Изменение рецепта', 'verbose_name_plural': 'Изменения рецептов'},
+        ),
+        migrations.AddField(
+            model_name='recipechange',
+            name='txid',
+            field=models.BigIntegerField(default=0, help_text='txid_current() записавшей транзакции; 0 вне PostgreSQL.', verbose_name='Транзакция'),
+        ),
+        migrations.AddIndex(
+            model_name='recipechange',
+            index=models.Index(fields=['user_id', 'txid', 'id'], name='recipes_rec_user_id_7a1d43_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipechange',
+            index=models.Index(fields=['created'], name='recipes_rec_created_09c477_idx'),
+        ),
+    ]
@@ -7,6 +7,10 @@ MIN_INGREDIENT_AMOUNT = 1
 MIN_COOKING_TIME = 1
 
 
+# Денормализованные счётчики User (recipes.counters).
+COUNTER_FIELDS = ("recipes_count", "followers_count", "following_count")
+
+
 class User(AbstractUser):
 
     first_name = models.CharField(
@@ -49,6 +53,26 @@ class User(AbstractUser):
         help_text="Уникальное имя пользователя (никнейм).",
     )
 
+    # Счётчики обновляют сигналы в recipes.signals,
+    # расхождения исправляет reconcile_user_counters.
+    recipes_count = models.PositiveIntegerField(
+        "Рецептов",
+        default=0,
+        editable=False,
+        db_index=True,
+    )
+    followers_count = models.PositiveIntegerField(
+        "Подписчиков",
+        default=0,
+        editable=False,
+        db_index=True,
+    )
+    following_count = models.PositiveIntegerField(
+        "Подписок",
+        default=0,
+        editable=False,
+    )
+
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username", "first_name", "last_name"]
 
@@ -60,6 +84,18 @@ class User(AbstractUser):
     def __str__(self):
         return self.email
 
+    def save(self, *args, **kwargs):
+        # Значения счётчиков в памяти могли устареть: полное сохранение
+        # затёрло бы сдвиги, сделанные после загрузки строки.
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            skipped = {*COUNTER_FIELDS, *self.get_deferred_fields()}
+            kwargs["update_fields"] = [
+                field.attname
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped
+            ]
+        super().save(*args, **kwargs)
+
 
 class Subscription(models.Model):
     """
@@ -81,6 +117,7 @@ class Subscription(models.Model):
         on_delete=models.CASCADE,
         help_text="На кого подписываются.",
     )
+    created = models.DateTimeField("Дата подписки", auto_now_add=True)
 
     class Meta:
         verbose_name = "Подписка"
@@ -161,6 +198,7 @@ class Recipe(models.Model):
         verbose_name="Теги",
     )
     created = models.DateTimeField("Дата создания", auto_now_add=True)
+    updated = models.DateTimeField("Дата изменения", auto_now=True)
 
     class Meta:
         verbose_name = "Рецепт"
@@ -195,6 +233,7 @@ class IngredientInRecipe(models.Model):
     class Meta:
         verbose_name = "Ингредиент в рецепте"
         verbose_name_plural = "Ингредиенты в рецептах"
+        ordering = ("id",)
         constraints = [
             models.UniqueConstraint(
                 fields=("recipe", "ingredient"),
@@ -224,6 +263,7 @@ class UserRecipeRelation(models.Model):
         on_delete=models.CASCADE,
         verbose_name="Рецепт",
     )
+    created = models.DateTimeField("Дата добавления", auto_now_add=True)
 
     class Meta:
         abstract = True
@@ -262,3 +302,254 @@ class ShoppingCart(UserRecipeRelation):
         default_related_name = 'shopping_cart'
         verbose_name = "Корзина"
         verbose_name_plural = "Корзина"
+
+
+class SimilarRecipe(models.Model):
+    """
+    Предрассчитанный сосед рецепта по ингредиентам и тегам.
+    Таблицу заполняет recipes.similarity.
+    """
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="neighbors",
+        verbose_name="Рецепт",
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="neighbor_of",
+        verbose_name="Похожий рецепт",
+    )
+    score = models.FloatField("Сходство")
+
+    class Meta:
+        verbose_name = "Похожий рецепт"
+        verbose_name_plural = "Похожие рецепты"
+        ordering = ("recipe", "-score")
+        constraints = [
+            models.UniqueConstraint(
+                fields=("recipe", "similar"),
+                name="uniq_similar_recipe_pair",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.recipe_id} ~ {self.similar_id} ({self.score:.3f})"
+
+
+class MediaBlob(models.Model):
+    """
+    Файл в хранилище с адресацией по содержимому и число ссылок на него.
+    Записи ведёт recipes.storage.ContentAddressedStorage.
+    """
+
+    name = models.CharField("Путь", max_length=255, unique=True)
+    size = models.PositiveBigIntegerField("Размер, байт")
+    references = models.PositiveIntegerField("Ссылок", default=1)
+    created = models.DateTimeField("Дата загрузки", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Медиафайл"
+        verbose_name_plural = "Медиафайлы"
+        ordering = ("name",)
+
+    def __str__(self):
+        return self.name
+
+
+class RecipeChange(models.Model):
+    """
+    Запись журнала изменений для синхронизации клиентов: рецепт создан,
+    изменён или удалён, добавлен в избранное или корзину либо убран
+    оттуда. Записи только добавляются; пишет их recipes.changes.
+    """
+
+    RECIPE = "recipe"
+    FAVORITE = "favorite"
+    SHOPPING_CART = "shopping_cart"
+    TARGETS = (
+        (RECIPE, "Рецепт"),
+        (FAVORITE, "Избранное"),
+        (SHOPPING_CART, "Корзина"),
+    )
+
+    target = models.CharField("Что изменилось", max_length=16, choices=TARGETS)
+    # Не ForeignKey: запись об удалении переживает сам рецепт.
+    recipe_id = models.BigIntegerField("Рецепт")
+    user_id = models.BigIntegerField(
+        "Пользователь",
+        null=True,
+        blank=True,
+        help_text="Владелец избранного или корзины; пусто для рецепта.",
+    )
+    deleted = models.BooleanField("Удалено", default=False)
+    # Порядок журнала — (txid, id): см. recipes.changes.
+    txid = models.BigIntegerField(
+        "Транзакция",
+        default=0,
+        help_text="txid_current() записавшей транзакции; 0 вне PostgreSQL.",
+    )
+    created = models.DateTimeField("Дата изменения", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Изменение рецепта"
+        verbose_name_plural = "Изменения рецептов"
+        ordering = ("txid", "id")
+        indexes = [
+            models.Index(fields=("user_id", "txid", "id")),
+            models.Index(fields=("created",)),
+        ]
+
+    def __str__(self):
+        action = "удалено" if self.deleted else "изменено"
+        return f"{self.get_target_display()} {self.recipe_id}: {action}"
+
+
+class RequestProfile(models.Model):
+    """
+    Профиль одного запроса, снятый foodgram.profiling.
+    Сам профиль (pstats) лежит в PROFILES_ROOT под именем file.
+    """
+
+    created = models.DateTimeField("Дата", auto_now_add=True)
+    method = models.CharField("Метод", max_length=10)
+    path = models.CharField("Путь", max_length=500)
+    query_string = models.TextField("Параметры", blank=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="Пользователь",
+    )
+    status_code = models.PositiveSmallIntegerField("Код ответа")
+    duration_ms = models.FloatField("Время, мс")
+    sql_count = models.PositiveIntegerField("SQL-запросов")
+    sql_time_ms = models.FloatField("Время SQL, мс")
+    sampled = models.BooleanField(
+        "Из выборки",
+        default=False,
+        help_text="Снят по PROFILING_SAMPLE_RATE, а не по запросу.",
+    )
+    file = models.CharField("Файл", max_length=255)
+
+    class Meta:
+        verbose_name = "Профиль запроса"
+        verbose_name_plural = "Профили запросов"
+        ordering = ("-created",)
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} мс)"
+
+    @property
+    def file_path(self):
+        return settings.PROFILES_ROOT / self.file
+
+
+class QueryStat(models.Model):
+    """
+    Агрегат SQL-запросов одного отпечатка за минуту.
+    Пишет foodgram.query_log, читает команда query_report.
+    """
+
+    fingerprint = models.CharField("Отпечаток", max_length=40)
+    window = models.DateTimeField("Минута")
+    sql = models.TextField("SQL без литералов")
+    caller = models.CharField("Место вызова", max_length=255, blank=True)
+    count = models.PositiveBigIntegerField("Выполнений", default=0)
+    slow_count = models.PositiveBigIntegerField("Медленных", default=0)
+    total_ms = models.FloatField("Суммарное время, мс", default=0)
+    max_ms = models.FloatField("Максимальное время, мс", default=0)
+    plan = models.TextField("План (EXPLAIN)", blank=True)
+
+    class Meta:
+        verbose_name = "Статистика запроса"
+        verbose_name_plural = "Статистика запросов"
+        ordering = ("-window", "-total_ms")
+        constraints = [
+            models.UniqueConstraint(
+                fields=("fingerprint", "window"),
+                name="uniq_query_stat_fingerprint_window",
+            ),
+        ]
+        indexes = [models.Index(fields=("window",))]
+
+    def __str__(self):
+        return f"{self.window:%H:%M} {self.sql[:80]}"
+
+
+class InvalidationEvent(models.Model):
+    """
+    Событие шины инвалидации: ключ изменённого объекта. id — версия,
+    по которой процессы догоняют пропущенные события.
+    Пишет и читает foodgram.invalidation.
+    """
+
+    key = models.CharField("Ключ", max_length=255)
+    created = models.DateTimeField("Создано", auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Событие инвалидации"
+        verbose_name_plural = "События инвалидации"
+        ordering = ("id",)
+
+    def __str__(self):
+        return f"{self.pk}: {self.key}"
+
+
+class Job(models.Model):
+    """
+    Фоновая задача. Ставит foodgram.job_queue.enqueue(), выполняют
+    воркеры команды run_workers.
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = (
+        (QUEUED, "В очереди"),
+        (RUNNING, "Выполняется"),
+        (DONE, "Выполнена"),
+        (FAILED, "Не удалась"),
+    )
+
+    queue = models.CharField("Очередь", max_length=50)
+    name = models.CharField("Задача", max_length=100)
+    payload = models.JSONField("Аргументы", default=dict, blank=True)
+    dedup_key = models.CharField(
+        "Ключ дедупликации", max_length=255, null=True, blank=True)
+    status = models.CharField(
+        "Статус", max_length=16, choices=STATUSES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField("Попыток", default=0)
+    max_attempts = models.PositiveSmallIntegerField("Максимум попыток")
+    run_at = models.DateTimeField("Выполнить не раньше")
+    locked_by = models.CharField("Воркер", max_length=100, blank=True)
+    started = models.DateTimeField("Начата", null=True, blank=True)
+    finished = models.DateTimeField("Завершена", null=True, blank=True)
+    last_error = models.TextField("Последняя ошибка", blank=True)
+    created = models.DateTimeField("Создана", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+        ordering = ("-created",)
+        constraints = [
+            # Одинаковая задача не ждёт в очереди дважды; выполняющаяся
+            # не мешает поставить новую — её данные могли устареть.
+            models.UniqueConstraint(
+                fields=("dedup_key",),
+                condition=models.Q(status="queued"),
+                name="uniq_job_queued_dedup_key",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=("queue", "status", "run_at")),
+            models.Index(fields=("status", "finished")),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.get_status_display()})"
@@ -0,0 +1,196 @@
+"""
+Поиск «что приготовить из того, что есть».
+
+Инвертированный индекс в памяти процесса: ингредиент -> отсортированный
+массив id рецептов, где он встречается, и число ингредиентов каждого
+рецепта. Запрос склеивает списки ингредиентов кладовой и считает
+совпадения одним np.unique — без GROUP BY по связующей таблице.
+
+Рецепты, изменённые после построения индекса, лежат в небольшом
+дополнении поверх него (их находит MAX(updated)); если рецептов стало
+меньше или дополнение разрослось, индекс строится заново.
+"""
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max
+from foodgram import invalidation
+
+from .models import IngredientInRecipe, Recipe
+
+OVERLAY_LIMIT = 1000
+# updated ставится при сохранении, а видна запись после коммита: рецепты
+# из окна до последней проверки перечитываются повторно.
+COMMIT_SKEW = timedelta(seconds=30)
+
+
+def _dtype(max_id):
+    return np.int32 if max_id < 2 ** 31 else np.int64
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    # ингредиент -> отсортированные id рецептов
+    postings: dict
+    # отсортированные id рецептов и число их ингредиентов
+    recipe_ids: np.ndarray
+    sizes: np.ndarray
+    # рецепты, изменённые после построения: id -> множество ингредиентов
+    overlay: dict = field(default_factory=dict)
+    # MAX(updated) на момент последней проверки
+    last_modified: object = None
+
+    def with_overlay(self, changes, last_modified):
+        return _Snapshot(
+            self.postings, self.recipe_ids, self.sizes,
+            {**self.overlay, **changes}, last_modified,
+        )
+
+    def known_count(self):
+        new = sum(
+            1 for recipe_id in self.overlay
+            if not self._in_base(recipe_id)
+        )
+        return len(self.recipe_ids) + new
+
+    def _in_base(self, recipe_id):
+        position = np.searchsorted(self.recipe_ids, recipe_id)
+        return (
+            position < len(self.recipe_ids)
+            and self.recipe_ids[position] == recipe_id
+        )
+
+
+def _state():
+    return Recipe.objects.order_by().aggregate(
+        count=Count("pk"), last_modified=Max("updated"))
+
+
+def _build():
+    state = _state()
+    pairs = np.fromiter(
+        (
+            value
+            for pair in IngredientInRecipe.objects
+            .order_by("ingredient_id", "recipe_id")
+            .values_list("ingredient_id", "recipe_id")
+            for value in pair
+        ),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    dtype = _dtype(pairs[:, 1].max() if len(pairs) else 0)
+    ingredient_ids, starts = np.unique(pairs[:, 0], return_index=True)
+    recipes = pairs[:, 1].astype(dtype)
+    postings = {
+        ingredient_id: posting
+        for ingredient_id, posting in zip(
+            ingredient_ids.tolist(), np.split(recipes, starts[1:]))
+    }
+    recipe_ids, sizes = np.unique(recipes, return_counts=True)
+    return _Snapshot(
+        postings, recipe_ids, sizes, last_modified=state["last_modified"])
+
+
+def _changes(since):
+    changes = {}
+    rows = IngredientInRecipe.objects.filter(
+        recipe__updated__gt=since - COMMIT_SKEW,
+    ).values_list("recipe_id", "ingredient_id")
+    for recipe_id, ingredient_id in rows:
+        changes.setdefault(recipe_id, set()).add(ingredient_id)
+    return {
+        recipe_id: frozenset(ingredients)
+        for recipe_id, ingredients in changes.items()
+    }
+
+
+class PantryIndex:
+    """Индекс рецептов по ингредиентам, общий для потоков процесса."""
+
+    def __init__(self):
+        self._snapshot = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        now = time.monotonic()
+        if (
+            self._snapshot is not None
+            and now - self._checked_at < settings.PANTRY_INDEX_CHECK_INTERVAL
+        ):
+            return self._snapshot
+        with self._lock:
+            if now - self._checked_at < settings.PANTRY_INDEX_CHECK_INTERVAL:
+                return self._snapshot
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.last_modified is None:
+                snapshot = _build()
+            else:
+                state = _state()
+                if state["last_modified"] != snapshot.last_modified:
+                    snapshot = snapshot.with_overlay(
+                        _changes(snapshot.last_modified),
+                        state["last_modified"],
+                    )
+                if (
+                    state["count"] != snapshot.known_count()
+                    or len(snapshot.overlay) > OVERLAY_LIMIT
+                ):
+                    snapshot = _build()
+            self._snapshot = snapshot
+            self._checked_at = time.monotonic()
+        return snapshot
+
+    def expire(self, key=None):
+        """Следующий поиск сверит индекс с базой, не дожидаясь интервала."""
+        self._checked_at = 0
+
+    def search(self, ingredient_ids, max_missing=None):
+        """
+        Рецепты, где есть хотя бы один ингредиент из кладовой:
+        массивы (id, совпало, не хватает), от полного покрытия к меньшему,
+        при равенстве — меньше недостающих, затем новые выше.
+        """
+        snapshot = self._refresh()
+        pantry = frozenset(ingredient_ids)
+        parts = [
+            snapshot.postings[ingredient_id]
+            for ingredient_id in pantry
+            if ingredient_id in snapshot.postings
+        ]
+        if parts:
+            ids, matched = np.unique(
+                np.concatenate(parts), return_counts=True)
+        else:
+            ids = matched = np.empty(0, dtype=np.int64)
+        totals = snapshot.sizes[np.searchsorted(snapshot.recipe_ids, ids)]
+
+        if snapshot.overlay:
+            changed = np.fromiter(snapshot.overlay, dtype=np.int64)
+            keep = ~np.isin(ids, changed)
+            extra = [
+                (recipe_id, len(ingredients & pantry), len(ingredients))
+                for recipe_id, ingredients in snapshot.overlay.items()
+                if ingredients & pantry
+            ]
+            extra = np.array(extra, dtype=np.int64).reshape(-1, 3)
+            ids = np.concatenate((ids[keep], extra[:, 0]))
+            matched = np.concatenate((matched[keep], extra[:, 1]))
+            totals = np.concatenate((totals[keep], extra[:, 2]))
+
+        missing = totals - matched
+        if max_missing is not None:
+            keep = missing <= max_missing
+            ids, matched, missing = ids[keep], matched[keep], missing[keep]
+        order = np.lexsort((-ids, missing, -matched / (matched + missing)))
+        return ids[order], matched[order], missing[order]
+
+
+pantry_index = PantryIndex()
+
+# Правка ингредиентов рецепта рассылается ключом самого рецепта.
+invalidation.subscribe(invalidation.model_key(Recipe), pantry_index.expire)
@@ -0,0 +1,126 @@
+"""
+Избранное, корзина и подписки одним запросом к базе.
+
+Добавление — INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING:
+несуществующие цели отсекает SELECT, уже существующие связи —
+уникальный индекс, а RETURNING сообщает, что действительно вставлено.
+Два одинаковых запроса наперегонки не приводят к IntegrityError.
+Удаление — один DELETE ... RETURNING. Сигналы моделей при этом не
+отправляются, поэтому счётчики подписок и журнал изменений рецептов
+обновляются здесь же.
+Синтаксис понимают PostgreSQL и SQLite 3.35+.
+"""
+from django.db import connections, router, transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from . import changes, counters
+from .models import Favorite, ShoppingCart, Subscription
+
+# Связи пользователей изменены в обход add() и remove() — в админке:
+# отправитель — модель связи, user_ids — чьи связи изменились.
+relations_changed = Signal()
+
+# Модель связи -> поле с целью: рецептом или автором.
+TARGETS = {
+    Favorite: "recipe",
+    ShoppingCart: "recipe",
+    Subscription: "author",
+}
+
+
+def _shift_counters(model, user_id, target_ids, sign, using):
+    for field, counter in counters.COUNTED_FIELDS.get(model, ()):
+        if field == "user":
+            deltas = {user_id: sign * len(target_ids)}
+        else:
+            deltas = {target_id: sign for target_id in target_ids}
+        counters.shift(counter, deltas, using)
+
+
+def _record_changes(model, user_id, recipe_ids, deleted, using):
+    target = changes.TARGET_BY_MODEL.get(model)
+    if target is not None and recipe_ids:
+        changes.record(
+            target, sorted(recipe_ids), user_id, deleted, using)
+
+
+def _execute(using, sql, params):
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+        return {row[0] for row in cursor.fetchall()}
+
+
+def add(model, user_id, target_ids):
+    """
+    Связывает пользователя с существующими целями из target_ids.
+    Возвращает множество id целей, для которых связь создана сейчас.
+    """
+    target_ids = sorted(set(target_ids))
+    if not target_ids:
+        return set()
+    using = router.db_for_write(model)
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    user = model._meta.get_field("user")
+    target = model._meta.get_field(TARGETS[model])
+    target_table = target.related_model._meta.db_table
+    target_pk = quote(target.related_model._meta.pk.column)
+    created = model._meta.get_field("created")
+
+    sql = (
+        f"INSERT INTO {quote(model._meta.db_table)} "
+        f"({quote(user.column)}, {quote(target.column)}, "
+        f"{quote(created.column)}) "
+        f"SELECT %s, {target_pk}, %s FROM {quote(target_table)} "
+        f"WHERE {target_pk} IN ({', '.join(['%s'] * len(target_ids))})"
+    )
+    params = [
+        user_id,
+        created.get_db_prep_save(timezone.now(), connection),
+        *target_ids,
+    ]
+    if target.related_model is user.related_model:
+        # Подписка на себя нарушила бы CHECK-ограничение.
+        sql += f" AND {target_pk} <> %s"
+        params.append(user_id)
+    sql += f" ON CONFLICT DO NOTHING RETURNING {quote(target.column)}"
+
+    with transaction.atomic(using=using):
+        inserted = _execute(using, sql, params)
+        _shift_counters(model, user_id, inserted, 1, using)
+        _record_changes(model, user_id, inserted, False, using)
+    return inserted
+
+
+def remove(model, user_id, target_ids=None):
+    """
+    Удаляет связи пользователя с target_ids, а без них — все его связи
+    этого вида. Возвращает множество id целей удалённых связей.
+    """
+    using = router.db_for_write(model)
+    quote = connections[using].ops.quote_name
+    user = model._meta.get_field("user")
+    target = model._meta.get_field(TARGETS[model])
+
+    sql = (
+        f"DELETE FROM {quote(model._meta.db_table)} "
+        f"WHERE {quote(user.column)} = %s"
+    )
+    params = [user_id]
+    if target_ids is not None:
+        target_ids = sorted(set(target_ids))
+        if not target_ids:
+            return set()
+        sql += (
+            f" AND {quote(target.column)} IN "
+            f"({', '.join(['%s'] * len(target_ids))})"
+        )
+        params += target_ids
+    sql += f" RETURNING {quote(target.column)}"
+
+    with transaction.atomic(using=using):
+        removed = _execute(using, sql, params)
+        _shift_counters(model, user_id, removed, -1, using)
+        _record_changes(model, user_id, removed, True, using)
+    return removed
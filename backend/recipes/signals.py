@@ -0,0 +1,356 @@
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+from foodgram import invalidation
+
+from . import changes, counters
+from .deletion import pre_bulk_delete
+from .models import (
+    Favorite,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    RecipeChange,
+    RequestProfile,
+    ShoppingCart,
+    SimilarRecipe,
+    Subscription,
+    Tag,
+    User,
+)
+from .similarity import schedule_refresh
+from .storage import discard_on_commit
+
+# Поля автора, которые попадают в представление рецепта.
+AUTHOR_FIELDS = frozenset(
+    ("email", "username", "first_name", "last_name", "avatar")
+)
+
+# Модель -> поле с файлом, который удаляется вместе со строкой.
+FILE_FIELDS = {Recipe: "image", User: "avatar"}
+
+# Модели, изменения которых рассылаются по шине инвалидации. Строки
+# IngredientInRecipe не рассылаются: их правка сдвигает рецепт
+# (touch_recipes), а receiver на post_delete отключил бы быстрое удаление.
+BROADCAST_MODELS = (
+    User, Subscription, Tag, Ingredient, Recipe, Favorite, ShoppingCart)
+
+
+def touch_recipes(queryset):
+    """
+    Сдвигает отметку updated у рецептов, минуя save(),
+    и записывает их изменение в журнал.
+    """
+    pks = list(queryset.values_list("pk", flat=True))
+    if pks:
+        Recipe.objects.filter(pk__in=pks).update(updated=timezone.now())
+        changes.record(RecipeChange.RECIPE, pks)
+        invalidation.publish(
+            invalidation.model_key(Recipe, pk) for pk in pks)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        touch_recipes(Recipe.objects.filter(pk=instance.pk))
+    elif action == "pre_clear":
+        touch_recipes(instance.recipes.all())
+    else:
+        touch_recipes(Recipe.objects.filter(pk__in=pk_set))
+
+
+# Удаление строк IngredientInRecipe сигналом не отслеживается: и сериализатор,
+# и инлайн в админке сохраняют сам рецепт, а receiver на post_delete
+# лишил бы Django быстрого каскадного удаления.
+@receiver(post_save, sender=IngredientInRecipe)
+def recipe_ingredient_saved(sender, instance, **kwargs):
+    touch_recipes(Recipe.objects.filter(pk=instance.recipe_id))
+
+
+@receiver(post_save, sender=Tag)
+def tag_saved(sender, instance, created, **kwargs):
+    if not created:
+        touch_recipes(instance.recipes.all())
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, created, **kwargs):
+    if not created:
+        touch_recipes(
+            Recipe.objects.filter(recipe_ingredients__ingredient=instance)
+        )
+
+
+def _stored_value(model, field_name, value):
+    # Пустой аватар в памяти — файл без имени, в базе — "" или NULL.
+    return model._meta.get_field(field_name).get_prep_value(value) or None
+
+
+def author_changed(instance):
+    """Изменило ли последнее сохранение автора поля, видные в рецептах."""
+    return instance.__dict__.get("_author_changed", False)
+
+
+@receiver(pre_save, sender=User)
+def remember_author_changed(sender, instance, update_fields, using,
+                            **kwargs):
+    """
+    Сравнивает сохраняемые поля автора с записанными в базе: смена
+    пароля или last_login не должна сдвигать его рецепты.
+    """
+    fields = AUTHOR_FIELDS
+    if update_fields is not None:
+        fields = fields & set(update_fields)
+    changed = False
+    if instance.pk is not None and fields:
+        old = (
+            sender._base_manager.using(using)
+            .filter(pk=instance.pk)
+            .values(*fields)
+            .first()
+        )
+        changed = old is None or any(
+            _stored_value(sender, field, getattr(instance, field))
+            != _stored_value(sender, field, old[field])
+            for field in fields
+        )
+    instance._author_changed = changed
+
+
+@receiver(post_save, sender=User)
+def author_saved(sender, instance, created, **kwargs):
+    if not created and author_changed(instance):
+        touch_recipes(instance.recipes.all())
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=User)
+def remember_replaced_file(sender, instance, update_fields, **kwargs):
+    """
+    Запоминает старый файл, если поле получает новую загрузку или
+    очищается. Присвоение имени уже сохранённого файла не считается
+    заменой: ссылками на него распоряжается тот, кто присваивает.
+    """
+    field_name = FILE_FIELDS[sender]
+    if instance.pk is None or (
+        update_fields is not None and field_name not in update_fields
+    ):
+        return
+    file = getattr(instance, field_name)
+    if file and file._committed:
+        return
+    old_name = (
+        sender.objects.filter(pk=instance.pk)
+        .values_list(field_name, flat=True)
+        .first()
+    )
+    if old_name:
+        instance._replaced_file = (file.storage, old_name)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def discard_replaced_file(sender, instance, **kwargs):
+    replaced = instance.__dict__.pop("_replaced_file", None)
+    if replaced is not None:
+        discard_on_commit(*replaced)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def discard_deleted_file(sender, instance, **kwargs):
+    file = getattr(instance, FILE_FIELDS[sender])
+    if file:
+        discard_on_commit(file.storage, file.name)
+
+
+@receiver(pre_bulk_delete, sender=Recipe)
+@receiver(pre_bulk_delete, sender=User)
+def discard_bulk_deleted_files(sender, pks, using, **kwargs):
+    field_name = FILE_FIELDS[sender]
+    storage = sender._meta.get_field(field_name).storage
+    names = (
+        sender._base_manager.using(using)
+        .filter(pk__in=pks)
+        .exclude(**{field_name: ""})
+        .values_list(field_name, flat=True)
+    )
+    for name in names:
+        if name:
+            discard_on_commit(storage, name, using)
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=Subscription)
+def remember_counted_owners(sender, instance, raw, using, **kwargs):
+    """Запоминает прежних владельцев строки: их могут сменить в админке."""
+    if raw or instance.pk is None:
+        return
+    instance._counted_owners = (
+        sender._base_manager.using(using).filter(pk=instance.pk)
+        .values(*(
+            f"{field}_id" for field, _ in counters.COUNTED_FIELDS[sender]))
+        .first()
+    )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Subscription)
+def count_saved(sender, instance, created, raw, using, **kwargs):
+    old = instance.__dict__.pop("_counted_owners", None)
+    if raw or not (created or old):
+        return
+    for field, counter in counters.COUNTED_FIELDS[sender]:
+        owner_id = getattr(instance, f"{field}_id")
+        if created:
+            counters.shift(counter, {owner_id: 1}, using)
+        elif old[f"{field}_id"] != owner_id:
+            counters.shift(
+                counter, {old[f"{field}_id"]: -1, owner_id: 1}, using)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Subscription)
+def count_deleted(sender, instance, using, **kwargs):
+    for field, counter in counters.COUNTED_FIELDS[sender]:
+        counters.shift(
+            counter, {getattr(instance, f"{field}_id"): -1}, using)
+
+
+@receiver(pre_bulk_delete, sender=Recipe)
+@receiver(pre_bulk_delete, sender=Subscription)
+def count_bulk_deleted(sender, pks, using, **kwargs):
+    rows = sender._base_manager.using(using).filter(pk__in=pks).order_by()
+    for field, counter in counters.COUNTED_FIELDS[sender]:
+        counters.shift(
+            counter,
+            {
+                owner_id: -total
+                for owner_id, total in rows.values(f"{field}_id")
+                .annotate(total=Count("pk")).values_list(
+                    f"{field}_id", "total")
+            },
+            using,
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, raw, using, **kwargs):
+    if not raw:
+        changes.record(RecipeChange.RECIPE, [instance.pk], using=using)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, using, **kwargs):
+    changes.record(
+        RecipeChange.RECIPE, [instance.pk], deleted=True, using=using)
+
+
+@receiver(pre_bulk_delete, sender=Recipe)
+def recipes_bulk_deleted(sender, pks, using, **kwargs):
+    changes.record(RecipeChange.RECIPE, pks, deleted=True, using=using)
+
+
+# Похожие рецепты (recipes.similarity). И API, и админка сохраняют сам
+# рецепт вместе с его тегами и ингредиентами.
+@receiver(post_save, sender=Recipe)
+def refresh_saved_similar(sender, instance, raw, **kwargs):
+    if not raw:
+        schedule_refresh(instance.pk)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def refresh_retagged_similar(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    # Теги меняют со стороны тега, не сохраняя рецепты.
+    if not reverse:
+        return
+    if action == "pre_clear":
+        pk_set = instance.recipes.values_list("pk", flat=True)
+    elif action not in ("post_add", "post_remove"):
+        return
+    for pk in pk_set:
+        schedule_refresh(pk)
+
+
+@receiver(pre_delete, sender=Recipe)
+def refresh_similar_of_deleted(sender, instance, **kwargs):
+    # Списки, где был рецепт, дополняются следующими по сходству.
+    for pk in instance.neighbor_of.values_list("recipe_id", flat=True):
+        schedule_refresh(pk)
+
+
+@receiver(pre_bulk_delete, sender=SimilarRecipe)
+def refresh_similar_bulk_deleted(sender, pks, using, **kwargs):
+    # Строки удаляются каскадом от рецептов: и их собственные списки
+    # (задача для удалённого рецепта ничего не сделает), и чужие.
+    recipe_ids = (
+        SimilarRecipe._base_manager.using(using)
+        .filter(pk__in=pks)
+        .order_by()
+        .values_list("recipe_id", flat=True)
+        .distinct()
+    )
+    for pk in recipe_ids:
+        schedule_refresh(pk)
+
+
+# Массовое удаление избранного и корзины бывает только каскадом
+# от рецепта или пользователя: хватает записи об удалении рецепта,
+# а удалённому пользователю синхронизировать нечего.
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def relation_saved(sender, instance, created, raw, using, **kwargs):
+    if created and not raw:
+        changes.record(
+            changes.TARGET_BY_MODEL[sender],
+            [instance.recipe_id],
+            user_id=instance.user_id,
+            using=using,
+        )
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def relation_deleted(sender, instance, using, **kwargs):
+    changes.record(
+        changes.TARGET_BY_MODEL[sender],
+        [instance.recipe_id],
+        user_id=instance.user_id,
+        deleted=True,
+        using=using,
+    )
+
+
+@receiver(post_delete, sender=RequestProfile)
+def request_profile_deleted(sender, instance, using, **kwargs):
+    path = instance.file_path
+    transaction.on_commit(
+        lambda: path.unlink(missing_ok=True), using=using)
+
+
+def broadcast_change(sender, instance, using, raw=False, **kwargs):
+    if not raw:
+        invalidation.publish(
+            [invalidation.model_key(sender, instance.pk)], using)
+
+
+def broadcast_bulk_delete(sender, pks, using, **kwargs):
+    invalidation.publish(
+        (invalidation.model_key(sender, pk) for pk in pks), using)
+
+
+for model in BROADCAST_MODELS:
+    post_save.connect(broadcast_change, sender=model)
+    post_delete.connect(broadcast_change, sender=model)
+    pre_bulk_delete.connect(broadcast_bulk_delete, sender=model)
@@ -0,0 +1,227 @@
+"""
+Индекс похожих рецептов.
+
+Рецепт — разреженный вектор: ингредиенты с весом idf и теги с весом
+TAG_WEIGHT * idf, нормированный по L2. Сходство — косинус, то есть
+скалярное произведение строк матрицы. Top-k соседей каждого рецепта
+хранится в SimilarRecipe, поэтому запрос похожих — одна выборка по
+индексу, без попарного сравнения во время запроса.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from foodgram.job_queue import enqueue
+from scipy import sparse
+
+from .models import IngredientInRecipe, Recipe, SimilarRecipe
+
+TAG_WEIGHT = 0.5
+BULK_SIZE = 5000
+
+# Признак кодируется одним числом: ингредиенты — чётные, теги — нечётные.
+INGREDIENT, TAG = 0, 1
+
+
+def _pairs(queryset, column, recipe_ids):
+    if recipe_ids is not None:
+        queryset = queryset.filter(recipe_id__in=recipe_ids)
+    pairs = np.fromiter(
+        (
+            value
+            for pair in queryset.order_by().values_list("recipe_id", column)
+            for value in pair
+        ),
+        dtype=np.int64,
+    )
+    return pairs.reshape(-1, 2)
+
+
+def _document_frequencies(keys):
+    """Число рецептов с каждым признаком по всей базе."""
+    frequencies = dict.fromkeys(keys.tolist(), 0)
+    sources = (
+        (IngredientInRecipe.objects, "ingredient_id", INGREDIENT),
+        (Recipe.tags.through.objects, "tag_id", TAG),
+    )
+    for manager, column, kind in sources:
+        feature_ids = [key // 2 for key in frequencies if key % 2 == kind]
+        rows = (
+            manager.filter(**{f"{column}__in": feature_ids})
+            .order_by()
+            .values(column)
+            .annotate(total=Count("recipe_id"))
+            .values_list(column, "total")
+        )
+        for feature_id, total in rows:
+            frequencies[feature_id * 2 + kind] = total
+    return np.array([frequencies[key] for key in keys.tolist()])
+
+
+def build_vectors(recipe_ids=None):
+    """
+    Нормированные векторы рецептов: (массив id, CSR-матрица).
+    Для части рецептов частоты признаков берутся по всей базе.
+    """
+    ingredients = _pairs(
+        IngredientInRecipe.objects, "ingredient_id", recipe_ids)
+    tags = _pairs(Recipe.tags.through.objects, "tag_id", recipe_ids)
+
+    recipes = np.concatenate((ingredients[:, 0], tags[:, 0]))
+    features = np.concatenate(
+        (ingredients[:, 1] * 2 + INGREDIENT, tags[:, 1] * 2 + TAG))
+    base = np.concatenate(
+        (np.ones(len(ingredients)), np.full(len(tags), TAG_WEIGHT)))
+
+    ids, rows = np.unique(recipes, return_inverse=True)
+    keys, columns = np.unique(features, return_inverse=True)
+    if recipe_ids is None:
+        total = len(ids)
+        frequencies = np.bincount(columns, minlength=len(keys))
+    else:
+        total = Recipe.objects.count()
+        frequencies = _document_frequencies(keys)
+    idf = np.log((total + 1) / (frequencies + 1)) + 1
+
+    matrix = sparse.csr_matrix(
+        (base * idf[columns], (rows, columns)),
+        shape=(len(ids), len(keys)),
+    )
+    norms = np.sqrt(matrix.multiply(matrix).sum(axis=1)).A1
+    norms[norms == 0] = 1
+    return ids, sparse.diags(1 / norms) @ matrix
+
+
+def _top(columns, scores, k):
+    if len(scores) > k:
+        best = np.argpartition(-scores, k)[:k]
+        columns, scores = columns[best], scores[best]
+    order = np.argsort(-scores, kind="stable")
+    return columns[order], scores[order]
+
+
+def iter_neighbors(ids, matrix, k, batch_size):
+    """(id рецепта, id соседей, сходства) блоками по batch_size строк."""
+    transposed = matrix.T.tocsc()
+    for start in range(0, len(ids), batch_size):
+        block = (matrix[start:start + batch_size] @ transposed).tocsr()
+        for offset in range(block.shape[0]):
+            row = slice(block.indptr[offset], block.indptr[offset + 1])
+            columns, scores = block.indices[row], block.data[row]
+            keep = (columns != start + offset) & (scores > 0)
+            columns, scores = _top(columns[keep], scores[keep], k)
+            yield ids[start + offset], ids[columns], scores
+
+
+def rebuild_similar_recipes(k=None, batch_size=1000):
+    """Полностью пересчитывает таблицу SimilarRecipe."""
+    k = k or settings.SIMILAR_RECIPES_K
+    ids, matrix = build_vectors()
+    with transaction.atomic():
+        SimilarRecipe.objects.all().delete()
+        bulk = []
+        for recipe_id, neighbor_ids, scores in iter_neighbors(
+            ids, matrix, k, batch_size
+        ):
+            bulk += [
+                SimilarRecipe(
+                    recipe_id=recipe_id, similar_id=neighbor_id, score=score)
+                for neighbor_id, score in zip(
+                    neighbor_ids.tolist(), scores.tolist())
+            ]
+            if len(bulk) >= BULK_SIZE:
+                SimilarRecipe.objects.bulk_create(bulk)
+                bulk = []
+        SimilarRecipe.objects.bulk_create(bulk)
+    return len(ids)
+
+
+def refresh_similar_recipes(recipe_id, k=None):
+    """
+    Пересчитывает соседей одного рецепта и его место в списках рецептов
+    с общими ингредиентами или тегами — те же кандидаты, что сравнивает
+    полная перестройка. Списки рецептов, у которых общих признаков больше
+    нет, только укорачиваются — до полной перестройки.
+    """
+    k = k or settings.SIMILAR_RECIPES_K
+    tagged = Recipe.tags.through.objects
+    candidates = {recipe_id}
+    for manager, column in (
+        (IngredientInRecipe.objects, "ingredient_id"),
+        (tagged, "tag_id"),
+    ):
+        candidates.update(
+            manager.filter(**{
+                f"{column}__in": manager.filter(
+                    recipe_id=recipe_id).values(column),
+            })
+            .values_list("recipe_id", flat=True)
+        )
+    ids, matrix = build_vectors(candidates)
+    position = np.searchsorted(ids, recipe_id)
+    if position == len(ids) or ids[position] != recipe_id:
+        return
+
+    scores = (matrix @ matrix[position].T).toarray().ravel()
+    scores[position] = 0
+    columns = np.flatnonzero(scores > 0)
+    own_columns, own_scores = _top(columns, scores[columns], k)
+
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(
+            Q(recipe_id=recipe_id) | Q(similar_id=recipe_id)).delete()
+        bulk = [
+            SimilarRecipe(recipe_id=recipe_id, similar_id=ids[column],
+                          score=score)
+            for column, score in zip(own_columns.tolist(),
+                                     own_scores.tolist())
+        ]
+
+        current = {
+            row["recipe_id"]: row
+            for row in SimilarRecipe.objects.filter(
+                recipe_id__in=ids[columns].tolist())
+            .order_by()
+            .values("recipe_id")
+            .annotate(count=Count("id"), lowest=Min("score"))
+        }
+        full = []
+        for column in columns.tolist():
+            neighbor_id, score = int(ids[column]), float(scores[column])
+            state = current.get(neighbor_id)
+            if state is None or state["count"] < k:
+                pass
+            elif score > state["lowest"]:
+                full.append(neighbor_id)
+            else:
+                continue
+            bulk.append(SimilarRecipe(
+                recipe_id=neighbor_id, similar_id=recipe_id, score=score))
+        SimilarRecipe.objects.bulk_create(bulk, batch_size=BULK_SIZE)
+        _trim(full, k)
+
+
+def _trim(recipe_ids, k):
+    """Оставляет в списках рецептов только k лучших соседей."""
+    extra, seen = [], {}
+    for recipe_id, row_id in (
+        SimilarRecipe.objects.filter(recipe_id__in=recipe_ids)
+        .order_by("recipe_id", "-score")
+        .values_list("recipe_id", "id")
+    ):
+        seen[recipe_id] = seen.get(recipe_id, 0) + 1
+        if seen[recipe_id] > k:
+            extra.append(row_id)
+    SimilarRecipe.objects.filter(id__in=extra).delete()
+
+
+def schedule_refresh(recipe_id):
+    """
+    Ставит пересчёт соседей рецепта в фоновую очередь; пока задача ждёт,
+    повторные правки того же рецепта её не дублируют.
+    """
+    enqueue(
+        "recipes.refresh_similar",
+        {"recipe_id": recipe_id},
+        dedup_key=f"similar:{recipe_id}",
+    )
@@ -0,0 +1,108 @@
+"""
+Хранилище медиа с адресацией по содержимому.
+
+Файл сохраняется как <каталог upload_to>/ab/cd/<sha256>.<расширение>:
+одинаковые изображения лежат на диске один раз, а вложенные каталоги
+держат в каждом не больше нескольких сотен записей. Число ссылок на
+файл ведёт MediaBlob — delete() удаляет файл, только когда ссылок
+не осталось. Файлы со старыми именами удаляются как раньше.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import router, transaction
+from django.db.models import F
+
+from .models import MediaBlob
+
+SHARD_DEPTH = 2
+SHARD_WIDTH = 2
+
+CONTENT_ADDRESSED_NAME = re.compile(
+    r"(?:.+/)?(?:[0-9a-f]{%d}/){%d}[0-9a-f]{64}(?:\.\w+)?"
+    % (SHARD_WIDTH, SHARD_DEPTH)
+)
+
+
+def discard_on_commit(storage, name, using=None):
+    """Удаляет ссылку на файл после коммита текущей транзакции."""
+    transaction.on_commit(lambda: storage.delete(name), using=using)
+
+
+def is_content_addressed(name):
+    return CONTENT_ADDRESSED_NAME.fullmatch(name) is not None
+
+
+def content_name(directory, digest, extension):
+    shards = [
+        digest[i * SHARD_WIDTH:(i + 1) * SHARD_WIDTH]
+        for i in range(SHARD_DEPTH)
+    ]
+    return posixpath.join(directory, *shards, digest + extension.lower())
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def get_available_name(self, name, max_length=None):
+        # Имя задаёт содержимое; совпадение имён — это и есть дубликат.
+        return name
+
+    def _digest(self, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    def _write(self, name, content):
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        if self.directory_permissions_mode is not None:
+            os.chmod(directory, self.directory_permissions_mode)
+        handle, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def _save(self, name, content):
+        directory, filename = posixpath.split(name.replace("\\", "/"))
+        name = content_name(
+            directory, self._digest(content), os.path.splitext(filename)[1])
+
+        # Ссылка учитывается под блокировкой строки до записи файла, чтобы
+        # параллельный delete() не удалил файл, который сейчас переиспользуют.
+        with transaction.atomic(using=router.db_for_write(MediaBlob)):
+            blobs = MediaBlob.objects.select_for_update()
+            blob, created = blobs.get_or_create(
+                name=name, defaults={"size": content.size})
+            if not created:
+                MediaBlob.objects.filter(pk=blob.pk).update(
+                    references=F("references") + 1)
+            if not self.exists(name):
+                self._write(name, content)
+        return name
+
+    def delete(self, name):
+        if not name:
+            raise ValueError("The name must be given to delete().")
+        with transaction.atomic(using=router.db_for_write(MediaBlob)):
+            blob = MediaBlob.objects.select_for_update().filter(
+                name=name).first()
+            if blob is not None and blob.references > 1:
+                MediaBlob.objects.filter(pk=blob.pk).update(
+                    references=F("references") - 1)
+                return
+            if blob is not None:
+                blob.delete()
+            super().delete(name)